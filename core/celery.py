@@ -2,6 +2,7 @@
 from __future__ import absolute_import
 import os
 from celery import Celery
+from celery.schedules import crontab
 from django.conf import settings
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
@@ -10,4 +11,19 @@ app = Celery('core')
 
 app.config_from_object('django.conf:settings', namespace='CELERY')
 
-app.autodiscover_tasks(lambda: settings.INSTALLED_APPS)
\ No newline at end of file
+app.autodiscover_tasks(lambda: settings.INSTALLED_APPS)
+
+app.conf.beat_schedule = {
+    'sweep-expired-ticket-holds': {
+        'task': 'mainapps.booking.tasks.sweep_expired_holds',
+        'schedule': 60.0,
+    },
+    'requeue-waitlists': {
+        'task': 'mainapps.booking.tasks.requeue_waitlists',
+        'schedule': 300.0,
+    },
+    'reconcile-payments': {
+        'task': 'mainapps.payment.tasks.reconcile_payments',
+        'schedule': crontab(hour=3, minute=30),
+    },
+}
@@ -0,0 +1,98 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+class ConditionalGetMixin:
+    """
+    ETag and Last-Modified support for list and retrieve on Tracking models.
+
+    The validators come from one aggregate over the filtered queryset - the
+    newest `updated_at` and the row count - so a 304 is answered without
+    loading or serializing a single object. The count catches deletions,
+    which leave no newer `updated_at` behind.
+
+    Representations that embed related rows name the relations in
+    `conditional_related`; their newest `updated_at` is folded in as well.
+    Values that do not live in the rows at all, such as live counters kept
+    in the cache, are folded in through `get_conditional_versions()`.
+
+    Last-Modified is only sent for a single object without related rows.
+    A deletion from a list, or from the related rows, leaves the newest
+    `updated_at` where it was, so If-Modified-Since alone could not notice
+    it; those responses carry the ETag only.
+    """
+    conditional_related = ()
+
+    def get_conditional_validators(self, queryset):
+        """
+        Return (etag, last_modified timestamp) for the rows of `queryset`.
+
+        Both are None when the queryset is empty, which leaves 404s and empty
+        lists to the view.
+        """
+        fields = ['updated_at', *(f'{relation}__updated_at' for relation in self.conditional_related)]
+        aggregates = self.get_conditional_aggregates(queryset.order_by(), fields)
+        if not aggregates['count']:
+            return None, None
+
+        newest = [aggregates[f'newest_{index}'] for index in range(len(fields))]
+        last_modified = max(value for value in newest if value is not None)
+        validator = ':'.join([
+            queryset.model._meta.label,
+            str(self.request.user.pk),
+            self.request.get_full_path(),
+            self.request.accepted_media_type or '',
+            str(aggregates['count']),
+            *(value.isoformat() if value else '' for value in newest),
+            *self.get_conditional_versions(),
+        ])
+        # Weak, since the tag identifies the data rather than the exact bytes
+        etag = 'W/' + quote_etag(hashlib.sha256(validator.encode()).hexdigest()[:32])
+        return etag, int(last_modified.timestamp())
+
+    def get_conditional_versions(self):
+        """Strings that change whenever the response changes without its rows changing."""
+        return []
+
+    def get_conditional_aggregates(self, queryset, fields):
+        """The row count of `queryset` and the newest value of each of `fields`, in one query."""
+        return queryset.aggregate(
+            count=Count('pk', distinct=bool(self.conditional_related)),
+            **{f'newest_{index}': Max(field) for index, field in enumerate(fields)},
+        )
+
+    def conditional_response(self, request, queryset, view_method, *args, with_last_modified=False, **kwargs):
+        etag, last_modified = self.get_conditional_validators(queryset)
+        if etag is None:
+            return view_method(request, *args, **kwargs)
+        if not with_last_modified:
+            last_modified = None
+
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        response = view_method(request, *args, **kwargs)
+        if response.status_code == 200:
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            # Clients may keep the body but must revalidate before reusing it
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return self.conditional_response(request, queryset, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        )
+        return self.conditional_response(
+            request, queryset, super().retrieve, *args, with_last_modified=not self.conditional_related, **kwargs
+        )
@@ -0,0 +1,98 @@
+import hashlib
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+IDEMPOTENCY_KEY_CACHE_KEY = "idempotency:{user}:{scope}:{key}"
+
+# How long a request may run before an unfinished key stops blocking retries
+IDEMPOTENCY_LOCK_TIMEOUT = 60
+
+
+def _cache_key(view, request, key):
+    return IDEMPOTENCY_KEY_CACHE_KEY.format(
+        user=request.user.pk,
+        scope=type(view).__name__,
+        key=hashlib.sha256(key.encode()).hexdigest(),
+    )
+
+
+def _fingerprint(request):
+    return hashlib.sha256(
+        json.dumps([request.method, request.get_full_path(), request.data], sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def is_replay(view, request):
+    """
+    Whether `request` repeats a completed request that an @idempotent view will replay.
+
+    Checks that would reject the retry because the original already used
+    something up, such as a single-use token, can let replays through.
+    """
+    key = request.headers.get('Idempotency-Key')
+    if not key or len(key) > 255 or not request.user.is_authenticated:
+        return False
+    stored = cache.get(_cache_key(view, request, key))
+    return bool(stored) and not stored.get('in_progress') and stored['fingerprint'] == _fingerprint(request)
+
+
+def idempotent(view_method):
+    """
+    Honour the Idempotency-Key header on a write view.
+
+    The first request with a given key runs normally and, if it succeeds, its
+    response is stored in the cache per user and key for IDEMPOTENCY_KEY_TTL
+    seconds. Retries get the stored response back with an Idempotent-Replayed
+    header instead of running the write again. A retry that arrives while the
+    original is still running gets 409. Reusing a key for a different request
+    gets 422. Requests without the header are not affected, and a replay
+    costs a single cache read.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key or not request.user.is_authenticated:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > 255:
+            return Response({"error": "Idempotency-Key must be at most 255 characters."}, status=status.HTTP_400_BAD_REQUEST)
+
+        cache_key = _cache_key(self, request, key)
+        fingerprint = _fingerprint(request)
+
+        if not cache.add(cache_key, {'fingerprint': fingerprint, 'in_progress': True}, timeout=IDEMPOTENCY_LOCK_TIMEOUT):
+            stored = cache.get(cache_key)
+            if stored is None:
+                # Expired between the two calls; let the client retry
+                return Response({"error": "Request with this Idempotency-Key is in progress."}, status=status.HTTP_409_CONFLICT)
+            if stored['fingerprint'] != fingerprint:
+                return Response(
+                    {"error": "Idempotency-Key was already used for a different request."},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                )
+            if stored.get('in_progress'):
+                return Response({"error": "Request with this Idempotency-Key is in progress."}, status=status.HTTP_409_CONFLICT)
+            return Response(stored['data'], status=stored['status'], headers={'Idempotent-Replayed': 'true'})
+
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except Exception:
+            cache.delete(cache_key)
+            raise
+
+        if status.is_success(response.status_code):
+            cache.set(
+                cache_key,
+                {'fingerprint': fingerprint, 'status': response.status_code, 'data': response.data},
+                timeout=settings.IDEMPOTENCY_KEY_TTL,
+            )
+        else:
+            # Failed writes changed nothing, so the client may retry them with the same key
+            cache.delete(cache_key)
+        return response
+
+    return wrapper
@@ -0,0 +1,139 @@
+import secrets
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+# Fast enough to run on every response; the top levels are meant for static assets
+BROTLI_QUALITY = 5
+
+
+def accepted_encodings(header):
+    """Content codings from an Accept-Encoding header, mapped to their q-values."""
+    accepted = {}
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    return accepted
+
+
+def preferred_encoding(header, available):
+    """
+    The coding among `available` that an Accept-Encoding header ranks highest.
+
+    Codings with q=0 are refused. Ties go to the earlier coding in
+    `available`, and to any coding over an identity of the same q-value.
+
+    Returns:
+        str: The chosen coding, or "identity" to send the body as it is.
+    """
+    accepted = accepted_encodings(header)
+    wildcard = accepted.get('*', 0)
+    quality, _, coding = max(
+        ((accepted.get(coding, wildcard), -index, coding) for index, coding in enumerate(available)),
+        default=(0, 0, 'identity'),
+    )
+    if quality <= 0 or quality < accepted.get('identity', 0):
+        return 'identity'
+    return coding
+
+
+def compress_brotli_sequence(sequence, *, max_random_bytes):
+    """
+    Brotli-compress an iterable of byte strings, after 1 to `max_random_bytes` bytes of padding.
+
+    The padding is a metadata meta-block, which decoders skip. A flush
+    before any data makes the encoder end its stream header with an empty
+    metadata block, byte aligned; that block is rewritten to carry the
+    padding, so the compressed data that follows is left as it is.
+    """
+    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+    start = int.from_bytes(compressor.flush(), 'little')
+    # The window size header is 1, 4 or 7 bits long
+    if not start & 1:
+        header_bits = 1
+    elif start >> 1 & 0b111:
+        header_bits = 4
+    else:
+        header_bits = 7
+    padding = secrets.randbelow(max_random_bytes) + 1
+    # ISLAST=0, MNIBBLES=0 (metadata), reserved 0, one MSKIPLEN byte, then byte alignment
+    metadata = 0b110 | 1 << 4 | (padding - 1) << 6
+    start = start & ((1 << header_bits) - 1) | metadata << header_bits
+    yield start.to_bytes((header_bits + 14 + 7) // 8, 'little') + bytes(padding)
+
+    for item in sequence:
+        data = compressor.process(item)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+def compress_brotli_string(s, *, max_random_bytes):
+    return b''.join(compress_brotli_sequence([s], max_random_bytes=max_random_bytes))
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Django's GZipMiddleware, for bodies worth compressing and honouring q-values.
+
+    GZipMiddleware pads every compressed body with a random number of bytes,
+    so response sizes no longer reveal how well a secret in an authenticated
+    response compresses next to attacker-controlled input (BREACH). Bodies
+    smaller than COMPRESSION_MIN_SIZE bytes are sent as they are; there the
+    CPU cost outweighs the bytes saved. Clients that refuse gzip or rank
+    identity above it get the body uncompressed. Place it near the top of
+    MIDDLEWARE so it sees the final body.
+
+    When the brotli package is installed, clients that rank br at least as
+    high as gzip get brotli, padded the same way with a metadata block.
+    """
+
+    def process_response(self, request, response):
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+        available = ('gzip',) if brotli is None or getattr(response, 'is_async', False) else ('br', 'gzip')
+        encoding = preferred_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''), available)
+        if encoding == 'gzip':
+            return super().process_response(request, response)
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if encoding == 'br' and not response.has_header('Content-Encoding'):
+            self.compress_brotli(response)
+        return response
+
+    def compress_brotli(self, response):
+        """Brotli-compress the body in place, as GZipMiddleware does with gzip."""
+        if response.streaming:
+            response.streaming_content = compress_brotli_sequence(
+                response.streaming_content, max_random_bytes=self.max_random_bytes
+            )
+            # The compressed size is only known once it has been streamed
+            del response.headers['Content-Length']
+        else:
+            compressed = compress_brotli_string(response.content, max_random_bytes=self.max_random_bytes)
+            # Only send it compressed if that is actually shorter
+            if len(compressed) >= len(response.content):
+                return
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        # A strong ETag names the exact bytes, which compression changes
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
@@ -0,0 +1,24 @@
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination over an indexed, stable ordering.
+
+    Each page is fetched with `WHERE <ordering> < <cursor position> LIMIT n`
+    rather than an OFFSET, so page 1000 costs the same as page 1 and rows
+    inserted while a client pages through never shift or repeat entries.
+
+    Views choose their ordering with an `ordering` attribute, which should be
+    backed by an index; the default suits models with a `created_at` column.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('-created_at', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'ordering', None)
+        if ordering:
+            return (ordering,) if isinstance(ordering, str) else tuple(ordering)
+        return super().get_ordering(request, queryset, view)
@@ -0,0 +1,142 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from rest_framework.response import Response
+
+RESPONSE_CACHE_KEY = "response-cache:{}"
+RESPONSE_CACHE_VALIDATORS_KEY = "response-cache:validators:{}"
+RESPONSE_CACHE_VERSION_KEY = "response-cache:version:{}"
+RESPONSE_CACHE_STATS_KEY = "response-cache:stats:{}"
+
+# Response headers that are stored with a cached body and replayed on hits
+CACHED_HEADERS = ('ETag', 'Last-Modified', 'Cache-Control')
+
+
+def invalidate_response_cache(namespace, pk=None):
+    """
+    Retire the cached responses of a namespace once the current transaction commits.
+
+    Bumping a version makes every key built from it unreachable, so nothing
+    has to be found and deleted; the orphaned entries simply expire. Lists
+    depend on the namespace version, details on the version of their object,
+    so changing one object leaves the other objects' detail pages cached.
+
+    Args:
+        namespace: Resource family, e.g. "events".
+        pk: The changed object, if there is one.
+    """
+    keys = [namespace] if pk is None else [namespace, f'{namespace}:{pk}']
+    transaction.on_commit(lambda: _bump_versions(keys))
+
+
+def response_cache_stats():
+    """Hit and miss counts of the response cache since the counters were last reset."""
+    counts = cache.get_many([RESPONSE_CACHE_STATS_KEY.format(outcome) for outcome in ('hits', 'misses')])
+    return {outcome: counts.get(RESPONSE_CACHE_STATS_KEY.format(outcome), 0) for outcome in ('hits', 'misses')}
+
+
+def _bump_versions(keys):
+    for key in keys:
+        _increment(RESPONSE_CACHE_VERSION_KEY.format(key))
+
+
+def _increment(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+class ResponseCacheMixin:
+    """
+    Serve successful GET responses of read-heavy views from the cache.
+
+    Keys combine the request path, the caller and the negotiated media type
+    with the versions of the namespaces the response is built from:
+    `cache_namespace` for the view's own model (per object on retrieve) and
+    `cache_depends_on` for anything else it embeds or filters on. Model
+    signals bump those versions through invalidate_response_cache().
+
+    Hits never touch the database; validators cached with the response still
+    answer If-None-Match with a 304. Put this mixin before ConditionalGetMixin
+    so the validator query is skipped on hits too. On misses the validator
+    aggregate is cached as well, per listing, so every page of the same
+    filters shares one aggregate until the versions move.
+    """
+    cache_namespace = None
+    cache_depends_on = ()
+
+    def get_response_cache_key(self, request, namespaces):
+        parts = [
+            type(self).__name__,
+            str(request.user.pk),
+            request.get_full_path(),
+            request.accepted_media_type or '',
+            *self.get_namespace_versions(namespaces),
+        ]
+        return RESPONSE_CACHE_KEY.format(hashlib.sha256('|'.join(parts).encode()).hexdigest())
+
+    def get_namespace_versions(self, namespaces):
+        versions = cache.get_many([RESPONSE_CACHE_VERSION_KEY.format(namespace) for namespace in namespaces])
+        return [f'{namespace}={versions.get(RESPONSE_CACHE_VERSION_KEY.format(namespace), 0)}' for namespace in namespaces]
+
+    def get_conditional_aggregates(self, queryset, fields):
+        # Pages of one listing share the aggregate: drop the parameters that only pick the page
+        paginator = self.paginator
+        page_params = {
+            getattr(paginator, name, None) for name in ('cursor_query_param', 'page_query_param', 'page_size_query_param')
+        }
+        query = self.request.query_params.copy()
+        for param in page_params - {None}:
+            query.pop(param, None)
+        parts = [
+            type(self).__name__,
+            str(self.request.user.pk),
+            self.request.path,
+            query.urlencode(),
+            *fields,
+            *self.get_namespace_versions([self.cache_namespace, *self.cache_depends_on]),
+        ]
+        key = RESPONSE_CACHE_VALIDATORS_KEY.format(hashlib.sha256('|'.join(parts).encode()).hexdigest())
+        aggregates = cache.get(key)
+        if aggregates is None:
+            aggregates = super().get_conditional_aggregates(queryset, fields)
+            cache.set(key, aggregates, timeout=settings.RESPONSE_CACHE_TIMEOUT)
+        return aggregates
+
+    def cached_response(self, request, namespaces, view_method, *args, **kwargs):
+        key = self.get_response_cache_key(request, [*namespaces, *self.cache_depends_on])
+        stored = cache.get(key)
+        if stored is not None:
+            _increment(RESPONSE_CACHE_STATS_KEY.format('hits'))
+            headers = stored['headers']
+            if 'ETag' in headers:
+                not_modified = get_conditional_response(request, etag=headers['ETag'])
+                if not_modified is not None:
+                    return not_modified
+            return Response(stored['data'], status=stored['status'], headers=headers)
+
+        _increment(RESPONSE_CACHE_STATS_KEY.format('misses'))
+        response = view_method(request, *args, **kwargs)
+        if response.status_code == 200 and isinstance(response, Response):
+            cache.set(
+                key,
+                {
+                    'data': response.data,
+                    'status': response.status_code,
+                    'headers': {header: response[header] for header in CACHED_HEADERS if response.has_header(header)},
+                },
+                timeout=settings.RESPONSE_CACHE_TIMEOUT,
+            )
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, [self.cache_namespace], super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        return self.cached_response(request, [f'{self.cache_namespace}:{pk}'], super().retrieve, *args, **kwargs)
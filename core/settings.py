@@ -4,6 +4,7 @@ from pathlib import Path
 import sys
 from dotenv import load_dotenv
 from datetime import timedelta
+from corsheaders.defaults import default_headers
 
 load_dotenv()
 
@@ -24,6 +25,7 @@ DJ_DEFAULT_INSTALLED_APPS=[
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 ]
 THIRD_PARTY_APPS=[
     'django_extensions',
@@ -51,6 +53,7 @@ INSTALLED_APPS = DJ_DEFAULT_INSTALLED_APPS + THIRD_PARTY_APPS + CORE_APPS
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -220,7 +223,18 @@ SIMPLE_JWT = {
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'mainapps.accounts.authentication.AccountJWTAuthentication',
-    )
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'core.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'core.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.KeysetPagination',
+    'PAGE_SIZE': 50,
 }
 
 
@@ -237,6 +251,12 @@ CORS_ALLOW_METHODS = (
     "PUT",
 )
 
+CORS_ALLOW_HEADERS = (
+    *default_headers,
+    "idempotency-key",
+    "x-admission-token",
+)
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
     "http://127.0.0.1:3000",
@@ -261,7 +281,42 @@ CACHES = {
         }
     }
 }
+if 'test' in sys.argv:
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
 
 CELERY_BROKER_URL = 'redis://redis:6379/0'
 CELERY_RESULT_BACKEND = 'redis://redis:6379/0'
 
+STRIPE_SEC_KEY = os.getenv('STRIPE_SEC_KEY')
+STRIPE_ENDPOINT_SECRET = os.getenv('STRIPE_ENDPOINT_SECRET')
+STRIPE_API_BASE = os.getenv('STRIPE_API_BASE', 'https://api.stripe.com')
+# Connect and read timeouts for Stripe API calls, in seconds
+STRIPE_TIMEOUT = (3.05, 10)
+# Kept-alive connections to Stripe per process
+STRIPE_MAX_CONNECTIONS = 10
+# Lifetime of a new checkout session; Stripe's minimum is 30 minutes and the group's holds are extended to cover it
+CHECKOUT_SESSION_LIFETIME = 60 * 40
+# Rows read per query by the nightly payment reconciliation
+RECONCILIATION_CHUNK_SIZE = 5000
+
+# Ticket holds: how long a pending booking keeps its tickets before the sweep releases them
+BOOKING_HOLD_TTL = timedelta(minutes=15)
+BOOKING_HOLD_SWEEP_BATCH_SIZE = 500
+
+# Waitlist entries read from the Redis queue per round when tickets are released
+WAITLIST_PROMOTION_BATCH_SIZE = 100
+
+# How long a waiting room admission token lets its holder book, in seconds
+ADMISSION_TOKEN_MAX_AGE = 60 * 10
+
+# How long a completed write's response is replayed for retries with the same Idempotency-Key, in seconds
+IDEMPOTENCY_KEY_TTL = 60 * 60 * 24
+
+# Upper bound on how long a cached catalog response lives; signals retire it sooner when the data changes
+RESPONSE_CACHE_TIMEOUT = 60 * 5
+
+# Response bodies smaller than this many bytes are sent uncompressed
+COMPRESSION_MIN_SIZE = 1024
+
@@ -0,0 +1,130 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+
+def _query_param_set(request, name):
+    value = request.query_params.get(name, '') if request is not None else ''
+    return {item.strip() for item in value.split(',') if item.strip()}
+
+
+class SparseFieldsSerializerMixin:
+    """
+    Let clients trim and widen a ModelSerializer from the query string.
+
+    - `?fields=id,name` keeps only the listed fields.
+    - `?expand=venue,artist` replaces the listed relations' primary keys with
+      the serializers named in `Meta.expandable_fields`.
+
+    Only the top-level serializer of a GET request reacts; nested and expanded
+    serializers render in full. `Meta.field_sources` names the model fields
+    behind fields the mixin cannot see through, such as SerializerMethodFields,
+    so query_plan() can still narrow the query.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None or request.method != 'GET' or not self._is_top_level():
+            return fields
+
+        expandable = getattr(self.Meta, 'expandable_fields', {})
+        expand = _query_param_set(request, 'expand') & set(expandable)
+        for name in expand:
+            fields[name] = expandable[name](read_only=True)
+
+        wanted = _query_param_set(request, 'fields')
+        if wanted:
+            fields = {name: field for name, field in fields.items() if name in wanted or name in expand}
+        return fields
+
+    def _is_top_level(self):
+        parent = self.parent
+        return parent is None or (isinstance(parent, serializers.ListSerializer) and parent.parent is None)
+
+    def query_plan(self, prefix=''):
+        """
+        Work out which columns and joins this serializer's fields read.
+
+        Returns:
+            tuple: (only, select_related) lists of lookups, with `only` None
+            when some field reads something that cannot be traced to a column.
+        """
+        model = self.Meta.model
+        field_sources = getattr(self.Meta, 'field_sources', {})
+        only, related = [f'{prefix}{model._meta.pk.name}'], []
+
+        for name, field in self.fields.items():
+            if name in field_sources:
+                only.extend(f'{prefix}{source}' for source in field_sources[name])
+                continue
+            if isinstance(field, serializers.ListSerializer):
+                continue  # To-many relations are prefetched by the view and need only the primary key
+            if field.source == '*':
+                return None, related
+
+            attr = field.source_attrs[0]
+            try:
+                model_field = model._meta.get_field(attr)
+            except FieldDoesNotExist:
+                return None, related
+
+            if not model_field.is_relation:
+                only.append(f'{prefix}{attr}')
+                continue
+
+            if isinstance(field, serializers.BaseSerializer):
+                # Nested or expanded object
+                related.append(f'{prefix}{attr}')
+                nested_only, nested_related = (
+                    field.query_plan(f'{prefix}{attr}__') if isinstance(field, SparseFieldsSerializerMixin) else (None, [])
+                )
+                related.extend(nested_related)
+                only.extend(nested_only if nested_only is not None else [f'{prefix}{attr}'])
+            elif len(field.source_attrs) > 1:
+                # Dotted source such as "venue.city"
+                related.append(f'{prefix}{attr}')
+                only.append(f"{prefix}{'__'.join(field.source_attrs)}")
+            else:
+                only.append(f'{prefix}{attr}')
+        return only, related
+
+    def optimize_queryset(self, queryset, required=()):
+        """
+        Narrow `queryset` to the columns and joins the selected fields need.
+
+        Args:
+            queryset: The view's queryset.
+            required: Extra fields the view reads itself, such as the ordering.
+        """
+        only, related = self.query_plan()
+        if only is None:
+            # Some field reads attributes that cannot be traced, so keep every column and join
+            return queryset.select_related(*related) if related else queryset
+
+        # Joins the view set up for fields that are no longer selected would be wasted
+        queryset = queryset.select_related(None)
+        if related:
+            queryset = queryset.select_related(*related)
+        return queryset.only(*only, *required)
+
+
+class SparseFieldsViewMixin:
+    """
+    Shrink the query of GET requests that use `?fields=` or `?expand=`.
+
+    The serializer must use SparseFieldsSerializerMixin. Columns no selected
+    field reads are left out with only(), and expanded relations are joined
+    with select_related() instead of being loaded one row at a time.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        params = self.request.query_params if self.request is not None else {}
+        if self.request is None or self.request.method != 'GET' or not (params.get('fields') or params.get('expand')):
+            return queryset
+
+        ordering = getattr(self, 'ordering', None) or getattr(self.paginator, 'ordering', None) or ()
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        required = [field.lstrip('-') for field in ordering]
+        return self.get_serializer().optimize_queryset(queryset, required)
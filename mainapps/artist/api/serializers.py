@@ -1,7 +1,9 @@
 from rest_framework import serializers
+from core.sparse_fields import SparseFieldsSerializerMixin
+from mainapps.artist.genres import genre_ids_by_slug
 from mainapps.artist.models import Artist, Genre
 
-class ArtistSerializer(serializers.ModelSerializer):
+class ArtistSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for the Artist model.
 
@@ -16,18 +18,47 @@ class ArtistSerializer(serializers.ModelSerializer):
         
 
 
+def validate_genre_slugs(slugs):
+    """Check slugs against the cached genre catalog and return their genre ids."""
+    ids_by_slug = genre_ids_by_slug()
+    if invalid := [slug for slug in slugs if slug not in ids_by_slug]:
+        raise serializers.ValidationError(f"Invalid genres: {', '.join(invalid)}")
+    return [ids_by_slug[slug] for slug in dict.fromkeys(slugs)]
+
+
 class ArtistGenreUpdateSerializer(serializers.ModelSerializer):
     genres = serializers.ListField(
         child=serializers.CharField(),
         write_only=True,
-        help_text="List of permission codenames to assign"
+        help_text="Slugs of the genres the artist plays"
     )
 
+    def validate_genres(self, slugs):
+        return validate_genre_slugs(slugs)
+
     class Meta:
         model = Artist
         fields = ['genres']
 
+
+class GenreBulkAssignSerializer(serializers.Serializer):
+    artists = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=1000)
+    genres = serializers.ListField(child=serializers.CharField(), allow_empty=False, help_text="Genre slugs")
+    replace = serializers.BooleanField(default=False, help_text="Remove the artists' other genres")
+
+    def validate_artists(self, artist_ids):
+        artist_ids = list(dict.fromkeys(artist_ids))
+        existing = set(Artist.objects.filter(pk__in=artist_ids).values_list('pk', flat=True))
+        if missing := [str(pk) for pk in artist_ids if pk not in existing]:
+            raise serializers.ValidationError(f"Unknown artist(s): {', '.join(missing)}")
+        return artist_ids
+
+    def validate_genres(self, slugs):
+        return validate_genre_slugs(slugs)
+
 class GenreDetailSerializer(serializers.Serializer):
+    name = serializers.CharField(read_only=True)
+    slug = serializers.SlugField(read_only=True)
     has_permission = serializers.BooleanField(read_only=True)
     class Meta:
         model = Genre
@@ -7,5 +7,6 @@ router.register(r'artists', views.ArtistViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
-    path('genres/<int:pk>/', views.ArtistGenre.as_view(), name='artist-genre')
+    path('genres/<int:pk>/', views.ArtistGenre.as_view(), name='artist-genre'),
+    path('genres/bulk-assign/', views.GenreBulkAssign.as_view(), name='genre-bulk-assign'),
 ]
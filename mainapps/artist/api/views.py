@@ -1,13 +1,16 @@
 from rest_framework import viewsets
-from mainapps.artist.models import Artist,Genre
-from .serializers import ArtistSerializer, ArtistGenreUpdateSerializer,GenreDetailSerializer
+from django.db import transaction
+from mainapps.artist.genres import assign_genres, genre_catalog
+from mainapps.artist.models import Artist
+from .serializers import ArtistSerializer, ArtistGenreUpdateSerializer, GenreBulkAssignSerializer, GenreDetailSerializer
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework import generics
 from rest_framework import permissions
-from django.db.models import Exists, OuterRef
+from core.response_cache import ResponseCacheMixin
+from core.sparse_fields import SparseFieldsViewMixin
 
-class ArtistViewSet(viewsets.ModelViewSet):
+class ArtistViewSet(ResponseCacheMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows artists to be viewed or edited.
 
@@ -19,12 +22,16 @@ class ArtistViewSet(viewsets.ModelViewSet):
     """
     queryset = Artist.objects.all()
     serializer_class = ArtistSerializer
+    ordering = ('-id',)
+    cache_namespace = 'artists'
     permission_classes = [permissions.IsAuthenticated,]
 
-class ArtistGenre(generics.RetrieveUpdateAPIView):
+class ArtistGenre(ResponseCacheMixin, generics.RetrieveUpdateAPIView):
     queryset = Artist.objects.all() 
     permission_classes = [permissions.IsAuthenticated,]
     lookup_field = 'pk'
+    cache_namespace = 'artists'
+    cache_depends_on = ('genres',)
     
     def get_serializer_class(self):
         if getattr(self, 'swagger_fake_view', False):
@@ -35,19 +42,21 @@ class ArtistGenre(generics.RetrieveUpdateAPIView):
     
     def get(self, request, *args, **kwargs):
         """Get all genre with artist status"""
+        return self.cached_response(request, [f"artists:{kwargs['pk']}"], self.list_genres, *args, **kwargs)
+
+    def list_genres(self, request, *args, **kwargs):
         artist = self.get_object()
-        
-        genres = Genre.objects.annotate(
-            has_permission=Exists(
-                artist.genres.through.objects.filter(
-                    artist_id=artist.id,  
-                    genre_id=OuterRef('id')
-                )
-            )
-        )
+
+        # The catalog comes from memory; only the artist's own genre ids are queried
+        selected = set(artist.genres.through.objects.filter(artist_id=artist.pk).values_list('genre_id', flat=True))
+        genres = [
+            {'name': name, 'slug': slug, 'has_permission': pk in selected}
+            for pk, name, slug in genre_catalog()
+        ]
         serializer = self.get_serializer(genres, many=True)
 
         return Response({'genres': serializer.data})
+
     def put(self, request, *args, **kwargs):
 
         """Update artist genres with complete list"""
@@ -56,23 +65,37 @@ class ArtistGenre(generics.RetrieveUpdateAPIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         
-        # Validate all genre slugs exist
-        slugs = serializer.validated_data['genres']
-        valid_genres = Genre.objects.filter(slug__in=slugs)
-        
-        # Check for invalid genres
-        received_genres = set(slugs)
-        valid_slugs = set(valid_genres.values_list('slug', flat=True))
-        if invalid := slugs - valid_slugs:
-            return Response(
-                {"detail": f"Invalid genres: {', '.join(invalid)}"},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Atomic genre update
         with transaction.atomic():
-            artist.genres.set.set(valid_genres)
+            artist.genres.set(serializer.validated_data['genres'])
         
         return Response({'status': 'genres updated'}, status=status.HTTP_200_OK)
+
+
+class GenreBulkAssign(generics.GenericAPIView):
+    """
+    Give many artists the same genres in one request.
+
+    Endpoint:
+    - POST /genres/bulk-assign/ {"artists": [1, 2], "genres": ["afrobeats", "jazz"], "replace": false}
+
+    With `replace`, each artist ends up with exactly the given genres;
+    otherwise the genres are added to the ones they already have.
+    """
+    serializer_class = GenreBulkAssignSerializer
+    permission_classes = [permissions.IsAuthenticated,]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        assign_genres(
+            serializer.validated_data['artists'],
+            serializer.validated_data['genres'],
+            replace=serializer.validated_data['replace'],
+        )
+        return Response({
+            'status': 'genres assigned',
+            'artists': len(serializer.validated_data['artists']),
+            'genres': len(serializer.validated_data['genres']),
+        }, status=status.HTTP_200_OK)
     
 
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ArtistConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "mainapps.artist"
+
+    def ready(self):
+        import mainapps.artist.signals
@@ -0,0 +1,77 @@
+from django.core.cache import cache
+from django.db import transaction
+
+from core.response_cache import invalidate_response_cache
+from .models import Artist, Genre
+
+GENRE_CATALOG_VERSION_KEY = "artist:genre-catalog:version"
+
+_catalog = (None, ())
+
+
+def genre_catalog():
+    """
+    Every genre as (id, name, slug) tuples, ordered by name.
+
+    The catalog is held in process memory and reloaded only when its version
+    in the shared cache moves, so a read costs one cache lookup and no query.
+    Any process that changes a genre bumps the version on commit, which makes
+    every other process reload on its next read.
+    """
+    global _catalog
+    version = cache.get(GENRE_CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(GENRE_CATALOG_VERSION_KEY, 0, timeout=None)
+        version = cache.get(GENRE_CATALOG_VERSION_KEY, 0)
+
+    loaded_version, genres = _catalog
+    if loaded_version != version:
+        genres = tuple(Genre.objects.order_by('name').values_list('id', 'name', 'slug'))
+        # Swapped in as one tuple so concurrent readers never see a torn catalog
+        _catalog = (version, genres)
+    return genres
+
+
+def genre_ids_by_slug():
+    return {slug: pk for pk, _, slug in genre_catalog()}
+
+
+def invalidate_genre_catalog():
+    """Make every process reload the genre catalog once the current transaction commits."""
+    transaction.on_commit(_bump_catalog_version)
+
+
+def _bump_catalog_version():
+    try:
+        cache.incr(GENRE_CATALOG_VERSION_KEY)
+    except ValueError:
+        if not cache.add(GENRE_CATALOG_VERSION_KEY, 1, timeout=None):
+            cache.incr(GENRE_CATALOG_VERSION_KEY)
+
+
+def assign_genres(artist_ids, genre_ids, replace=False):
+    """
+    Give many artists the same genres in two statements at most.
+
+    Existing pairs are skipped by the database rather than checked one by
+    one. With `replace`, genres outside `genre_ids` are first taken off the
+    artists. The join table is written directly, so m2m_changed does not
+    fire; the cached responses it would have retired are retired here.
+
+    Args:
+        artist_ids: Artists to update.
+        genre_ids: Genres to give them.
+        replace: Remove the artists' other genres.
+    """
+    through = Artist.genres.through
+    with transaction.atomic():
+        if replace:
+            through.objects.filter(artist_id__in=artist_ids).exclude(genre_id__in=genre_ids).delete()
+        through.objects.bulk_create(
+            [through(artist_id=artist_id, genre_id=genre_id) for artist_id in artist_ids for genre_id in genre_ids],
+            ignore_conflicts=True,
+        )
+
+        invalidate_response_cache('genres')
+        for artist_id in artist_ids:
+            invalidate_response_cache('artists', artist_id)
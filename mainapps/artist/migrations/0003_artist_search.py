@@ -0,0 +1,62 @@
+# Generated by Django 5.1.8 on 2026-10-18 08:45
+
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+SEARCH_SQL = """
+CREATE FUNCTION artist_artist_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.bio, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER artist_artist_search_vector_trigger
+    BEFORE INSERT OR UPDATE ON artist_artist
+    FOR EACH ROW EXECUTE FUNCTION artist_artist_search_vector_update();
+
+UPDATE artist_artist SET search_vector =
+    setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(bio, '')), 'B');
+
+CREATE INDEX artist_search_vector_idx ON artist_artist USING gin (search_vector);
+CREATE INDEX artist_name_trgm_idx ON artist_artist USING gin (name gin_trgm_ops);
+"""
+
+DROP_SEARCH_SQL = """
+DROP INDEX IF EXISTS artist_name_trgm_idx;
+DROP INDEX IF EXISTS artist_search_vector_idx;
+DROP TRIGGER IF EXISTS artist_artist_search_vector_trigger ON artist_artist;
+DROP FUNCTION IF EXISTS artist_artist_search_vector_update();
+"""
+
+
+def create_search_trigger(apps, schema_editor):
+    # GIN indexes and triggers are PostgreSQL only; other databases search with LIKE
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(SEARCH_SQL)
+
+
+def drop_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_SEARCH_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('artist', '0002_genre_slug_alter_artist_genres'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='artist',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_trigger, drop_search_trigger),
+    ]
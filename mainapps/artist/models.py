@@ -1,4 +1,7 @@
-from django.db import models
+from django.contrib.postgres.search import SearchVectorField
+import uuid
+
+from django.db import IntegrityError, models, transaction
 from django.utils.text import slugify
 
 class Genre(models.Model):
@@ -16,13 +19,30 @@ class Genre(models.Model):
     def save(self, *args, **kwargs):
         """
         Auto-generate a unique slug from the genre name before saving.
+
+        The slug is the slugified name. If another genre already has it, the
+        genre's primary key is appended after a double hyphen ("hip-hop--12"):
+        slugify() collapses hyphen runs, so no plain name slug can take that
+        form, and primary keys are unique, so no retry loop is needed.
         """
-        if not self.slug:
-            self.slug = slugify(self.name)
-            # Ensure uniqueness
-            while Genre.objects.filter(slug=self.slug).exists():
-                self.slug = f"{slugify(self.name)}-{Genre.objects.count()}"
-        super().save(*args, **kwargs)
+        if self.slug:
+            return super().save(*args, **kwargs)
+
+        base = slugify(self.name) or 'genre'
+        try:
+            with transaction.atomic():
+                self.slug = base
+                return super().save(*args, **kwargs)
+        except IntegrityError:
+            if not Genre.objects.filter(slug=base).exclude(pk=self.pk).exists():
+                raise  # Not a slug clash, e.g. a duplicate name
+
+        with transaction.atomic():
+            # The primary key is only known after the insert, so park a unique placeholder first
+            self.slug = f"{base}--{uuid.uuid4().hex[:16]}"
+            super().save(*args, **kwargs)
+            self.slug = f"{base}--{self.pk}"
+            Genre.objects.filter(pk=self.pk).update(slug=self.slug)
 
     def __str__(self):
         """
@@ -44,6 +64,8 @@ class Artist(models.Model):
         website (URLField): An optional URL for the artist's website.
         contact_email (EmailField): The contact email address for the artist.
         contact_phone (CharField): An optional contact phone number for the artist.
+        search_vector (SearchVectorField): Weighted name and bio lexemes, kept up to
+            date by a database trigger on PostgreSQL.
     """
     name = models.CharField(max_length=100)
     genres = models.ManyToManyField(Genre, related_name='artists', blank=True,)
@@ -51,6 +73,7 @@ class Artist(models.Model):
     website = models.URLField(blank=True)
     contact_email = models.EmailField()
     contact_phone = models.CharField(max_length=15, blank=True)
+    search_vector = SearchVectorField(null=True, editable=False)
 
     def __str__(self):
         """
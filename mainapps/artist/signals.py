@@ -0,0 +1,30 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from core.response_cache import invalidate_response_cache
+from .genres import invalidate_genre_catalog
+from .models import Artist, Genre
+
+
+@receiver(post_save, sender=Artist)
+@receiver(post_delete, sender=Artist)
+def invalidate_cached_artist(sender, instance, **kwargs):
+    invalidate_response_cache('artists', instance.pk)
+
+
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+def invalidate_cached_genre(sender, instance, **kwargs):
+    invalidate_response_cache('genres', instance.pk)
+    invalidate_genre_catalog()
+
+
+@receiver(m2m_changed, sender=Artist.genres.through)
+def invalidate_cached_artist_genres(sender, instance, action, pk_set, **kwargs):
+    """Genre listings and genre filters depend on which artists play what."""
+    if not action.startswith('post_'):
+        return
+    invalidate_response_cache('genres')
+    artist_ids = [instance.pk] if isinstance(instance, Artist) else (pk_set or ())
+    for artist_id in artist_ids:
+        invalidate_response_cache('artists', artist_id)
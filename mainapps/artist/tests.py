@@ -1,3 +1,91 @@
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from mainapps.artist.genres import genre_catalog
+from mainapps.artist.models import Artist, Genre
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class ListQueryCountTests(TestCase):
+    """Artist list endpoints must issue the same number of queries for one row as for many."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user(email="lister@example.com"))
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def make_artist(self):
+        artist = Artist.objects.create(name="Query Count", contact_email="artist@example.com")
+        artist.genres.add(Genre.objects.create(name=f"Genre {Genre.objects.count()}"))
+        return artist
+
+    def test_artists(self):
+        self.make_artist()
+        single = self.count_queries('/artist_api/v1/artists/')
+        for _ in range(9):
+            self.make_artist()
+        self.assertEqual(self.count_queries('/artist_api/v1/artists/'), single)
+
+    def test_artist_genres(self):
+        artist = self.make_artist()
+        single = self.count_queries(f'/artist_api/v1/genres/{artist.pk}/')
+        for _ in range(9):
+            self.make_artist()
+        self.assertEqual(self.count_queries(f'/artist_api/v1/genres/{artist.pk}/'), single)
+
+
+class ResponseCacheTests(TestCase):
+    """Catalog responses come from the cache until a signal retires them."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user(email="reader@example.com"))
+        self.artist = Artist.objects.create(name="Cached", contact_email="artist@example.com")
+        self.url = f'/artist_api/v1/artists/{self.artist.pk}/'
+
+    def test_hit_skips_the_database_until_the_artist_changes(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).data['name'], "Cached")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.artist.name = "Renamed"
+            self.artist.save()
+        self.assertEqual(self.client.get(self.url).data['name'], "Renamed")
+
+
+class GenreTests(TestCase):
+
+    def test_clashing_slug_gets_the_primary_key(self):
+        Genre.objects.create(name="Hip Hop")
+        clash = Genre.objects.create(name="Hip-Hop!")
+        self.assertEqual(clash.slug, f"hip-hop--{clash.pk}")
+        self.assertEqual(Genre.objects.get(pk=clash.pk).slug, clash.slug)
+
+    def test_bulk_assign_replaces_genres(self):
+        client = APIClient()
+        client.force_authenticate(get_user_model().objects.create_user(email="editor@example.com"))
+        with self.captureOnCommitCallbacks(execute=True):
+            jazz, soul = Genre.objects.create(name="Jazz"), Genre.objects.create(name="Soul")
+        artists = [Artist.objects.create(name=f"Artist {i}", contact_email="artist@example.com") for i in range(3)]
+        artists[0].genres.add(soul)
+        genre_catalog()
+
+        # Artist check, then delete and insert inside a savepoint; the genres come from memory
+        with self.assertNumQueries(5):
+            response = client.post('/artist_api/v1/genres/bulk-assign/', {
+                'artists': [artist.pk for artist in artists], 'genres': ['jazz'], 'replace': True,
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+        for artist in artists:
+            self.assertEqual(list(artist.genres.all()), [jazz])
@@ -1,3 +1,32 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+
+from mainapps.payment.confirmation import LatePayment, confirm_booking_group
+from .models import BookingGroup
 
 # Register your models here.
+
+
+@admin.register(BookingGroup)
+class BookingGroupAdmin(admin.ModelAdmin):
+    list_display = ('reference', 'status', 'total_price', 'created_by', 'created_at')
+    list_filter = ('status',)
+    list_select_related = ('created_by',)
+    search_fields = ('reference',)
+    actions = ['confirm_bank_transfer']
+
+    @admin.action(description="Confirm payment received by bank transfer")
+    def confirm_bank_transfer(self, request, queryset):
+        confirmed, late = 0, []
+        for booking_group in queryset:
+            try:
+                if confirm_booking_group(booking_group, payment_reference=f"admin:{request.user.pk}:{booking_group.reference}", payment_method='bank'):
+                    confirmed += 1
+            except LatePayment:
+                late.append(booking_group.reference)
+        self.message_user(request, f"{confirmed} booking group(s) marked paid.", messages.SUCCESS)
+        if late:
+            self.message_user(
+                request,
+                f"Holds already lapsed, refund the transfer instead: {', '.join(late)}.",
+                messages.WARNING,
+            )
@@ -0,0 +1,77 @@
+from rest_framework import permissions
+from rest_framework.exceptions import PermissionDenied
+
+from core.idempotency import is_replay
+from ..models import Event
+from ..waiting_room import admissions_unused, admitted_events, use_admissions
+
+
+class HasAdmissionToken(permissions.BasePermission):
+    """
+    Booking writes for events behind a virtual waiting room need an admission token.
+
+    The view names the event sections a request books through
+    `get_requested_event_sections()`, which is also given the booking for
+    updates; updates that change neither its section nor its number of
+    tickets name none. Tokens are sent in the X-Admission-Token header,
+    comma separated when an order spans several gated events, and each
+    admits one write.
+
+    The check only makes sure the tokens are valid and unused. The view
+    spends them with `spend_admissions()` in the write's transaction, once
+    the request has passed validation, so a rejected request keeps the
+    user's place. Retries that an @idempotent view replays are let through,
+    as the original request already spent the tokens.
+    """
+    message = "This on-sale uses a waiting room. Join it and retry with your admission token."
+
+    def has_permission(self, request, view):
+        if request.method != 'POST':
+            return True
+        return self.admitted(request, view, view.get_requested_event_sections())
+
+    def has_object_permission(self, request, view, obj):
+        if request.method not in ('PUT', 'PATCH'):
+            return True
+        return self.admitted(request, view, view.get_requested_event_sections(obj))
+
+    def admitted(self, request, view, requested_section_ids):
+        request.admissions = {}
+        section_ids = []
+        for section_id in requested_section_ids:
+            try:
+                section_ids.append(int(section_id))
+            except (TypeError, ValueError):
+                continue  # Left for the serializer to reject
+
+        gated = set(
+            Event.objects.filter(event_sections__in=section_ids, admission_rate__isnull=False)
+            .values_list('pk', flat=True)
+            .distinct()
+        )
+        if not gated or is_replay(view, request):
+            return True
+
+        tokens = [token.strip() for token in request.headers.get('X-Admission-Token', '').split(',') if token.strip()]
+        admissions = admitted_events(tokens, request.user)
+        if not gated <= admissions.keys():
+            return False
+        admissions = {event_id: admissions[event_id] for event_id in gated}
+        if not admissions_unused(request.user, admissions):
+            return False
+        request.admissions = admissions
+        return True
+
+
+def spend_admissions(request):
+    """
+    Spend the admission tokens HasAdmissionToken accepted for this request.
+
+    Call inside the write's transaction after the write succeeded, so a token
+    spent by a concurrent request rolls the write back.
+
+    Raises:
+        PermissionDenied: A token was used by another request in the meantime.
+    """
+    if not use_admissions(request.user, getattr(request, 'admissions', {})):
+        raise PermissionDenied(HasAdmissionToken.message)
@@ -0,0 +1,132 @@
+from django.http import Http404
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from ..models import Booking, BookingGroup
+from .serializers import BookingGroupSerializer, BookingSerializer
+
+
+def _output_fields(serializer_class, nested=()):
+    """
+    Output keys of `serializer_class`, in its order, less the `nested` serializers.
+
+    Relations render as primary keys, which is exactly what values() returns
+    under the relation's name, so the keys double as the values() columns.
+    """
+    return tuple(
+        name for name, field in serializer_class().fields.items() if not field.write_only and name not in nested
+    )
+
+
+BOOKING_FIELDS = _output_fields(BookingSerializer)
+# The bookings are loaded by booking_group_rows() with a query of their own
+BOOKING_GROUP_FIELDS = _output_fields(BookingGroupSerializer, nested=('bookings',))
+
+
+def _formatters(serializer_class, names):
+    """
+    The to_representation() of the named fields of `serializer_class`, ready for a response.
+
+    DRF's DateTimeField looks the current time zone up for every value it
+    renders unless the field has its own; it is pinned here once per response.
+    """
+    fields = serializer_class().fields
+    formatters = []
+    for name in names:
+        field = fields[name]
+        if isinstance(field, serializers.DateTimeField) and not hasattr(field, 'timezone'):
+            field.timezone = field.default_timezone()
+        formatters.append((name, field.to_representation))
+    return formatters
+
+
+def _format(rows, serializer_class, names):
+    formatters = _formatters(serializer_class, names)
+    for row in rows:
+        for name, formatter in formatters:
+            value = row[name]
+            if value is not None:
+                row[name] = formatter(value)
+    return rows
+
+
+def booking_rows(rows):
+    """
+    Format booking rows from `values(*BOOKING_FIELDS)` the way BookingSerializer would.
+
+    The rows are dicts and are formatted in place.
+    """
+    return _format(list(rows), BookingSerializer, ('created_at', 'updated_at', 'booking_date', 'total_price'))
+
+
+def booking_group_rows(groups):
+    """
+    Render booking groups the way BookingGroupSerializer would, in one query.
+
+    Args:
+        groups: Dicts holding at least BOOKING_GROUP_FIELDS; other keys,
+            such as the ordering columns pagination needed, are dropped.
+    """
+    rendered = _format(
+        [{field: group[field] for field in BOOKING_GROUP_FIELDS} for group in groups], BookingGroupSerializer, ('total_price',)
+    )
+    by_group = {}
+    for group in rendered:
+        group['bookings'] = by_group[group['id']] = []
+
+    if by_group:
+        bookings = Booking.objects.filter(booking_group_id__in=list(by_group)).order_by('id').values(*BOOKING_FIELDS)
+        for booking in booking_rows(bookings):
+            by_group[booking['booking_group']].append(booking)
+    return rendered
+
+
+class BookingReadMixin:
+    """
+    Serve the plain booking list straight from values() rows.
+
+    Building model instances and running them through BookingSerializer
+    dominates the cost of a large page; the rows here skip both. Requests
+    using `?fields=` or `?expand=` still go through the serializer.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get('fields') or request.query_params.get('expand'):
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset()).values(*BOOKING_FIELDS)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(booking_rows(page))
+        return Response(booking_rows(queryset))
+
+
+class BookingGroupReadMixin:
+    """
+    Serve booking groups and their bookings from values() rows.
+
+    One query loads the groups and one more loads every booking on the page,
+    without model instances or nested serializers.
+    """
+
+    def group_rows(self, queryset):
+        # created_at and id feed the cursor of the keyset pagination; the
+        # bookings are loaded by booking_group_rows() rather than prefetched
+        return queryset.prefetch_related(None).values(*BOOKING_GROUP_FIELDS, 'created_at')
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.group_rows(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(booking_group_rows(page))
+        return Response(booking_group_rows(queryset))
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        )
+        rows = booking_group_rows(self.group_rows(queryset)[:1])
+        if not rows:
+            raise Http404(f"No {BookingGroup._meta.object_name} matches the given query.")
+        return Response(rows[0])
@@ -1,21 +1,51 @@
 from datetime import timezone
+from django.db import transaction
 from rest_framework import serializers
-from ..models import Booking, BookingGroup, EventSection, Venue, VenueSection,Event
+from ..inventory import (
+    InsufficientInventory,
+    assign_seats,
+    create_booking_group,
+    held_tickets,
+    held_tickets_many,
+    move_hold,
+    place_hold,
+    release_tickets,
+    reserve_tickets,
+    tickets_released,
+)
+from core.sparse_fields import SparseFieldsSerializerMixin
+from mainapps.artist.api.serializers import ArtistSerializer
+from mainapps.artist.models import Artist
+from ..discovery import DISCOVERY_ORDERINGS
+from ..search import SEARCHES
+from ..seating import release_seats
+from ..waitlist import join_waitlist, waitlist_position
+from ..models import Booking, BookingGroup, EventAvailability, EventSection, Venue, VenueSection, Event, WaitlistEntry
 
 
-class VenueSerializer(serializers.ModelSerializer):
+class VenueSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Venue
-        fields = '__all__'
+        exclude = ('search_vector',)
         read_only_fields = ('id',)
         
-class VenueSectionSerializer(serializers.ModelSerializer):
+class VenueSectionSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = VenueSection
         fields = '__all__'
         read_only_fields = ('id',)
+        expandable_fields = {'venue': VenueSerializer}
+
+class EventAvailabilitySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = EventAvailability
+        fields = ['event', 'tickets_remaining', 'min_price', 'max_price', 'is_sold_out', 'updated_at']
+        read_only_fields = fields
+
+
+class EventSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
+    availability = EventAvailabilitySerializer(read_only=True)
 
-class EventSerializer(serializers.ModelSerializer):
     def validate_event_date(self, value):
         if value < timezone.now():
             raise serializers.ValidationError("Event date must be in the future.")
@@ -23,11 +53,94 @@ class EventSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Event
-        fields = '__all__'
+        exclude = ('search_vector',)
         read_only_fields = ('id',)
+        expandable_fields = {'venue': VenueSerializer, 'artist': ArtistSerializer}
+
+
+class EventDiscoveryQuerySerializer(serializers.Serializer):
+    """Query parameters accepted by the public event discovery endpoint."""
+    city = serializers.CharField(required=False, max_length=100)
+    date_from = serializers.DateTimeField(required=False)
+    date_to = serializers.DateTimeField(required=False)
+    genre = serializers.SlugField(required=False, help_text="Genre slug")
+    artist = serializers.IntegerField(required=False, min_value=1)
+    min_price = serializers.DecimalField(required=False, max_digits=10, decimal_places=2, min_value=0)
+    max_price = serializers.DecimalField(required=False, max_digits=10, decimal_places=2, min_value=0)
+    sort = serializers.ChoiceField(choices=list(DISCOVERY_ORDERINGS), default='date')
+
+    def validate(self, attrs):
+        if attrs.get('date_from') and attrs.get('date_to') and attrs['date_from'] > attrs['date_to']:
+            raise serializers.ValidationError("date_from must not be after date_to.")
+        if attrs.get('min_price') is not None and attrs.get('max_price') is not None and attrs['min_price'] > attrs['max_price']:
+            raise serializers.ValidationError("min_price must not be above max_price.")
+        return attrs
+
+
+class EventDiscoverySerializer(serializers.ModelSerializer):
+    """Public view of an upcoming event, without any organizer fields."""
+    artist_name = serializers.CharField(source='artist.name', read_only=True)
+    venue_name = serializers.CharField(source='venue.name', read_only=True)
+    city = serializers.CharField(source='venue.city', read_only=True)
+    lowest_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    availability = EventAvailabilitySerializer(read_only=True)
+
+    class Meta:
+        model = Event
+        fields = [
+            'id', 'event_date', 'artist', 'artist_name', 'venue', 'venue_name', 'city',
+            'description', 'ticket_price', 'lowest_price', 'availability',
+        ]
+        read_only_fields = fields
+
+
+class CatalogSearchQuerySerializer(serializers.Serializer):
+    """Query parameters accepted by the catalog search endpoint."""
+    q = serializers.CharField(min_length=2, max_length=100)
+    type = serializers.ChoiceField(choices=list(SEARCHES), required=False, help_text="Search a single kind of result")
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=10)
+
+
+class ArtistSearchResultSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Artist
+        fields = ['id', 'name', 'website']
+        read_only_fields = fields
+
+
+class VenueSearchResultSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Venue
+        fields = ['id', 'name', 'city', 'state']
+        read_only_fields = fields
+
+
+class EventSearchResultSerializer(EventDiscoverySerializer):
+    lowest_price = None
+    availability = None
+
+    class Meta(EventDiscoverySerializer.Meta):
+        fields = ['id', 'event_date', 'artist', 'artist_name', 'venue', 'venue_name', 'city', 'description', 'ticket_price']
+        read_only_fields = fields
+
 
+class EventSectionListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        # Look up the held counts of the whole page at once
+        sections = list(data.all() if hasattr(data, 'all') else data)
+        self.child.held_counts = held_tickets_many([section.pk for section in sections])
+        return super().to_representation(sections)
+
+
+class EventSectionSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
+    tickets_held = serializers.SerializerMethodField(help_text="Tickets held by pending bookings")
+
+    def get_tickets_held(self, obj):
+        held_counts = getattr(self, 'held_counts', None)
+        if held_counts is not None and obj.pk in held_counts:
+            return held_counts[obj.pk]
+        return held_tickets(obj.pk)
 
-class EventSectionSerializer(serializers.ModelSerializer):
     def validate_tickets_available(self, value):
         if value > self.instance.venue_section.capacity:
             raise serializers.ValidationError("Tickets available exceed venue section capacity.")
@@ -37,30 +150,84 @@ class EventSectionSerializer(serializers.ModelSerializer):
         model = EventSection
         fields = '__all__'
         read_only_fields = ('id',)
+        list_serializer_class = EventSectionListSerializer
+        expandable_fields = {'event': EventSerializer, 'venue_section': VenueSectionSerializer}
+        field_sources = {'tickets_held': []}
+
 
 
 
+class BookingListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        bookings = list(data.all() if hasattr(data, 'all') else data)
+        event_section = self.child.fields.get('event_section')
+        if isinstance(event_section, EventSectionSerializer):
+            # Expanded sections look up the held counts of the whole page at once
+            event_section.held_counts = held_tickets_many(list({booking.event_section_id for booking in bookings}))
+        return super().to_representation(bookings)
 
-class BookingSerializer(serializers.ModelSerializer):
+
+class BookingSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     def validate_number_of_tickets(self, value):
-        if value > self.instance.event_section.tickets_available:
-            raise serializers.ValidationError("Not enough tickets available for this section.")
+        if value < 1:
+            raise serializers.ValidationError("At least one ticket must be booked.")
         return value
 
     def create(self, validated_data):
         event_section = validated_data['event_section']
         number_of_tickets = validated_data['number_of_tickets']
 
-        if number_of_tickets > event_section.tickets_available:
-            raise serializers.ValidationError("Not enough tickets available.")
+        with transaction.atomic():
+            try:
+                reserve_tickets(event_section.pk, number_of_tickets)
+                seats = assign_seats({event_section.pk: number_of_tickets})
+            except InsufficientInventory as exc:
+                raise serializers.ValidationError(str(exc))
 
-        booking = Booking.objects.create(**validated_data)
+            if event_section.pk in seats:
+                validated_data['seat_row'], validated_data['first_seat'] = seats[event_section.pk]
+            booking = Booking.objects.create(**validated_data)
+            if booking.status == 'pending':
+                place_hold(booking)
         return booking
 
+    def update(self, instance, validated_data):
+        if instance.status == 'canceled':
+            raise serializers.ValidationError("Canceled bookings cannot be modified.")
+
+        event_section = validated_data.get('event_section', instance.event_section)
+        number_of_tickets = validated_data.get('number_of_tickets', instance.number_of_tickets)
+
+        with transaction.atomic():
+            # Swap the old reservation for the new one inside the same transaction
+            if (event_section.pk, number_of_tickets) != (instance.event_section_id, instance.number_of_tickets):
+                release_tickets(instance.event_section_id, instance.number_of_tickets)
+                release_seats([(instance.event_section_id, instance.seat_row, instance.first_seat, instance.number_of_tickets)])
+                try:
+                    reserve_tickets(event_section.pk, number_of_tickets)
+                    seats = assign_seats({event_section.pk: number_of_tickets})
+                except InsufficientInventory as exc:
+                    raise serializers.ValidationError(str(exc))
+                validated_data['seat_row'], validated_data['first_seat'] = seats.get(event_section.pk, (None, None))
+                move_hold(instance, event_section.pk, number_of_tickets)
+
+                # Tell waiters about tickets that went back on sale
+                if event_section.pk != instance.event_section_id:
+                    freed = instance.number_of_tickets
+                else:
+                    freed = instance.number_of_tickets - number_of_tickets
+                if freed > 0:
+                    tickets_released.send(sender=Booking, event_section_id=instance.event_section_id, quantity=freed)
+
+            return super().update(instance, validated_data)
+
     class Meta:
         model = Booking
         fields = '__all__'
-        read_only_fields = ('id',)
+        # Status only moves through cancel_booking() and confirm_booking_group()
+        read_only_fields = ('id', 'status', 'seat_row', 'first_seat')
+        expandable_fields = {'event_section': EventSectionSerializer}
+        list_serializer_class = BookingListSerializer
 
 class BookingGroupSerializer(serializers.ModelSerializer):
     bookings = BookingSerializer(many=True, read_only=True)  
@@ -68,6 +235,54 @@ class BookingGroupSerializer(serializers.ModelSerializer):
     class Meta:
         model = BookingGroup
         fields = ['id', 'total_price', 'status', 'bookings']
-        read_only_fields = ('id',)
+        read_only_fields = ('id', 'total_price')
         
-        # depth = 1 
\ No newline at end of file
+        # depth = 1
+
+
+class CheckoutLineSerializer(serializers.Serializer):
+    event_section = serializers.IntegerField(min_value=1)
+    number_of_tickets = serializers.IntegerField(min_value=1)
+
+
+class CheckoutSerializer(serializers.Serializer):
+    """Validates a multi-section order and books it as one BookingGroup."""
+    lines = CheckoutLineSerializer(many=True, allow_empty=False)
+
+    def validate_lines(self, lines):
+        requested = {line['event_section'] for line in lines}
+        existing = set(EventSection.objects.filter(pk__in=requested).values_list('pk', flat=True))
+        if missing := requested - existing:
+            raise serializers.ValidationError(
+                f"Unknown event section(s): {', '.join(str(pk) for pk in sorted(missing))}."
+            )
+        return lines
+
+    def create(self, validated_data):
+        lines = [(line['event_section'], line['number_of_tickets']) for line in validated_data['lines']]
+        try:
+            return create_booking_group(self.context['request'].user, lines)
+        except InsufficientInventory as exc:
+            raise serializers.ValidationError(str(exc))
+
+
+class WaitlistEntrySerializer(serializers.ModelSerializer):
+    position = serializers.SerializerMethodField(help_text="Place in the queue while waiting")
+
+    def get_position(self, obj):
+        return waitlist_position(obj) if obj.status == 'waiting' else None
+
+    def validate(self, attrs):
+        if attrs['number_of_tickets'] < 1:
+            raise serializers.ValidationError("At least one ticket must be requested.")
+        if attrs['event_section'].tickets_available >= attrs['number_of_tickets']:
+            raise serializers.ValidationError("Tickets are still available for this section; book them directly.")
+        return attrs
+
+    def create(self, validated_data):
+        return join_waitlist(validated_data['created_by'], validated_data['event_section'], validated_data['number_of_tickets'])
+
+    class Meta:
+        model = WaitlistEntry
+        fields = ['id', 'event_section', 'number_of_tickets', 'status', 'position', 'booking_group', 'promoted_at', 'created_at']
+        read_only_fields = ('id', 'status', 'booking_group', 'promoted_at', 'created_at')
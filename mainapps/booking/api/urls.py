@@ -7,10 +7,16 @@ router.register(r'venue-sections', views.VenueSectionViewSet)
 router.register(r'events', views.EventViewSet)
 router.register(r'event-sections', views.EventSectionViewSet)
 router.register(r'bookings', views.BookingViewSet)
+router.register(r'waitlist', views.WaitlistEntryViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
     path('booking-groups/', views.BookingGroupListCreateView.as_view(), name='booking-group-list-create'),
     path('booking-group/<int:id>/', views.BookingGroupDetailView.as_view(), name='booking-group-detail'),
+    path('checkout/', views.CheckoutView.as_view(), name='checkout'),
+    path('search/', views.CatalogSearchView.as_view(), name='catalog-search'),
+    path('discover/events/', views.EventDiscoveryView.as_view(), name='event-discovery'),
+    path('events/<int:event_id>/availability/', views.EventAvailabilityView.as_view(), name='event-availability'),
+    path('events/<int:event_id>/waiting-room/', views.WaitingRoomView.as_view(), name='event-waiting-room'),
 ]
 
@@ -1,12 +1,38 @@
-from rest_framework import viewsets, permissions,generics
-from ..models import Booking, BookingGroup, EventSection, Venue, VenueSection, Event
+from django.db import transaction
+from core.conditional import ConditionalGetMixin
+from core.idempotency import idempotent
+from core.response_cache import ResponseCacheMixin
+from core.sparse_fields import SparseFieldsViewMixin
+from rest_framework import viewsets, permissions,generics, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from ..availability import get_event_availability
+from ..discovery import discover_events
+from ..inventory import cancel_booking, held_tickets_version
+from ..search import SEARCHES
+from ..models import Booking, BookingGroup, EventAvailability, EventSection, SeatMap, Venue, VenueSection, Event, WaitlistEntry
+from ..seating import load_bitmap
+from ..waiting_room import admitted_through, issue_admission_token, join_queue, queue_position
+from ..waitlist import leave_waitlist
+from .permissions import HasAdmissionToken, spend_admissions
+from .readers import BookingGroupReadMixin, BookingReadMixin
 from .serializers import (
+    ArtistSearchResultSerializer,
     BookingGroupSerializer, 
     BookingSerializer, 
+    CatalogSearchQuerySerializer,
+    CheckoutSerializer,
+    EventAvailabilitySerializer,
+    EventDiscoveryQuerySerializer,
+    EventDiscoverySerializer,
+    EventSearchResultSerializer,
     EventSectionSerializer, 
     EventSerializer, 
     VenueSectionSerializer, 
-    VenueSerializer)
+    VenueSearchResultSerializer,
+    VenueSerializer,
+    WaitlistEntrySerializer)
 
 class BaseOwnerViewSet(viewsets.ModelViewSet):
     """Base ViewSet that ensures created_by is set and filters queryset by user"""
@@ -23,13 +49,14 @@ class BaseOwnerViewSet(viewsets.ModelViewSet):
     
         return self.queryset.filter(created_by=self.request.user)
     
-class VenueViewSet(BaseOwnerViewSet):
+class VenueViewSet(ResponseCacheMixin, ConditionalGetMixin, SparseFieldsViewMixin, BaseOwnerViewSet):
     """CRUD endpoint for Venue"""
     queryset = Venue.objects.all()
     serializer_class = VenueSerializer
+    cache_namespace = 'venues'
 
 
-class VenueSectionViewSet(BaseOwnerViewSet):
+class VenueSectionViewSet(ResponseCacheMixin, ConditionalGetMixin, SparseFieldsViewMixin, BaseOwnerViewSet):
     """
     API endpoint for managing venue sections.
 
@@ -40,39 +67,307 @@ class VenueSectionViewSet(BaseOwnerViewSet):
     - Update a section: PUT/PATCH /venue-sections/{id}/
     - Delete a section: DELETE /venue-sections/{id}/
     """
-    queryset = VenueSection.objects.all()
+    queryset = VenueSection.objects.select_related('venue')
     serializer_class = VenueSectionSerializer
+    cache_namespace = 'venue_sections'
+    # ?expand=venue embeds the venue
+    cache_depends_on = ('venues',)
 
-class EventViewSet(BaseOwnerViewSet):
+class EventViewSet(ResponseCacheMixin, ConditionalGetMixin, SparseFieldsViewMixin, BaseOwnerViewSet):
     
-    queryset = Event.objects.all()
+    queryset = Event.objects.select_related('availability', 'artist', 'venue')
     serializer_class = EventSerializer
+    ordering = ('event_date', 'id')
+    conditional_related = ('availability',)
+    cache_namespace = 'events'
+    # ?expand= embeds the venue and the artist
+    cache_depends_on = ('venues', 'artists')
 
 
-class EventSectionViewSet(BaseOwnerViewSet):
+class EventDiscoveryView(ResponseCacheMixin, ConditionalGetMixin, generics.ListAPIView):
+    """
+    Public listing of upcoming events.
+
+    Endpoint:
+    - GET /discover/events/?city=&date_from=&date_to=&genre=&artist=&min_price=&max_price=&sort=
+
+    `sort` is one of date, -date, price or -price; price sorts on the cheapest
+    section. Results are cursor paginated.
+    """
+    serializer_class = EventDiscoverySerializer
+    permission_classes = [permissions.AllowAny]
+    conditional_related = ('availability',)
+    cache_namespace = 'events'
+    cache_depends_on = ('venues', 'artists', 'genres')
+
+    def get_queryset(self):
+        filters = EventDiscoveryQuerySerializer(data=self.request.query_params)
+        filters.is_valid(raise_exception=True)
+        queryset, self.ordering = discover_events(**filters.validated_data)
+        return queryset
+
+
+class CatalogSearchView(APIView):
+    """
+    Ranked free-text search over artists, venues and upcoming events.
+
+    Endpoint:
+    - GET /search/?q=<text>&type=<artists|venues|events>&limit=<n>
+
+    Without `type`, the best `limit` matches of each kind are returned.
+    Matching tolerates typos in artist and venue names and event descriptions.
+    """
+    permission_classes = [permissions.AllowAny]
+    result_serializers = {
+        'artists': ArtistSearchResultSerializer,
+        'venues': VenueSearchResultSerializer,
+        'events': EventSearchResultSerializer,
+    }
+
+    def get(self, request):
+        params = CatalogSearchQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        query, limit = params.validated_data['q'], params.validated_data['limit']
+
+        kinds = [params.validated_data['type']] if 'type' in params.validated_data else list(SEARCHES)
+        return Response({
+            kind: self.result_serializers[kind](SEARCHES[kind](query)[:limit], many=True).data
+            for kind in kinds
+        })
+
+
+class EventAvailabilityView(APIView):
+    """
+    Remaining tickets, price range and sold-out flag for an event.
+
+    Endpoint:
+    - GET /events/{event_id}/availability/
+
+    Served from the cached availability summary, never from the sections table.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, event_id):
+        try:
+            data = get_event_availability(event_id, lambda availability: EventAvailabilitySerializer(availability).data)
+        except EventAvailability.DoesNotExist:
+            return Response({"detail": "Event not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(data)
+
+
+class WaitingRoomView(APIView):
+    """
+    Virtual waiting room in front of the booking endpoints for high-demand on-sales.
+
+    Endpoints:
+    - Join the queue: POST /events/{event_id}/waiting-room/
+    - Poll your position: GET /events/{event_id}/waiting-room/
+
+    Buyers are let through at the event's admission_rate per second. Once
+    admitted the response carries an admission_token, which booking and
+    checkout requests for the event must send in the X-Admission-Token header.
+    Each token admits one booking write; buyers join again to book more.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_event(self, event_id):
+        return Event.objects.filter(pk=event_id, admission_rate__isnull=False).first()
+
+    def post(self, request, event_id):
+        event = self.get_event(event_id)
+        if event is None:
+            return Response({"detail": "This event has no waiting room."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(self.queue_status(event, join_queue(event, request.user)))
+
+    def get(self, request, event_id):
+        event = self.get_event(event_id)
+        if event is None:
+            return Response({"detail": "This event has no waiting room."}, status=status.HTTP_404_NOT_FOUND)
+        position = queue_position(event, request.user)
+        if position is None:
+            return Response({"detail": "Join the waiting room first."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(self.queue_status(event, position))
+
+    def queue_status(self, event, position):
+        admitted = admitted_through(event)
+        ahead = max(position - admitted, 0)
+        data = {
+            "position": position,
+            "admitted_through": admitted,
+            "ahead": ahead,
+            "estimated_wait_seconds": -(-ahead // event.admission_rate),
+        }
+        if not ahead:
+            data["admission_token"] = issue_admission_token(event, self.request.user, position)
+        return data
+
+
+class EventSectionViewSet(ConditionalGetMixin, SparseFieldsViewMixin, BaseOwnerViewSet):
     """
     CRUD API for Event Sections.
     """
-    queryset = EventSection.objects.all()
+    queryset = EventSection.objects.select_related('venue_section', 'event__artist', 'event__venue')
     serializer_class = EventSectionSerializer
 
+    def get_conditional_versions(self):
+        # tickets_held comes from the hold counters, not the section rows
+        return [str(held_tickets_version())]
+
+    @action(detail=True, methods=['get'])
+    def seats(self, request, pk=None):
+        """
+        Seat availability of a reserved-seating section.
+
+        GET /event-sections/{id}/seats/?count=4 also returns the best block of
+        `count` adjacent free seats.
+        """
+        event_section = self.get_object()
+        try:
+            seat_map = event_section.seat_map
+        except SeatMap.DoesNotExist:
+            return Response({"detail": "This section is general admission."}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            count = int(request.query_params.get('count', 1))
+        except ValueError:
+            return Response({"error": "count must be a whole number."}, status=status.HTTP_400_BAD_REQUEST)
 
-class BookingViewSet(BaseOwnerViewSet):
+        bitmap = load_bitmap(seat_map)
+        best = bitmap.find_best(count)
+        return Response({
+            "rows": bitmap.rows,
+            "seats_per_row": bitmap.seats_per_row,
+            "seats_available": bitmap.seats_available,
+            "best_available": {"seat_row": best[0], "first_seat": best[1], "count": count} if best else None,
+        })
+
+
+class BookingViewSet(ConditionalGetMixin, BookingReadMixin, SparseFieldsViewMixin, BaseOwnerViewSet):
     """
     CRUD API for Bookings.
     """
-    queryset = Booking.objects.all()
+    queryset = Booking.objects.select_related('event_section__venue_section')
     serializer_class = BookingSerializer
+    permission_classes = [permissions.IsAuthenticated, HasAdmissionToken]
+
+    def get_conditional_versions(self):
+        # An expanded event section shows its live tickets_held
+        if 'event_section' in self.request.query_params.get('expand', ''):
+            return [str(held_tickets_version())]
+        return []
+
+    def get_requested_event_sections(self, booking=None):
+        """Sections a booking write takes tickets from, for the waiting room check"""
+        data = self.request.data
+        if not hasattr(data, 'get'):
+            return []
+        if booking is None:
+            return [data.get('event_section')]
+        event_section = data.get('event_section', booking.event_section_id)
+        number_of_tickets = data.get('number_of_tickets', booking.number_of_tickets)
+        if (str(event_section), str(number_of_tickets)) == (str(booking.event_section_id), str(booking.number_of_tickets)):
+            return []
+        return [event_section]
+
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
+    def perform_create(self, serializer):
+        """Book, then spend the admission tokens in the same transaction"""
+        with transaction.atomic():
+            super().perform_create(serializer)
+            spend_admissions(self.request)
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            super().perform_update(serializer)
+            spend_admissions(self.request)
+
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        """Cancel the booking and put its tickets back on sale"""
+        booking = self.get_object()
+        cancel_booking(booking)
+        return Response(self.get_serializer(booking).data)
+
+    def perform_destroy(self, instance):
+        """Give the tickets back to the section before removing the booking"""
+        with transaction.atomic():
+            cancel_booking(instance)
+            instance.delete()
+
+class WaitlistEntryViewSet(BaseOwnerViewSet):
+    """
+    Waitlist for sold-out event sections.
 
-class BookingGroupListCreateView(generics.ListCreateAPIView):
-    queryset = BookingGroup.objects.all()
+    Endpoints:
+    - Join a section's waitlist: POST /waitlist/
+    - List your entries and queue positions: GET /waitlist/
+    - Leave the waitlist: DELETE /waitlist/{id}/
+
+    When tickets are released the head of the queue is booked automatically
+    and notified by email.
+    """
+    queryset = WaitlistEntry.objects.select_related('event_section__venue_section')
+    serializer_class = WaitlistEntrySerializer
+    http_method_names = ['get', 'post', 'delete', 'head', 'options']
+
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
+    def perform_destroy(self, instance):
+        """Entries are kept as canceled so the queue history survives"""
+        leave_waitlist(instance)
+
+
+class BookingGroupListCreateView(ConditionalGetMixin, BookingGroupReadMixin, generics.ListCreateAPIView):
+    queryset = BookingGroup.objects.prefetch_related('bookings')
     serializer_class = BookingGroupSerializer
     permission_classes = [permissions.IsAuthenticated]
+    conditional_related = ('bookings',)
+
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
 
 
-class BookingGroupDetailView(generics.RetrieveAPIView):
-    queryset = BookingGroup.objects.all()
+class BookingGroupDetailView(ConditionalGetMixin, BookingGroupReadMixin, generics.RetrieveAPIView):
+    queryset = BookingGroup.objects.prefetch_related('bookings')
     serializer_class = BookingGroupSerializer
     permission_classes = [permissions.IsAuthenticated]
     lookup_field = 'id'
+    conditional_related = ('bookings',)
+
+
+class CheckoutView(generics.CreateAPIView):
+    """
+    Book several event sections in one request.
+
+    Endpoint:
+    - POST /checkout/ {"lines": [{"event_section": 1, "number_of_tickets": 2}, ...]}
+
+    All lines are validated against inventory and booked together under a new
+    pending BookingGroup, which is returned with its bookings.
+    """
+    serializer_class = CheckoutSerializer
+    permission_classes = [permissions.IsAuthenticated, HasAdmissionToken]
+
+    def get_requested_event_sections(self):
+        """Sections an order touches, for the waiting room check"""
+        lines = self.request.data.get('lines') if hasattr(self.request.data, 'get') else None
+        if not isinstance(lines, list):
+            return []
+        return [line.get('event_section') for line in lines if isinstance(line, dict)]
+
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            booking_group = serializer.save()
+            spend_admissions(request)
 
+        data = BookingGroupSerializer(booking_group, context=self.get_serializer_context()).data
+        return Response(data, status=status.HTTP_201_CREATED)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class BookingConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "mainapps.booking"
+
+    def ready(self):
+        import mainapps.booking.signals
@@ -0,0 +1,111 @@
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.response_cache import invalidate_response_cache
+
+from .models import Event, EventAvailability, EventSection
+
+AVAILABILITY_CACHE_KEY = "booking:event-availability:{}"
+AVAILABILITY_CACHE_TIMEOUT = 60 * 60
+
+
+# Recomputes the summaries of the given events from their sections and writes
+# them in the same statement, so the aggregate is never older than the write
+UPSERT_AVAILABILITY_SQL = """
+INSERT INTO {availability} (event_id, tickets_remaining, min_price, max_price, is_sold_out, updated_at)
+SELECT event.id,
+       COALESCE(SUM(section.tickets_available), 0),
+       MIN(section.ticket_price),
+       MAX(section.ticket_price),
+       COALESCE(SUM(section.tickets_available), 0) = 0,
+       %s
+FROM {event} event
+LEFT JOIN {section} section ON section.event_id = event.id
+WHERE event.id IN ({placeholders})
+GROUP BY event.id
+ON CONFLICT (event_id) DO UPDATE SET
+    tickets_remaining = EXCLUDED.tickets_remaining,
+    min_price = EXCLUDED.min_price,
+    max_price = EXCLUDED.max_price,
+    is_sold_out = EXCLUDED.is_sold_out,
+    updated_at = EXCLUDED.updated_at
+"""
+
+
+def refresh_event_availability(event_ids=(), event_section_ids=()):
+    """
+    Recompute the availability summaries of the given events.
+
+    Events can be named directly or through any of their sections. The
+    existing summaries are locked first, so concurrent refreshes of an event
+    take turns, and each then aggregates and upserts in a single statement:
+    whichever refresh writes last reads the stock committed before it took
+    the lock. Events deleted in the meantime are skipped by the join. The
+    cached copies of the summaries are dropped.
+    """
+    event_ids = set(event_ids)
+    if event_section_ids:
+        event_ids.update(
+            EventSection.objects.filter(pk__in=event_section_ids).values_list('event_id', flat=True)
+        )
+    if not event_ids:
+        return
+
+    event_ids = sorted(event_ids)
+    with transaction.atomic():
+        list(EventAvailability.objects.select_for_update().filter(event_id__in=event_ids).values_list('pk', flat=True))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                UPSERT_AVAILABILITY_SQL.format(
+                    availability=EventAvailability._meta.db_table,
+                    event=Event._meta.db_table,
+                    section=EventSection._meta.db_table,
+                    placeholders=', '.join(['%s'] * len(event_ids)),
+                ),
+                [timezone.now(), *event_ids],
+            )
+
+    cache.delete_many([AVAILABILITY_CACHE_KEY.format(event_id) for event_id in event_ids])
+    # Cached event responses embed the summary
+    for event_id in event_ids:
+        invalidate_response_cache('events', event_id)
+
+
+def schedule_availability_refresh(event_ids=(), event_section_ids=()):
+    """
+    Refresh the given events' availability once the current transaction commits.
+
+    Requests made during one transaction are pooled on the connection and
+    served by a single refresh, however many stock changes scheduled one.
+    """
+    pending = connection.__dict__.setdefault('pending_availability_refresh', (set(), set()))
+    pending[0].update(event_ids)
+    pending[1].update(event_section_ids)
+    transaction.on_commit(_run_pending_refresh)
+
+
+def _run_pending_refresh():
+    # The first callback of a transaction takes the whole pool; the others find it empty
+    event_ids, event_section_ids = connection.__dict__.pop('pending_availability_refresh', ((), ()))
+    if event_ids or event_section_ids:
+        refresh_event_availability(event_ids, event_section_ids)
+
+
+def get_event_availability(event_id, serialize):
+    """
+    Return the serialized availability of an event, served from the cache.
+
+    Args:
+        event_id: The event to look up.
+        serialize: Callable turning an EventAvailability into response data.
+
+    Raises:
+        EventAvailability.DoesNotExist: If the event has no summary.
+    """
+    key = AVAILABILITY_CACHE_KEY.format(event_id)
+    data = cache.get(key)
+    if data is None:
+        data = serialize(EventAvailability.objects.get(event_id=event_id))
+        cache.set(key, data, timeout=AVAILABILITY_CACHE_TIMEOUT)
+    return data
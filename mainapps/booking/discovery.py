@@ -0,0 +1,68 @@
+from django.db.models import Exists, F, OuterRef
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from mainapps.artist.models import Artist
+
+from .models import Event, EventSection
+
+# Sort keys accepted by discover_events, mapped to cursor-friendly orderings
+DISCOVERY_ORDERINGS = {
+    'date': ('event_date', 'id'),
+    '-date': ('-event_date', '-id'),
+    'price': ('lowest_price', 'id'),
+    '-price': ('-lowest_price', '-id'),
+}
+
+
+def discover_events(city=None, date_from=None, date_to=None, genre=None, artist=None,
+                    min_price=None, max_price=None, sort='date'):
+    """
+    Upcoming events matching the given filters, for public browsing.
+
+    Every filter is written so it can be answered from an index: the city
+    compares against the upper-cased city index on Venue, the date range walks
+    the (status, event_date) index, and the genre and price filters are
+    EXISTS probes into the artist-genre join table and the (event,
+    ticket_price) index on EventSection, so matching events are never
+    duplicated by the joins.
+
+    Args:
+        city: Venue city, matched case-insensitively.
+        date_from: Earliest event date; defaults to now, past events are never listed.
+        date_to: Latest event date.
+        genre: Slug of a genre the artist plays.
+        artist: Artist id.
+        min_price: Lowest acceptable ticket price in at least one section.
+        max_price: Highest acceptable ticket price in at least one section.
+        sort: One of DISCOVERY_ORDERINGS.
+
+    Returns:
+        tuple: (queryset, ordering) - the ordering is left to the paginator.
+    """
+    now = timezone.now()
+    events = (
+        Event.objects.filter(status='upcoming', event_date__gte=max(date_from, now) if date_from else now)
+        .select_related('venue', 'artist', 'availability')
+        .annotate(lowest_price=Coalesce(F('availability__min_price'), F('ticket_price')))
+    )
+
+    if date_to:
+        events = events.filter(event_date__lte=date_to)
+    if city:
+        events = events.filter(venue__city__iexact=city)
+    if artist:
+        events = events.filter(artist_id=artist)
+    if genre:
+        events = events.filter(Exists(
+            Artist.genres.through.objects.filter(artist_id=OuterRef('artist_id'), genre__slug=genre)
+        ))
+    if min_price is not None or max_price is not None:
+        sections = EventSection.objects.filter(event_id=OuterRef('pk'))
+        if min_price is not None:
+            sections = sections.filter(ticket_price__gte=min_price)
+        if max_price is not None:
+            sections = sections.filter(ticket_price__lte=max_price)
+        events = events.filter(Exists(sections))
+
+    return events, DISCOVERY_ORDERINGS[sort]
@@ -0,0 +1,432 @@
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, Exists, F, OuterRef, Q, Sum, Value, When
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .availability import schedule_availability_refresh
+from .models import Booking, BookingGroup, EventSection, TicketHold
+from .references import allocate_references
+from .seating import claim_best_seats, release_seats
+
+HELD_TICKETS_KEY = "booking:held-tickets:{}"
+HELD_TICKETS_VERSION_KEY = "booking:held-tickets:version"
+
+# Sent inside the releasing transaction when a cancel or an expired hold puts
+# tickets back on sale, with `event_section_id` and `quantity`.
+tickets_released = Signal()
+
+
+class InsufficientInventory(Exception):
+    """Raised when an event section cannot cover the requested number of tickets."""
+
+
+def reserve_tickets(event_section_id, quantity):
+    """
+    Atomically take `quantity` tickets out of an event section's stock.
+
+    The check and the decrement happen in a single conditional UPDATE, so
+    concurrent writers on the same section can never oversell it: the row
+    lock taken by the UPDATE serialises them and the `tickets_available`
+    filter is re-evaluated against the committed value.
+
+    Raises:
+        InsufficientInventory: If the section does not have enough tickets left.
+    """
+    updated = EventSection.objects.filter(
+        pk=event_section_id,
+        tickets_available__gte=quantity,
+    ).update(
+        tickets_available=F('tickets_available') - quantity,
+        updated_at=timezone.now(),
+    )
+    if not updated:
+        raise InsufficientInventory("Not enough tickets available for this section.")
+    schedule_availability_refresh(event_section_ids=[event_section_id])
+
+
+def reserve_many(quantities):
+    """
+    Atomically take tickets out of several event sections with a single UPDATE.
+
+    Every section must be able to cover its quantity or nothing is reserved:
+    the statement only matches rows with enough stock, and a short row count
+    means at least one section came up short.
+
+    Args:
+        quantities: Mapping of event section id to number of tickets.
+
+    Raises:
+        InsufficientInventory: Naming the sections that cannot cover their quantity.
+    """
+    enough_stock = Q()
+    for event_section_id, quantity in quantities.items():
+        enough_stock |= Q(pk=event_section_id, tickets_available__gte=quantity)
+
+    updated = EventSection.objects.filter(enough_stock).update(
+        tickets_available=F('tickets_available') - Case(
+            *[When(pk=event_section_id, then=Value(quantity)) for event_section_id, quantity in quantities.items()]
+        ),
+        updated_at=timezone.now(),
+    )
+    if updated != len(quantities):
+        # The caller's transaction rolls the partial reservation back
+        short = [
+            str(event_section_id)
+            for event_section_id, available in EventSection.objects.filter(
+                pk__in=quantities
+            ).values_list('pk', 'tickets_available')
+            if available < quantities[event_section_id]
+        ]
+        raise InsufficientInventory(f"Not enough tickets available for section(s): {', '.join(short)}.")
+    schedule_availability_refresh(event_section_ids=quantities)
+
+
+def assign_seats(quantities):
+    """
+    Claim adjacent seats for the reserved-seating sections among `quantities`.
+
+    Returns:
+        dict: Event section id to (seat_row, first_seat); general admission sections are absent.
+
+    Raises:
+        InsufficientInventory: If a seated section has no row with enough adjacent seats.
+    """
+    try:
+        return claim_best_seats(quantities)
+    except ValueError as exc:
+        raise InsufficientInventory(str(exc))
+
+
+def release_tickets(event_section_id, quantity):
+    """Atomically return `quantity` tickets to an event section's stock."""
+    EventSection.objects.filter(pk=event_section_id).update(
+        tickets_available=F('tickets_available') + quantity,
+        updated_at=timezone.now(),
+    )
+    schedule_availability_refresh(event_section_ids=[event_section_id])
+
+
+def cancel_booking(booking):
+    """
+    Cancel a booking and give its tickets back to the event section.
+
+    The booking row is locked while its status flips, so cancelling the same
+    booking twice (or from two requests at once) restores stock only once.
+    Its price comes off its group's total in the same transaction.
+
+    Returns:
+        bool: True if this call canceled the booking, False if it already was.
+    """
+    with transaction.atomic():
+        locked = Booking.objects.select_for_update().only(
+            'status', 'booking_group', 'event_section', 'number_of_tickets', 'total_price', 'seat_row', 'first_seat'
+        ).get(pk=booking.pk)
+        canceled = locked.status != 'canceled'
+        if canceled:
+            Booking.objects.filter(pk=booking.pk).update(
+                status='canceled', seat_row=None, first_seat=None, updated_at=timezone.now()
+            )
+            BookingGroup.adjust_total(locked.booking_group_id, -locked.total_price)
+            release_tickets(locked.event_section_id, locked.number_of_tickets)
+            release_seats([(locked.event_section_id, locked.seat_row, locked.first_seat, locked.number_of_tickets)])
+            tickets_released.send(
+                sender=Booking, event_section_id=locked.event_section_id, quantity=locked.number_of_tickets
+            )
+            _finish_holds(TicketHold.objects.filter(booking_id=booking.pk), 'released')
+
+    booking.status = 'canceled'
+    booking.seat_row = booking.first_seat = None
+    return canceled
+
+
+def place_hold(booking):
+    """Record a TTL hold for a freshly reserved pending booking."""
+    return place_holds([booking])[0]
+
+
+def place_holds(bookings):
+    """
+    Record TTL holds for freshly reserved pending bookings with one INSERT.
+
+    The live per-section hold counts in the cache are bumped once the
+    surrounding transaction commits.
+    """
+    expires_at = timezone.now() + settings.BOOKING_HOLD_TTL
+    holds = TicketHold.objects.bulk_create([
+        TicketHold(
+            booking=booking,
+            booking_group_id=booking.booking_group_id,
+            event_section_id=booking.event_section_id,
+            quantity=booking.number_of_tickets,
+            expires_at=expires_at,
+            created_by=booking.created_by,
+        )
+        for booking in bookings
+    ])
+    held = Counter()
+    for hold in holds:
+        held[hold.event_section_id] += hold.quantity
+    transaction.on_commit(lambda: _adjust_held_counts(held))
+    return holds
+
+
+def move_hold(booking, event_section_id, quantity):
+    """
+    Point the active hold of a pending booking at its new section and quantity.
+
+    Used when a booking is resized or moved, so the expiry sweep releases what
+    the booking holds now rather than what it held when the hold was placed.
+    The live per-section hold counts follow once the transaction commits.
+
+    Returns:
+        int: Number of holds moved; 0 if the booking holds nothing.
+    """
+    with transaction.atomic():
+        active = TicketHold.objects.select_for_update().filter(booking_id=booking.pk, status='active')
+        held = active.values_list('event_section_id', 'quantity').first()
+        if held is None:
+            return 0
+        active.update(event_section_id=event_section_id, quantity=quantity, updated_at=timezone.now())
+
+        deltas = Counter({held[0]: -held[1]})
+        deltas[event_section_id] += quantity
+        transaction.on_commit(lambda: _adjust_held_counts(deltas))
+    return 1
+
+
+def extend_holds(booking_group, at_least, extend_to):
+    """
+    Make sure the active holds of a booking group last until `at_least`.
+
+    Holds that would lapse sooner are extended to `extend_to`, a later time,
+    so calls in quick succession find the holds long enough and leave them
+    as they are. Each hold is extended at most once: a group cannot keep its
+    tickets off sale by asking again and again. The holds are locked while
+    they are read and extended, so the expiry sweep either expires them
+    first or skips them.
+
+    Returns:
+        datetime: When the group's earliest active hold now lapses, or None if
+            it holds nothing or its holds lapse before `at_least` and were
+            already extended.
+    """
+    with transaction.atomic():
+        active = TicketHold.objects.select_for_update().filter(booking_group=booking_group, status='active')
+        holds = list(active.values_list('expires_at', 'extended'))
+        if not holds:
+            return None
+        earliest = min(expires_at for expires_at, _ in holds)
+        if earliest >= at_least:
+            return earliest
+        if any(extended for expires_at, extended in holds if expires_at < at_least):
+            return None
+        active.filter(expires_at__lt=extend_to).update(expires_at=extend_to, extended=True, updated_at=timezone.now())
+        return extend_to
+
+
+def create_booking_group(user, lines):
+    """
+    Book several event sections in one transaction.
+
+    Stock for every line is reserved with a single UPDATE, the bookings are
+    inserted with one bulk INSERT and held together under a new pending group
+    whose total is known up front, so the query count does not depend on the
+    number of lines.
+
+    Args:
+        user: The user placing the order.
+        lines: Iterable of (event section id, number of tickets) pairs. Repeated
+            sections are merged into one booking.
+
+    Raises:
+        InsufficientInventory: If any section cannot cover its quantity.
+    """
+    quantities = Counter()
+    for event_section_id, number_of_tickets in lines:
+        quantities[event_section_id] += number_of_tickets
+
+    with transaction.atomic():
+        reserve_many(quantities)
+        seats = assign_seats(quantities)
+        prices = dict(EventSection.objects.filter(pk__in=quantities).values_list('pk', 'ticket_price'))
+
+        booking_group = BookingGroup(
+            status='pending',
+            created_by=user,
+            total_price=sum(quantity * prices[pk] for pk, quantity in quantities.items()),
+        )
+        booking_group.save()
+
+        references = allocate_references('BKG', len(quantities))
+        bookings = Booking.objects.bulk_create([
+            Booking(
+                booking_group=booking_group,
+                event_section_id=event_section_id,
+                reference=reference,
+                number_of_tickets=quantity,
+                total_price=quantity * prices[event_section_id],
+                seat_row=seats.get(event_section_id, (None, None))[0],
+                first_seat=seats.get(event_section_id, (None, None))[1],
+                created_by=user,
+            )
+            for reference, (event_section_id, quantity) in zip(references, quantities.items())
+        ])
+        place_holds(bookings)
+
+    return booking_group
+
+
+def convert_holds(booking_group):
+    """Turn the active holds of a paid booking group into sold tickets."""
+    return _finish_holds(TicketHold.objects.filter(booking_group=booking_group), 'converted')
+
+
+def held_tickets(event_section_id):
+    """Number of tickets currently held by pending bookings in an event section."""
+    return held_tickets_many([event_section_id])[event_section_id]
+
+
+def held_tickets_many(event_section_ids):
+    """
+    Tickets currently held by pending bookings, per event section.
+
+    Served from the cache with one multi-get; counters missing from the cache
+    are rebuilt from the hold ledger with one grouped query.
+
+    Returns:
+        dict: Event section id to number of held tickets.
+    """
+    keys = {HELD_TICKETS_KEY.format(pk): pk for pk in event_section_ids}
+    counts = {keys[key]: max(count, 0) for key, count in cache.get_many(keys).items()}
+
+    missing = [pk for pk in event_section_ids if pk not in counts]
+    if missing:
+        rebuilt = dict.fromkeys(missing, 0)
+        rebuilt.update(
+            TicketHold.objects.filter(event_section_id__in=missing, status='active')
+            .order_by()
+            .values('event_section_id')
+            .annotate(total=Sum('quantity'))
+            .values_list('event_section_id', 'total')
+        )
+        for pk, count in rebuilt.items():
+            cache.add(HELD_TICKETS_KEY.format(pk), count, timeout=None)
+        counts.update(rebuilt)
+    return counts
+
+
+def release_expired_holds(batch_size=None):
+    """
+    Cancel pending bookings whose holds have lapsed and return their tickets.
+
+    Works through the expired holds in batches, each in its own transaction, so
+    a large backlog never keeps many rows locked at once. Rows locked by another
+    sweeper are skipped rather than waited on.
+
+    Returns:
+        int: Number of holds expired.
+    """
+    batch_size = batch_size or settings.BOOKING_HOLD_SWEEP_BATCH_SIZE
+    expired = 0
+
+    while True:
+        with transaction.atomic():
+            holds = list(
+                TicketHold.objects.select_for_update(skip_locked=True)
+                .filter(status='active', expires_at__lte=timezone.now(), booking__status='pending')
+                .order_by('expires_at')
+                .values_list('pk', 'booking_id', 'booking_group_id', 'event_section_id', 'quantity')[:batch_size]
+            )
+            if not holds:
+                break
+
+            hold_ids, booking_ids, group_ids, _, _ = zip(*holds)
+            released = Counter()
+            for _, _, _, event_section_id, quantity in holds:
+                released[event_section_id] += quantity
+
+            now = timezone.now()
+            seated = Booking.objects.filter(pk__in=booking_ids, seat_row__isnull=False).values_list(
+                'event_section_id', 'seat_row', 'first_seat', 'number_of_tickets'
+            )
+            release_seats(list(seated))
+            TicketHold.objects.filter(pk__in=hold_ids).update(status='expired', updated_at=now)
+            # Canceled bookings no longer count towards their group's total
+            group_totals = (
+                Booking.objects.filter(pk__in=booking_ids, booking_group__isnull=False)
+                .exclude(status='canceled')
+                .order_by()
+                .values_list('booking_group')
+                .annotate(total=Sum('total_price'))
+            )
+            for booking_group_id, total in group_totals:
+                BookingGroup.adjust_total(booking_group_id, -total)
+            Booking.objects.filter(pk__in=booking_ids).update(
+                status='canceled', seat_row=None, first_seat=None, updated_at=now
+            )
+            for event_section_id, quantity in released.items():
+                release_tickets(event_section_id, quantity)
+                tickets_released.send(sender=TicketHold, event_section_id=event_section_id, quantity=quantity)
+
+            # Abandon the carts that no longer have any live booking in them
+            BookingGroup.objects.filter(pk__in=[pk for pk in group_ids if pk], status='pending').exclude(
+                Exists(Booking.objects.filter(booking_group=OuterRef('pk')).exclude(status='canceled'))
+            ).update(status='canceled', updated_at=now)
+
+            transaction.on_commit(lambda released=released: _adjust_held_counts({
+                event_section_id: -quantity for event_section_id, quantity in released.items()
+            }))
+
+        expired += len(holds)
+        if len(holds) < batch_size:
+            break
+
+    return expired
+
+
+def _finish_holds(holds, status):
+    """Close the active holds in `holds` and take them off the live counters."""
+    held = Counter()
+    with transaction.atomic():
+        active = holds.filter(status='active').select_for_update()
+        for event_section_id, quantity in active.values_list('event_section_id', 'quantity'):
+            held[event_section_id] += quantity
+        finished = holds.filter(status='active').update(status=status, updated_at=timezone.now())
+        if held:
+            transaction.on_commit(lambda: _adjust_held_counts({
+                event_section_id: -quantity for event_section_id, quantity in held.items()
+            }))
+    return finished
+
+
+def held_tickets_version():
+    """
+    A value that changes whenever any held count changes.
+
+    Lets conditional GETs of representations that show held counts notice
+    changes that never touch the rows they are built from.
+    """
+    version = cache.get(HELD_TICKETS_VERSION_KEY)
+    if version is None:
+        # Start from the clock, so a lost counter never repeats an old value
+        cache.add(HELD_TICKETS_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(HELD_TICKETS_VERSION_KEY)
+    return version
+
+
+def _adjust_held_counts(deltas):
+    for event_section_id, delta in deltas.items():
+        try:
+            cache.incr(HELD_TICKETS_KEY.format(event_section_id), delta)
+        except ValueError:
+            # Counter not cached yet; held_tickets() rebuilds it from the ledger
+            pass
+    try:
+        cache.incr(HELD_TICKETS_VERSION_KEY)
+    except ValueError:
+        cache.add(HELD_TICKETS_VERSION_KEY, time.time_ns(), timeout=None)
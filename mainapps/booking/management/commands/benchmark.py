@@ -0,0 +1,377 @@
+import random
+import statistics
+import threading
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from rest_framework.renderers import JSONRenderer
+
+from mainapps.artist.models import Artist, Genre
+from mainapps.booking.discovery import discover_events
+from core.middleware import CompressionMiddleware
+from core.renderers import ORJSONRenderer
+from mainapps.booking.api.readers import BOOKING_GROUP_FIELDS, booking_group_rows
+from mainapps.booking.api.serializers import BookingGroupSerializer, EventSerializer
+from mainapps.booking.inventory import InsufficientInventory, convert_holds, reserve_tickets
+from mainapps.booking.models import (
+    Booking, BookingGroup, Event, EventAvailability, EventSection, TicketHold, Venue, VenueSection,
+)
+from mainapps.payment.confirmation import confirm_booking_group
+from mainapps.payment.models import Payment
+
+
+class Command(BaseCommand):
+    """
+    Benchmarks for the booking hot paths.
+
+    Scenarios create their own fixtures and remove them afterwards, so they can
+    be pointed at a staging database. Run them against Postgres: the sqlite test
+    database serialises every writer and says nothing about production behaviour.
+
+    Usage:
+        python manage.py benchmark inventory --writers 100 --tickets 20000
+        python manage.py benchmark discovery --events 1000000
+        python manage.py benchmark serialization --groups 200
+        python manage.py benchmark rendering --groups 1000
+        python manage.py benchmark confirmation --bookings 500
+    """
+    help = "Run a performance benchmark scenario against the configured database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenario', choices=['inventory', 'discovery', 'serialization', 'rendering', 'confirmation'])
+        parser.add_argument('--writers', type=int, default=50, help="Concurrent writer threads")
+        parser.add_argument('--tickets', type=int, default=5000, help="Stock of the hot event section")
+        parser.add_argument('--events', type=int, default=100000, help="Size of the synthetic event catalog")
+        parser.add_argument('--groups', type=int, default=200, help="Booking groups per serialized page")
+        parser.add_argument('--bookings', type=int, default=500, help="Bookings in the group being paid for")
+        parser.add_argument('--repeats', type=int, default=20, help="Timed runs per query")
+
+    def handle(self, *args, **options):
+        venue = Venue.objects.create(
+            name="Benchmark Arena",
+            street_address="1 Benchmark Way",
+            city="Benchmark",
+            state="Benchmark",
+            postal_code="00000",
+            capacity=options['tickets'],
+            contact_email="benchmark@example.com",
+        )
+        artist = Artist.objects.create(name="Benchmark Artist", contact_email="benchmark@example.com")
+        try:
+            getattr(self, f"bench_{options['scenario']}")(venue, artist, **options)
+        finally:
+            venue.delete()
+            artist.delete()
+
+    def make_event_section(self, venue, artist, tickets, ticket_price=10):
+        venue_section = VenueSection.objects.create(venue=venue, name="Floor", capacity=tickets)
+        event = Event.objects.create(
+            venue=venue,
+            artist=artist,
+            event_date=timezone.now() + timedelta(days=30),
+            ticket_price=ticket_price,
+            tickets_available=tickets,
+        )
+        return EventSection.objects.create(
+            event=event,
+            venue_section=venue_section,
+            tickets_available=tickets,
+            ticket_price=ticket_price,
+        )
+
+    def make_booking_groups(self, venue, artist, groups):
+        """`groups` booking groups of three bookings each, as a newest-first queryset."""
+        event_section = self.make_event_section(venue, artist, groups * 3)
+        created = BookingGroup.objects.bulk_create([
+            BookingGroup(reference=f"BENCH-GRP-{i}", total_price=30) for i in range(groups)
+        ])
+        Booking.objects.bulk_create([
+            Booking(
+                booking_group=group,
+                event_section=event_section,
+                reference=f"BENCH-BKG-{i}-{n}",
+                number_of_tickets=1,
+                total_price=10,
+            )
+            for i, group in enumerate(created) for n in range(3)
+        ])
+        return BookingGroup.objects.filter(pk__in=[group.pk for group in created]).order_by('-created_at', '-id')
+
+    def bench_inventory(self, venue, artist, writers, tickets, **options):
+        """Many writers hammering one hot section, one ticket per reservation."""
+        if connection.vendor == 'sqlite':
+            raise CommandError("The inventory benchmark needs a database with row-level locking.")
+
+        event_section = self.make_event_section(venue, artist, tickets)
+        sold = [0] * writers
+        latencies = [[] for _ in range(writers)]
+
+        def writer(index):
+            try:
+                while True:
+                    started = time.perf_counter()
+                    try:
+                        with transaction.atomic():
+                            reserve_tickets(event_section.pk, 1)
+                    except InsufficientInventory:
+                        return
+                    latencies[index].append(time.perf_counter() - started)
+                    sold[index] += 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        event_section.refresh_from_db()
+        all_latencies = sorted(latency for per_writer in latencies for latency in per_writer)
+        p99 = all_latencies[int(len(all_latencies) * 0.99) - 1] if all_latencies else 0
+
+        self.stdout.write(f"writers:        {writers}")
+        self.stdout.write(f"reservations:   {sum(sold)} in {elapsed:.2f}s ({sum(sold) / elapsed:.0f}/s)")
+        self.stdout.write(f"p99 latency:    {p99 * 1000:.2f}ms")
+        self.stdout.write(f"stock left:     {event_section.tickets_available}")
+
+        if sum(sold) != tickets or event_section.tickets_available != 0:
+            raise CommandError("Inventory drifted: the section was oversold or undersold.")
+        self.stdout.write(self.style.SUCCESS("No overselling detected."))
+
+    def bench_discovery(self, venue, artist, events, repeats, **options):
+        """
+        First-page discovery queries over a synthetic catalog of upcoming events.
+
+        The catalog is built inside a transaction that is rolled back at the
+        end, so even a million events leave nothing behind.
+        """
+        rng = random.Random(0)
+        now = timezone.now()
+
+        with transaction.atomic():
+            venues = Venue.objects.bulk_create([
+                Venue(
+                    name=f"Benchmark Venue {i}",
+                    street_address="1 Benchmark Way",
+                    city=f"Benchmark City {i % 50}",
+                    state="Benchmark",
+                    postal_code="00000",
+                    capacity=1000,
+                    contact_email="benchmark@example.com",
+                )
+                for i in range(500)
+            ])
+            venue_sections = VenueSection.objects.bulk_create([
+                VenueSection(venue=catalog_venue, name="Floor", capacity=1000) for catalog_venue in venues
+            ])
+            genres = [Genre.objects.create(name=f"Benchmark Genre {i}") for i in range(20)]
+            artists = Artist.objects.bulk_create([
+                Artist(name=f"Benchmark Artist {i}", contact_email="benchmark@example.com") for i in range(5000)
+            ])
+            Artist.genres.through.objects.bulk_create([
+                Artist.genres.through(artist_id=catalog_artist.pk, genre_id=genres[i % len(genres)].pk)
+                for i, catalog_artist in enumerate(artists)
+            ])
+
+            started = time.perf_counter()
+            for offset in range(0, events, 5000):
+                prices = [rng.randrange(5, 200) for _ in range(min(5000, events - offset))]
+                picks = [rng.randrange(len(venues)) for _ in prices]
+                batch = Event.objects.bulk_create([
+                    Event(
+                        venue=venues[pick],
+                        artist=rng.choice(artists),
+                        event_date=now + timedelta(minutes=rng.randrange(1, 365 * 24 * 60)),
+                        ticket_price=price,
+                        tickets_available=1000,
+                    )
+                    for price, pick in zip(prices, picks)
+                ])
+                EventSection.objects.bulk_create([
+                    EventSection(event=event, venue_section=venue_sections[pick], tickets_available=1000, ticket_price=price)
+                    for event, price, pick in zip(batch, prices, picks)
+                ])
+                EventAvailability.objects.bulk_create([
+                    EventAvailability(event=event, tickets_remaining=1000, min_price=price, max_price=price, is_sold_out=False)
+                    for event, price in zip(batch, prices)
+                ])
+            self.stdout.write(f"catalog:        {events} events in {time.perf_counter() - started:.1f}s")
+
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    for model in (Venue, Event, EventSection, EventAvailability, Artist.genres.through):
+                        cursor.execute(f"ANALYZE {model._meta.db_table}")
+
+            scenarios = {
+                "upcoming": {},
+                "city": {'city': "benchmark city 7"},
+                "city + dates": {'city': "Benchmark City 7", 'date_from': now + timedelta(days=30), 'date_to': now + timedelta(days=60)},
+                "genre": {'genre': genres[3].slug},
+                "artist": {'artist': artists[42].pk},
+                "price range": {'min_price': 20, 'max_price': 40},
+                "price sort": {'sort': 'price'},
+                "everything": {
+                    'city': "Benchmark City 7", 'genre': genres[3].slug, 'min_price': 20, 'max_price': 120,
+                    'date_to': now + timedelta(days=180),
+                },
+            }
+            for label, filters in scenarios.items():
+                queryset, ordering = discover_events(**filters)
+                page = queryset.order_by(*ordering)[:50]
+                timings = []
+                for _ in range(repeats):
+                    started = time.perf_counter()
+                    list(page.all())
+                    timings.append(time.perf_counter() - started)
+                self.stdout.write(f"{label + ':':<16}{statistics.median(timings) * 1000:.2f}ms median, {max(timings) * 1000:.2f}ms max")
+                if options['verbosity'] > 1:
+                    self.stdout.write(page.explain())
+
+            transaction.set_rollback(True)
+
+    def bench_serialization(self, venue, artist, groups, repeats, **options):
+        """
+        One page of booking groups through BookingGroupSerializer and through the values() read path.
+
+        Each group holds three bookings. The fixtures are rolled back at the end.
+        """
+        with transaction.atomic():
+            page = self.make_booking_groups(venue, artist, groups)
+
+            def serializer():
+                return BookingGroupSerializer(page.prefetch_related('bookings'), many=True).data
+
+            def read_path():
+                return booking_group_rows(page.values(*BOOKING_GROUP_FIELDS))
+
+            if [dict(group) for group in serializer()] != read_path():
+                raise CommandError("The read path and the serializer disagree.")
+
+            medians = {}
+            for label, render in (("serializer", serializer), ("values()", read_path)):
+                timings = []
+                for _ in range(repeats):
+                    started = time.perf_counter()
+                    render()
+                    timings.append(time.perf_counter() - started)
+                medians[label] = statistics.median(timings)
+                self.stdout.write(f"{label + ':':<16}{medians[label] * 1000:.2f}ms median for {groups} groups")
+            self.stdout.write(f"speedup:        {medians['serializer'] / medians['values()']:.1f}x")
+
+            transaction.set_rollback(True)
+
+    def timed(self, repeats, work):
+        """Median seconds of `repeats` calls to `work`, and its last result."""
+        timings = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            result = work()
+            timings.append(time.perf_counter() - started)
+        return statistics.median(timings), result
+
+    def bench_rendering(self, venue, artist, groups, repeats, **options):
+        """
+        Render large booking group and event lists with JSONRenderer and ORJSONRenderer, then compress them.
+
+        `--groups` sets both the number of booking groups and of events. The
+        fixtures are rolled back at the end.
+        """
+        with transaction.atomic():
+            booking_groups = booking_group_rows(self.make_booking_groups(venue, artist, groups).values(*BOOKING_GROUP_FIELDS))
+            for _ in range(groups):
+                self.make_event_section(venue, artist, 100)
+            events = EventSerializer(Event.objects.select_related('availability').order_by('event_date', 'id')[:groups], many=True).data
+            transaction.set_rollback(True)
+
+        factory = RequestFactory()
+        for label, data in (("booking groups", booking_groups), ("events", events)):
+            stdlib, body = self.timed(repeats, lambda: JSONRenderer().render(data))
+            fast, fast_body = self.timed(repeats, lambda: ORJSONRenderer().render(data))
+            if body != fast_body:
+                raise CommandError(f"ORJSONRenderer and JSONRenderer disagree on the {label} payload.")
+            self.stdout.write(f"{label}:  {len(body) / 1024:.0f}KB, {len(data)} rows")
+            self.stdout.write(f"  JSONRenderer:   {stdlib * 1000:.2f}ms median")
+            self.stdout.write(f"  ORJSONRenderer: {fast * 1000:.2f}ms median ({stdlib / fast:.1f}x)")
+
+            for encoding in ('gzip', 'br'):
+                request = factory.get('/', HTTP_ACCEPT_ENCODING=encoding)
+                elapsed, response = self.timed(
+                    repeats, lambda: CompressionMiddleware(lambda request: HttpResponse(body))(request)
+                )
+                if response.get('Content-Encoding') != encoding:
+                    self.stdout.write(f"  {encoding}: not available")
+                    continue
+                self.stdout.write(
+                    f"  {encoding}: {len(response.content) / 1024:.0f}KB ({len(response.content) / len(body):.0%}) "
+                    f"in {elapsed * 1000:.2f}ms median"
+                )
+
+    def bench_confirmation(self, venue, artist, bookings, **options):
+        """
+        Pay for a group of `bookings` pending bookings one save at a time, as the
+        webhook used to, and with confirm_booking_group().
+
+        The fixtures are rolled back at the end.
+        """
+        def one_by_one(booking_group):
+            with transaction.atomic():
+                booking_group.status = 'paid'
+                booking_group.save()
+                total_price = sum(booking.number_of_tickets * booking.event_section.ticket_price for booking in booking_group.bookings.all())
+                Payment.objects.create(
+                    booking_group=booking_group, payment_amount=total_price, payment_status='success',
+                    payment_reference="BENCH", payment_method='stripe',
+                )
+                for booking in booking_group.bookings.all():
+                    booking.status = 'confirmed'
+                    booking.save()
+                convert_holds(booking_group)
+
+        with transaction.atomic():
+            event_section = self.make_event_section(venue, artist, bookings * 2)
+            for label, confirm in (
+                ("per-booking saves", one_by_one),
+                ("confirm_booking_group", lambda booking_group: confirm_booking_group(booking_group, "BENCH")),
+            ):
+                booking_group = self.make_pending_group(event_section, bookings)
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    confirm(booking_group)
+                    elapsed = time.perf_counter() - started
+                self.stdout.write(f"{label + ':':<24}{elapsed * 1000:.2f}ms, {len(queries)} queries for {bookings} bookings")
+
+                if Booking.objects.filter(booking_group=booking_group).exclude(status='confirmed').exists():
+                    raise CommandError(f"{label} left bookings unconfirmed.")
+            transaction.set_rollback(True)
+
+    def make_pending_group(self, event_section, bookings):
+        """A pending booking group of one-ticket bookings, each with an active hold."""
+        booking_group = BookingGroup.objects.create(total_price=bookings * event_section.ticket_price)
+        created = Booking.objects.bulk_create([
+            Booking(
+                booking_group=booking_group,
+                event_section=event_section,
+                reference=f"BENCH-{booking_group.pk}-{i}",
+                number_of_tickets=1,
+                total_price=event_section.ticket_price,
+            )
+            for i in range(bookings)
+        ])
+        expires_at = timezone.now() + timedelta(minutes=15)
+        TicketHold.objects.bulk_create([
+            TicketHold(
+                booking=booking, booking_group=booking_group, event_section=event_section, quantity=1, expires_at=expires_at
+            )
+            for booking in created
+        ])
+        return booking_group
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.8 on 2026-10-18 08:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0006_remove_booking_user_remove_bookinggroup_user'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('quantity', models.PositiveIntegerField()),
+                ('expires_at', models.DateTimeField()),
+                ('status', models.CharField(choices=[('active', 'Active'), ('released', 'Released'), ('expired', 'Expired'), ('converted', 'Converted')], default='active', max_length=10)),
+                ('booking', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='hold', to='booking.booking')),
+                ('booking_group', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='holds', to='booking.bookinggroup')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('event_section', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holds', to='booking.eventsection')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('status', 'active')), fields=['expires_at'], name='tickethold_active_expiry_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.8 on 2026-10-18 08:32
+
+from django.db import migrations, models
+
+
+def create_reference_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("CREATE SEQUENCE IF NOT EXISTS booking_reference_block_seq")
+
+
+def drop_reference_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("DROP SEQUENCE IF EXISTS booking_reference_block_seq")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0007_tickethold'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReferenceCounter',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_reference_sequence, drop_reference_sequence),
+    ]
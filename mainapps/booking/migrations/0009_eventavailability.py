@@ -0,0 +1,48 @@
+# Generated by Django 5.1.8 on 2026-10-18 08:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Max, Min, Sum
+
+
+def backfill_event_availability(apps, schema_editor):
+    Event = apps.get_model('booking', 'Event')
+    EventAvailability = apps.get_model('booking', 'EventAvailability')
+
+    summaries = []
+    for event in Event.objects.annotate(
+        remaining=Sum('event_sections__tickets_available'),
+        min_price=Min('event_sections__ticket_price'),
+        max_price=Max('event_sections__ticket_price'),
+    ).iterator():
+        remaining = event.remaining or 0
+        summaries.append(EventAvailability(
+            event_id=event.pk,
+            tickets_remaining=remaining,
+            min_price=event.min_price,
+            max_price=event.max_price,
+            is_sold_out=remaining == 0,
+        ))
+    EventAvailability.objects.bulk_create(summaries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0008_referencecounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventAvailability',
+            fields=[
+                ('event', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='availability', serialize=False, to='booking.event')),
+                ('tickets_remaining', models.PositiveIntegerField(default=0)),
+                ('min_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('max_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('is_sold_out', models.BooleanField(default=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_event_availability, migrations.RunPython.noop),
+    ]
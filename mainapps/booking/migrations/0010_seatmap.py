@@ -0,0 +1,44 @@
+# Generated by Django 5.1.8 on 2026-10-18 08:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0009_eventavailability'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeatMap',
+            fields=[
+                ('event_section', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='seat_map', serialize=False, to='booking.eventsection')),
+                ('rows', models.PositiveIntegerField()),
+                ('seats_per_row', models.PositiveIntegerField()),
+                ('bitmap', models.BinaryField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='first_seat',
+            field=models.PositiveIntegerField(blank=True, help_text='First of the adjacent seats, for reserved seating', null=True),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='seat_row',
+            field=models.PositiveIntegerField(blank=True, help_text='Row of the seats, for reserved seating', null=True),
+        ),
+        migrations.AddField(
+            model_name='venuesection',
+            name='seat_rows',
+            field=models.PositiveIntegerField(blank=True, help_text='Rows of reserved seats; leave empty for general admission.', null=True),
+        ),
+        migrations.AddField(
+            model_name='venuesection',
+            name='seats_per_row',
+            field=models.PositiveIntegerField(blank=True, help_text='Seats in each row of reserved seating.', null=True),
+        ),
+    ]
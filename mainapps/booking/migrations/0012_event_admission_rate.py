@@ -0,0 +1,18 @@
+# Generated by Django 5.1.8 on 2026-10-18 08:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0011_waitlistentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='admission_rate',
+            field=models.PositiveIntegerField(blank=True, help_text='Buyers admitted from the waiting room per second; leave empty to sell without a waiting room', null=True),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.8 on 2026-10-18 08:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('artist', '0002_genre_slug_alter_artist_genres'),
+        ('booking', '0012_event_admission_rate'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['created_by', 'created_at', 'id'], name='booking_owner_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookinggroup',
+            index=models.Index(fields=['created_at', 'id'], name='bookinggroup_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['created_by', 'event_date', 'id'], name='event_owner_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='eventsection',
+            index=models.Index(fields=['created_by', 'created_at', 'id'], name='eventsection_owner_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venue',
+            index=models.Index(fields=['created_by', 'created_at', 'id'], name='venue_owner_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venuesection',
+            index=models.Index(fields=['created_by', 'created_at', 'id'], name='venuesection_owner_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='waitlistentry',
+            index=models.Index(fields=['created_by', 'created_at', 'id'], name='waitlist_owner_created_idx'),
+        ),
+    ]
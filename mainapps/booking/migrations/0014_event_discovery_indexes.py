@@ -0,0 +1,37 @@
+# Generated by Django 5.1.8 on 2026-10-18 08:43
+
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('artist', '0002_genre_slug_alter_artist_genres'),
+        ('booking', '0013_list_ordering_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['status', 'event_date', 'id'], name='event_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['venue', 'event_date'], name='event_venue_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['artist', 'event_date'], name='event_artist_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='eventsection',
+            index=models.Index(fields=['event', 'ticket_price'], name='eventsection_event_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venue',
+            index=models.Index(django.db.models.functions.text.Upper('city'), name='venue_city_upper_idx'),
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 5.1.8 on 2026-10-18 08:45
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+SEARCH_SQL = """
+CREATE FUNCTION booking_venue_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.city, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER booking_venue_search_vector_trigger
+    BEFORE INSERT OR UPDATE ON booking_venue
+    FOR EACH ROW EXECUTE FUNCTION booking_venue_search_vector_update();
+
+CREATE FUNCTION booking_event_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := to_tsvector('english', coalesce(NEW.description, ''));
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER booking_event_search_vector_trigger
+    BEFORE INSERT OR UPDATE ON booking_event
+    FOR EACH ROW EXECUTE FUNCTION booking_event_search_vector_update();
+
+UPDATE booking_venue SET search_vector =
+    setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(city, '')), 'B');
+UPDATE booking_event SET search_vector = to_tsvector('english', coalesce(description, ''));
+
+CREATE INDEX venue_search_vector_idx ON booking_venue USING gin (search_vector);
+CREATE INDEX venue_name_trgm_idx ON booking_venue USING gin (name gin_trgm_ops);
+CREATE INDEX event_search_vector_idx ON booking_event USING gin (search_vector);
+CREATE INDEX event_description_trgm_idx ON booking_event USING gin (description gin_trgm_ops);
+"""
+
+DROP_SEARCH_SQL = """
+DROP INDEX IF EXISTS event_description_trgm_idx;
+DROP INDEX IF EXISTS event_search_vector_idx;
+DROP INDEX IF EXISTS venue_name_trgm_idx;
+DROP INDEX IF EXISTS venue_search_vector_idx;
+DROP TRIGGER IF EXISTS booking_event_search_vector_trigger ON booking_event;
+DROP FUNCTION IF EXISTS booking_event_search_vector_update();
+DROP TRIGGER IF EXISTS booking_venue_search_vector_trigger ON booking_venue;
+DROP FUNCTION IF EXISTS booking_venue_search_vector_update();
+"""
+
+
+def create_search_triggers(apps, schema_editor):
+    # GIN indexes and triggers are PostgreSQL only; other databases search with LIKE
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(SEARCH_SQL)
+
+
+def drop_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_SEARCH_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('artist', '0003_artist_search'),
+        ('booking', '0014_event_discovery_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='venue',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_triggers, drop_search_triggers),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.8 on 2026-10-18 09:23
+
+import django.core.validators
+from django.db import migrations, models
+
+
+def admit_at_least_one_per_second(apps, schema_editor):
+    # A rate of zero never admits anyone and cannot estimate a wait
+    apps.get_model('booking', 'Event').objects.filter(admission_rate=0).update(admission_rate=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0015_catalog_search'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='event',
+            name='admission_rate',
+            field=models.PositiveIntegerField(blank=True, help_text='Buyers admitted from the waiting room per second; leave empty to sell without a waiting room', null=True, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.RunPython(admit_at_least_one_per_second, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.8 on 2026-10-18 09:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0016_event_admission_rate_min'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tickethold',
+            name='extended',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -1,10 +1,14 @@
-from django.db import models
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Upper
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
+from django.core.validators import MinValueValidator
 from django.utils import timezone
 from mainapps.artist.models import Artist
-import uuid
 from django.utils.timezone import now
+from .references import allocate_references
 
 
 User = get_user_model()
@@ -45,6 +49,7 @@ class Venue(Tracking):
         capacity: Overall capacity of the venue (total number of people it can hold).
         contact_email: Contact email for the venue.
         contact_phone: Contact phone number for the venue (optional).
+        search_vector: Weighted name and city lexemes, kept up to date by a database trigger on PostgreSQL.
     """
     name = models.CharField(max_length=100)
     street_address = models.CharField(max_length=255)
@@ -54,6 +59,13 @@ class Venue(Tracking):
     capacity = models.PositiveIntegerField()
     contact_email = models.EmailField()
     contact_phone = models.CharField(max_length=15, blank=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_by', 'created_at', 'id'], name='venue_owner_created_idx'),
+            models.Index(Upper('city'), name='venue_city_upper_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -67,10 +79,30 @@ class VenueSection(Tracking):
         venue: The venue to which this section belongs.
         name: The name of the section (e.g., "High Table", "Regular Table").
         capacity: Total number of seats available in this section.
+        seat_rows: Number of seat rows, for reserved seating.
+        seats_per_row: Number of seats in each row, for reserved seating.
     """
     venue = models.ForeignKey(Venue, on_delete=models.CASCADE, related_name='sections')
     name = models.CharField(max_length=50)
     capacity = models.PositiveIntegerField(help_text="Total number of seats in this section.")
+    seat_rows = models.PositiveIntegerField(null=True, blank=True, help_text="Rows of reserved seats; leave empty for general admission.")
+    seats_per_row = models.PositiveIntegerField(null=True, blank=True, help_text="Seats in each row of reserved seating.")
+
+    @property
+    def is_reserved_seating(self):
+        return bool(self.seat_rows and self.seats_per_row)
+
+    def clean(self):
+        """
+        Validate that a reserved seating layout fits within the section's capacity.
+        """
+        if self.is_reserved_seating and self.seat_rows * self.seats_per_row > self.capacity:
+            raise ValidationError("Seat layout exceeds the capacity of the section.")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_by', 'created_at', 'id'], name='venuesection_owner_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} at {self.venue.name}"
@@ -90,6 +122,8 @@ class Event(Tracking):
         booking_policy: Defines policies related to refunds, cancellations, and booking conditions.
         is_refundable: Specifies if tickets for the event can be refunded.
         refund_deadline: The last date/time users can request a refund.
+        admission_rate: Buyers let through the virtual waiting room per second, if the event uses one.
+        search_vector: Description lexemes, kept up to date by a database trigger on PostgreSQL.
     """
 
     STATUS_CHOICES = [
@@ -111,6 +145,16 @@ class Event(Tracking):
     is_refundable = models.BooleanField(default=False, help_text="Are tickets refundable?")
     refund_deadline = models.DateTimeField(blank=True, null=True, help_text="Deadline for requesting a refund")
 
+    # High-demand on-sales
+    admission_rate = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(1)],
+        help_text="Buyers admitted from the waiting room per second; leave empty to sell without a waiting room",
+    )
+
+    search_vector = SearchVectorField(null=True, editable=False)
+
     def is_refund_available(self):
         """
         Check if a refund is possible based on the refund policy.
@@ -129,6 +173,15 @@ class Event(Tracking):
         if self.event_date < timezone.now():
             raise ValidationError("Event date must be in the future.")
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_by', 'event_date', 'id'], name='event_owner_date_idx'),
+            # Event discovery
+            models.Index(fields=['status', 'event_date', 'id'], name='event_status_date_idx'),
+            models.Index(fields=['venue', 'event_date'], name='event_venue_date_idx'),
+            models.Index(fields=['artist', 'event_date'], name='event_artist_date_idx'),
+        ]
+
     def __str__(self):
         return f"{self.artist.name} at {self.venue.name} on {self.event_date.strftime('%Y-%m-%d %H:%M')}"
 
@@ -156,16 +209,70 @@ class EventSection(Tracking):
         if self.tickets_available > self.venue_section.capacity:
             raise ValidationError("Tickets available exceed the capacity of the venue section.")
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_by', 'created_at', 'id'], name='eventsection_owner_created_idx'),
+            models.Index(fields=['event', 'ticket_price'], name='eventsection_event_price_idx'),
+        ]
+
     def __str__(self):
         return f"{self.venue_section.name} for {self.event}"
 
+class SeatMap(models.Model):
+    """
+    Compact record of which seats of a reserved-seating event section are taken.
+
+    Attributes:
+        event_section: The event section the seats belong to.
+        rows: Number of seat rows, copied from the venue section layout.
+        seats_per_row: Number of seats in each row.
+        bitmap: One bit per seat, set when taken; decoded by mainapps.booking.seating.SeatBitmap.
+        updated_at: When seats were last claimed or released.
+    """
+    event_section = models.OneToOneField(EventSection, on_delete=models.CASCADE, primary_key=True, related_name='seat_map')
+    rows = models.PositiveIntegerField()
+    seats_per_row = models.PositiveIntegerField()
+    bitmap = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Seat map for event section {self.event_section_id}"
+
+
+class EventAvailability(models.Model):
+    """
+    Materialized ticket availability for an event, summarised from its sections.
+
+    Kept up to date by mainapps.booking.availability whenever the sections'
+    stock changes, so event listings can show availability without reading
+    the sections table.
+
+    Attributes:
+        event: The event being summarised.
+        tickets_remaining: Tickets still available across all sections.
+        min_price: Cheapest section ticket price (null when the event has no sections).
+        max_price: Most expensive section ticket price (null when the event has no sections).
+        is_sold_out: True when no section has tickets left.
+        updated_at: When the summary was last refreshed.
+    """
+    event = models.OneToOneField(Event, on_delete=models.CASCADE, primary_key=True, related_name='availability')
+    tickets_remaining = models.PositiveIntegerField(default=0)
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    is_sold_out = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.tickets_remaining} tickets left for event {self.event_id}"
+
+
 class BookingGroup(Tracking):
     """
     A parent model that groups multiple bookings together under a single transaction.
 
     Attributes:
         reference: Unique booking reference for tracking.
-        total_price: Sum of all bookings within this group.
+        total_price: Sum of all bookings within this group that are not canceled.
         status: Overall booking status (Pending, Confirmed,Paid, Canceled, Completed).
     """
 
@@ -183,20 +290,64 @@ class BookingGroup(Tracking):
 
     def generate_reference(self):
         """Generates a unique reference for the entire booking group."""
-        date_str = now().strftime('%Y%m%d')
-        unique_code = uuid.uuid4().hex[:6].upper()
-        return f"GRP-{date_str}-{unique_code}"
+        return allocate_references('GRP')[0]
 
     def save(self, *args, **kwargs):
-        """Auto-generate reference and calculate total price."""
+        """
+        Auto-generate reference.
+
+        total_price is maintained incrementally by Booking.save and the booking
+        delete signal, so saving the group never walks its bookings.
+        """
         if not self.reference:
             self.reference = self.generate_reference()
-        
-        # Recalculate total price
-        self.total_price = sum(booking.total_price for booking in self.bookings.all())
 
         super().save(*args, **kwargs)
 
+    def recalculate_total(self):
+        """Recompute total_price from the bookings with a single aggregate query."""
+        self.total_price = self.bookings.exclude(status='canceled').aggregate(total=Sum('total_price'))['total'] or 0
+        BookingGroup.objects.filter(pk=self.pk).update(total_price=self.total_price, updated_at=now())
+
+    @classmethod
+    def recalculate_totals(cls, queryset=None):
+        """
+        Recompute total_price for many groups with one UPDATE over a correlated SUM.
+
+        Args:
+            queryset: Groups to repair; defaults to every group.
+
+        Returns:
+            int: Number of groups updated.
+        """
+        totals = (
+            Booking.objects.filter(booking_group=OuterRef('pk'))
+            .exclude(status='canceled')
+            .order_by()
+            .values('booking_group')
+            .annotate(total=Sum('total_price'))
+            .values('total')
+        )
+        queryset = cls.objects.all() if queryset is None else queryset
+        return queryset.update(
+            total_price=Coalesce(Subquery(totals), Value(0), output_field=models.DecimalField(max_digits=10, decimal_places=2)),
+            updated_at=now(),
+        )
+
+    @staticmethod
+    def adjust_total(booking_group_id, delta):
+        """Shift a group's total_price by `delta` in place, without reading its bookings."""
+        if booking_group_id and delta:
+            BookingGroup.objects.filter(pk=booking_group_id).update(
+                total_price=F('total_price') + delta,
+                updated_at=now(),
+            )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='bookinggroup_created_idx'),
+        ]
+
     def __str__(self):
         return f"BookingGroup {self.reference} - ({self.get_status_display()})"
 
@@ -210,6 +361,8 @@ class Booking(Tracking):
         event_section: The section being booked.
         number_of_tickets: Number of tickets purchased.
         total_price: Price for this particular booking.
+        seat_row: Row of the booked seats in a reserved-seating section.
+        first_seat: First seat of the booked block; the block is number_of_tickets seats wide.
     """
 
     STATUS_CHOICES = [
@@ -226,12 +379,27 @@ class Booking(Tracking):
     booking_date = models.DateTimeField(auto_now_add=True)
     total_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, default=0)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    seat_row = models.PositiveIntegerField(null=True, blank=True, help_text="Row of the seats, for reserved seating")
+    first_seat = models.PositiveIntegerField(null=True, blank=True, help_text="First of the adjacent seats, for reserved seating")
 
     def generate_reference(self):
         """Generates a unique reference for individual bookings."""
-        date_str = now().strftime('%Y%m%d')
-        unique_code = uuid.uuid4().hex[:6].upper()
-        return f"BKG-{date_str}-{unique_code}"
+        return allocate_references('BKG')[0]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what this booking currently contributes to its group's total
+        if {'booking_group_id', 'total_price', 'status'} <= instance.__dict__.keys():
+            instance._group_contribution = (instance.booking_group_id, instance.group_share)
+        else:
+            instance._group_contribution = None
+        return instance
+
+    @property
+    def group_share(self):
+        """What the booking adds to its group's total_price; canceled bookings add nothing."""
+        return 0 if self.status == 'canceled' else self.total_price
 
     def save(self, *args, **kwargs):
         """Calculate total price and update booking group price."""
@@ -241,17 +409,121 @@ class Booking(Tracking):
 
         self.total_price = self.number_of_tickets * self.event_section.ticket_price
 
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+            # Move only the difference onto the booking group's total price
+            contribution = getattr(self, '_group_contribution', (None, 0))
+            if contribution is None:
+                # Loaded with deferred fields, so its previous share is unknown
+                BookingGroup.recalculate_totals(BookingGroup.objects.filter(pk=self.booking_group_id))
+            else:
+                old_group_id, old_total = contribution
+                if old_group_id == self.booking_group_id:
+                    BookingGroup.adjust_total(self.booking_group_id, self.group_share - old_total)
+                else:
+                    BookingGroup.adjust_total(old_group_id, -old_total)
+                    BookingGroup.adjust_total(self.booking_group_id, self.group_share)
+            self._group_contribution = (self.booking_group_id, self.group_share)
 
-        # Update the booking group's total price
-        if self.booking_group:
-            self.booking_group.save()
-        else:
-            self.booking_group = BookingGroup.objects.create(
-                status='pending'
-                )
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_by', 'created_at', 'id'], name='booking_owner_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.reference} - {self.event_section.venue_section.name} - {self.get_status_display()}"
+
+
+class WaitlistEntry(Tracking):
+    """
+    A fan waiting for tickets in a sold-out event section.
+
+    Entries are served first come, first served: the id is the queue order.
+    Redis keeps the live queue per section; this table is its durable mirror.
+
+    Attributes:
+        event_section: The section being waited on.
+        number_of_tickets: Tickets wanted; the entry is only promoted when all can be booked.
+        status: Waiting, Promoted (tickets booked) or Canceled.
+        booking_group: The pending booking group created on promotion.
+        promoted_at: When the entry was promoted.
+    """
+
+    STATUS_CHOICES = [
+        ('waiting', 'Waiting'),
+        ('promoted', 'Promoted'),
+        ('canceled', 'Canceled'),
+    ]
+
+    event_section = models.ForeignKey(EventSection, on_delete=models.CASCADE, related_name='waitlist_entries')
+    number_of_tickets = models.PositiveIntegerField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='waiting')
+    booking_group = models.ForeignKey(BookingGroup, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    promoted_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['event_section', 'id'], condition=models.Q(status='waiting'), name='waitlist_waiting_idx'),
+            models.Index(fields=['created_by', 'created_at', 'id'], name='waitlist_owner_created_idx'),
+        ]
 
-        
+    def __str__(self):
+        return f"Waitlist #{self.pk} for {self.number_of_tickets} in section {self.event_section_id} ({self.get_status_display()})"
+
+
+class ReferenceCounter(models.Model):
+    """
+    Block counter backing the reference allocator on databases without sequences.
+
+    Attributes:
+        name: Name of the counter.
+        value: Number of reference blocks leased so far.
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+
+class TicketHold(Tracking):
+    """
+    Ledger entry for tickets set aside for a pending booking until it is paid or expires.
+
+    The tickets themselves are already taken out of the event section when the
+    booking is created; the hold records how long the pending booking may keep
+    them before the expiry sweep cancels it and returns the stock.
+
+    Attributes:
+        booking: The pending booking holding the tickets.
+        booking_group: The group the booking belongs to, if any.
+        event_section: The section the tickets were taken from.
+        quantity: Number of tickets held.
+        expires_at: When the hold lapses if the booking has not been paid.
+        extended: Whether expires_at was pushed back for a checkout session; it only ever is once.
+        status: Active, Released (booking canceled), Expired or Converted (booking paid).
+    """
+
+    STATUS_CHOICES = [
+        ('active', 'Active'),
+        ('released', 'Released'),
+        ('expired', 'Expired'),
+        ('converted', 'Converted'),
+    ]
+
+    booking = models.OneToOneField(Booking, on_delete=models.CASCADE, related_name='hold')
+    booking_group = models.ForeignKey(BookingGroup, on_delete=models.CASCADE, related_name='holds', null=True, blank=True)
+    event_section = models.ForeignKey(EventSection, on_delete=models.CASCADE, related_name='holds')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+    extended = models.BooleanField(default=False)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='active')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['expires_at'], condition=models.Q(status='active'), name='tickethold_active_expiry_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.reference} - {self.event_section.name} - {self.get_status_display()}"
+        return f"Hold of {self.quantity} for {self.booking_id} until {self.expires_at:%Y-%m-%d %H:%M} ({self.get_status_display()})"
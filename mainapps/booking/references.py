@@ -0,0 +1,105 @@
+import os
+import threading
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils.timezone import now
+
+CROCKFORD_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+
+# Database sequence counting leased blocks; created by booking migration 0008
+REFERENCE_SEQUENCE = "booking_reference_block_seq"
+REFERENCE_BLOCK_SIZE = 1000
+
+# 7 base32 characters give 32**7 (about 34 billion) references, and keep
+# "BKG-YYYYMMDD-XXXXXXX" within the 20 characters of the reference columns
+REFERENCE_WIDTH = 7
+
+
+def encode_base32(value, width=REFERENCE_WIDTH):
+    """Encode a non-negative integer as zero-padded Crockford base32."""
+    chars = []
+    while value:
+        value, remainder = divmod(value, 32)
+        chars.append(CROCKFORD_ALPHABET[remainder])
+    return "".join(reversed(chars)).rjust(width, "0")
+
+
+class ReferenceAllocator:
+    """
+    Hands out unique reference numbers from blocks leased from the database.
+
+    Each block costs one round trip (a `nextval` on Postgres), after which the
+    next REFERENCE_BLOCK_SIZE numbers are served from memory. Numbers never
+    repeat because blocks are never handed out twice; a block abandoned by a
+    restarted process just leaves a gap.
+    """
+
+    def __init__(self, block_size=REFERENCE_BLOCK_SIZE):
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        # Highest block leased from the counter row, see _lease_block()
+        self._last_block = 0
+        self._reset()
+
+    def _reset(self):
+        self._next = self._end = 0
+
+    def allocate(self, count=1):
+        """Return `count` fresh reference numbers."""
+        numbers = []
+        with self._lock:
+            while len(numbers) < count:
+                if self._next >= self._end:
+                    self._next = self._lease_block() * self.block_size
+                    self._end = self._next + self.block_size
+                take = min(count - len(numbers), self._end - self._next)
+                numbers.extend(range(self._next, self._next + take))
+                self._next += take
+        return numbers
+
+    def _lease_block(self):
+        """
+        Lease the next block number.
+
+        On Postgres this is a sequence. Databases without sequences (sqlite
+        in development and tests) use a counter row instead, which is only
+        safe for a single process: the row is updated in the caller's
+        transaction, so a rollback hands the block back while this process
+        keeps serving it, and another process could lease it again. Within
+        the process, leases never go below the last block it leased.
+        """
+        if connection.vendor == 'postgresql':
+            # nextval is not transactional, so a rolled back caller cannot cause reuse
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT nextval(%s)", [REFERENCE_SEQUENCE])
+                return cursor.fetchone()[0]
+
+        from .models import ReferenceCounter
+
+        with transaction.atomic():
+            ReferenceCounter.objects.get_or_create(name=REFERENCE_SEQUENCE)
+            counter = ReferenceCounter.objects.filter(name=REFERENCE_SEQUENCE)
+            counter.update(value=Greatest(F('value'), self._last_block) + 1)
+            self._last_block = counter.values_list('value', flat=True).get()
+        return self._last_block
+
+
+_allocator = ReferenceAllocator()
+
+# A forked worker must not keep serving the parent's block
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_allocator._reset)
+
+
+def allocate_references(prefix, count=1):
+    """
+    Return `count` unique references of the form PREFIX-YYYYMMDD-XXXXXXX.
+
+    Args:
+        prefix: Reference family, e.g. "BKG" or "GRP".
+        count: How many references to allocate; bulk creation asks for all at once.
+    """
+    date_str = now().strftime('%Y%m%d')
+    return [f"{prefix}-{date_str}-{encode_base32(number)}" for number in _allocator.allocate(count)]
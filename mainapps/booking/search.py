@@ -0,0 +1,74 @@
+from functools import reduce
+from operator import or_
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity, TrigramWordSimilarity
+from django.db import connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from mainapps.artist.models import Artist
+
+from .models import Event, Venue
+
+# Text search configuration used by the search vector triggers (artist 0003, booking 0015)
+SEARCH_CONFIG = 'english'
+
+
+def _search(queryset, query, trigram_field, fallback_fields, word_similarity=False):
+    """
+    Rank `queryset` against a free-text query.
+
+    On PostgreSQL a row matches if its maintained search vector matches the
+    query or if `trigram_field` is trigram-similar to it, which catches typos
+    the stemmer cannot. Both conditions are served by GIN indexes. Rows are
+    ranked by text relevance plus trigram similarity.
+
+    Other databases (the sqlite test database) fall back to a case-insensitive
+    substring match over `fallback_fields`, in primary key order.
+    """
+    if connection.vendor != 'postgresql':
+        return queryset.filter(
+            reduce(or_, (Q(**{f'{field}__icontains': query}) for field in fallback_fields))
+        ).order_by('pk')
+
+    search_query = SearchQuery(query, search_type='websearch', config=SEARCH_CONFIG)
+    if word_similarity:
+        # Long text: compare the query with the closest run of words, not the whole field
+        similarity = TrigramWordSimilarity(query, trigram_field)
+        fuzzy_match = Q(**{f'{trigram_field}__trigram_word_similar': query})
+    else:
+        similarity = TrigramSimilarity(trigram_field, query)
+        fuzzy_match = Q(**{f'{trigram_field}__trigram_similar': query})
+
+    return (
+        queryset.filter(Q(search_vector=search_query) | fuzzy_match)
+        .annotate(rank=SearchRank(F('search_vector'), search_query) + similarity)
+        .order_by('-rank', 'pk')
+    )
+
+
+def search_artists(query):
+    """Artists whose name or bio match `query`, best match first."""
+    return _search(Artist.objects.defer('search_vector'), query, 'name', ['name', 'bio'])
+
+
+def search_venues(query):
+    """Venues whose name or city match `query`, best match first."""
+    return _search(Venue.objects.defer('search_vector'), query, 'name', ['name', 'city'])
+
+
+def search_events(query):
+    """Upcoming events whose description matches `query`, best match first."""
+    events = (
+        Event.objects.filter(status='upcoming', event_date__gte=timezone.now())
+        .select_related('artist', 'venue')
+        .defer('search_vector', 'artist__search_vector', 'venue__search_vector')
+    )
+    return _search(events, query, 'description', ['description'], word_similarity=True)
+
+
+SEARCHES = {
+    'artists': search_artists,
+    'venues': search_venues,
+    'events': search_events,
+}
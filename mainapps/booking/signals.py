@@ -0,0 +1,74 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.response_cache import invalidate_response_cache
+from .availability import schedule_availability_refresh
+from .inventory import tickets_released
+from .models import Booking, BookingGroup, Event, EventSection, SeatMap, Venue, VenueSection
+from .seating import SeatBitmap
+from .waitlist import promote_waitlist
+
+
+@receiver(post_delete, sender=Booking)
+def remove_booking_from_group_total(sender, instance, **kwargs):
+    """Take a deleted booking's price off its group's running total."""
+    BookingGroup.adjust_total(instance.booking_group_id, -instance.group_share)
+
+
+@receiver(post_save, sender=Event)
+def create_event_availability(sender, instance, created, **kwargs):
+    """Give new events an availability summary straight away."""
+    if created:
+        schedule_availability_refresh(event_ids=[instance.pk])
+
+
+@receiver(post_save, sender=EventSection)
+@receiver(post_delete, sender=EventSection)
+def refresh_availability_for_section(sender, instance, **kwargs):
+    """Stock or price of a section changed, so its event's summary is stale."""
+    schedule_availability_refresh(event_ids=[instance.event_id])
+
+
+@receiver(post_save, sender=EventSection)
+def create_seat_map(sender, instance, created, **kwargs):
+    """Reserved-seating sections get an empty seat map to claim seats from."""
+    venue_section = instance.venue_section
+    if created and venue_section.is_reserved_seating:
+        SeatMap.objects.create(
+            event_section=instance,
+            rows=venue_section.seat_rows,
+            seats_per_row=venue_section.seats_per_row,
+            bitmap=SeatBitmap(venue_section.seat_rows, venue_section.seats_per_row).to_bytes(),
+        )
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def invalidate_cached_event(sender, instance, **kwargs):
+    invalidate_response_cache('events', instance.pk)
+
+
+@receiver(post_save, sender=EventSection)
+@receiver(post_delete, sender=EventSection)
+def invalidate_cached_event_for_section(sender, instance, **kwargs):
+    """Event responses show the prices and stock of their sections."""
+    invalidate_response_cache('events', instance.event_id)
+
+
+@receiver(post_save, sender=Venue)
+@receiver(post_delete, sender=Venue)
+def invalidate_cached_venue(sender, instance, **kwargs):
+    invalidate_response_cache('venues', instance.pk)
+
+
+@receiver(post_save, sender=VenueSection)
+@receiver(post_delete, sender=VenueSection)
+def invalidate_cached_venue_section(sender, instance, **kwargs):
+    invalidate_response_cache('venue_sections', instance.pk)
+
+
+@receiver(tickets_released)
+def promote_waitlist_on_release(sender, event_section_id, **kwargs):
+    """Offer released tickets to the section's waitlist once the release commits."""
+    transaction.on_commit(lambda: promote_waitlist(event_section_id))
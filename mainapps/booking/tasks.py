@@ -0,0 +1,42 @@
+from celery import shared_task
+from django.conf import settings
+from django.core.mail import send_mass_mail
+
+from . import inventory
+from .models import WaitlistEntry
+
+
+@shared_task
+def sweep_expired_holds():
+    """Release the tickets of pending bookings whose holds have lapsed."""
+    return inventory.release_expired_holds()
+
+
+@shared_task
+def requeue_waitlists():
+    """Queue waitlist entries that Redis missed when they were created."""
+    from .waitlist import requeue_waitlists  # waitlist imports this module
+
+    return requeue_waitlists()
+
+
+@shared_task
+def notify_waitlist_promotions(entry_ids):
+    """Email fans whose waitlist entries have been turned into pending bookings."""
+    entries = WaitlistEntry.objects.filter(pk__in=entry_ids).select_related(
+        'created_by', 'booking_group', 'event_section__venue_section'
+    )
+    messages = [
+        (
+            "Tickets are waiting for you",
+            f"Good news! {entry.number_of_tickets} ticket(s) in {entry.event_section.venue_section.name} "
+            f"are now held for you under booking {entry.booking_group.reference}. "
+            f"Complete your payment within {int(settings.BOOKING_HOLD_TTL.total_seconds() // 60)} minutes "
+            f"or they will be offered to the next person in line.",
+            settings.EMAIL_HOST_USER,
+            [entry.created_by.email],
+        )
+        for entry in entries
+        if entry.created_by and entry.booking_group
+    ]
+    return send_mass_mail(messages, fail_silently=True)
@@ -1,3 +1,1078 @@
-from django.test import TestCase
+import gzip
+import itertools
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import fakeredis
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+from redis.exceptions import ConnectionError as RedisConnectionError
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from core.middleware import brotli, compress_brotli_sequence
+from core.renderers import ORJSONRenderer
+
+from mainapps.artist.models import Artist, Genre
+from mainapps.booking import availability
+from mainapps.booking.inventory import (
+    InsufficientInventory,
+    cancel_booking,
+    convert_holds,
+    create_booking_group,
+    held_tickets,
+    release_expired_holds,
+    reserve_tickets,
+    tickets_released,
+)
+from mainapps.booking.api.readers import BOOKING_FIELDS, BOOKING_GROUP_FIELDS, booking_group_rows, booking_rows
+from mainapps.booking.api.serializers import BookingGroupSerializer, BookingSerializer, EventSerializer
+from mainapps.booking.api.views import BookingViewSet
+from mainapps.booking.models import (
+    Booking, BookingGroup, Event, EventAvailability, EventSection, SeatMap, TicketHold, Venue, VenueSection,
+    WaitlistEntry,
+)
+from mainapps.booking.references import (
+    CROCKFORD_ALPHABET, ReferenceAllocator, allocate_references, encode_base32,
+)
+from mainapps.booking.seating import SeatBitmap, load_bitmap
+from mainapps.booking.waitlist import requeue_waitlists, waitlist_position
+
+
+# Measure the database, not the response cache
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class BookingAPITestCase(TestCase):
+    """Authenticated API client plus factories for the booking models."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(email="lister@example.com", password="secret")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.artist = Artist.objects.create(name="Query Count", contact_email="artist@example.com")
+        self.venue = self.make_venue()
+
+    def make_venue(self):
+        return Venue.objects.create(
+            name="Count Hall",
+            street_address="1 Count Street",
+            city="Lagos",
+            state="Lagos",
+            postal_code="100001",
+            capacity=1000,
+            contact_email="venue@example.com",
+            created_by=self.user,
+        )
+
+    def make_event_section(self):
+        venue_section = VenueSection.objects.create(
+            venue=self.venue, name="Floor", capacity=100, created_by=self.user
+        )
+        event = Event.objects.create(
+            venue=self.venue,
+            artist=self.artist,
+            event_date=timezone.now() + timedelta(days=30),
+            ticket_price=10,
+            tickets_available=100,
+            created_by=self.user,
+        )
+        return EventSection.objects.create(
+            event=event,
+            venue_section=venue_section,
+            tickets_available=100,
+            ticket_price=10,
+            created_by=self.user,
+        )
+
+    def make_booking_group(self):
+        return create_booking_group(self.user, [(self.make_event_section().pk, 2), (self.make_event_section().pk, 1)])
+
+
+class ReferenceTests(TestCase):
+
+    def test_numbers_are_unique_across_blocks_and_allocators(self):
+        first, second = ReferenceAllocator(block_size=3), ReferenceAllocator(block_size=3)
+        numbers = first.allocate(2) + second.allocate(1) + first.allocate(5) + second.allocate(4) + first.allocate()
+        self.assertEqual(len(numbers), 13)
+        self.assertEqual(len(set(numbers)), 13)
+
+    def test_rolled_back_leases_are_not_handed_out_again(self):
+        allocator = ReferenceAllocator(block_size=3)
+        with transaction.atomic():
+            first = allocator.allocate(3)
+            transaction.set_rollback(True)
+        numbers = first + allocator.allocate(3) + ReferenceAllocator(block_size=3).allocate(3)
+        self.assertEqual(len(set(numbers)), 9)
+
+    def test_references_use_the_crockford_alphabet(self):
+        self.assertEqual(encode_base32(0), '0000000')
+        self.assertEqual(encode_base32(31), '000000Z')
+        self.assertEqual(encode_base32(32 ** 7 - 1), 'ZZZZZZZ')
+
+        references = allocate_references('BKG', 50)
+        self.assertEqual(len(set(references)), 50)
+        for reference in references:
+            # Crockford base32 leaves out I, L, O and U
+            self.assertRegex(reference, r'^BKG-\d{8}-[0-9A-HJKMNP-TV-Z]{7}$')
+            self.assertLessEqual(len(reference), Booking._meta.get_field('reference').max_length)
+        digits = str.maketrans(CROCKFORD_ALPHABET, '0123456789ABCDEFGHIJKLMNOPQRSTUV')
+        numbers = [int(reference[-7:].translate(digits), 32) for reference in references]
+        self.assertEqual(len(set(numbers)), 50)
+
+    def test_concurrent_callers_never_share_a_number(self):
+        blocks = itertools.count(1)
+
+        def lease_block():
+            time.sleep(0.001)  # Let other threads run while the block is leased
+            return next(blocks)
+
+        allocator = ReferenceAllocator(block_size=7)
+        allocator._lease_block = lease_block
+        # Switch threads as often as possible to give races a chance
+        self.addCleanup(sys.setswitchinterval, sys.getswitchinterval())
+        sys.setswitchinterval(1e-6)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            batches = list(pool.map(allocator.allocate, [1, 3, 5, 2] * 250))
+
+        numbers = [number for batch in batches for number in batch]
+        self.assertEqual(len(numbers), 2750)
+        self.assertEqual(len(set(numbers)), 2750)
+
+
+class InventoryTests(BookingAPITestCase):
+
+    def book(self, event_section, number_of_tickets):
+        serializer = BookingSerializer(data={'event_section': event_section.pk, 'number_of_tickets': number_of_tickets})
+        serializer.is_valid(raise_exception=True)
+        return serializer.save(created_by=self.user)
+
+    def resize(self, booking, **data):
+        serializer = BookingSerializer(booking, data=data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            return serializer.save()
+
+    def expire_holds(self):
+        TicketHold.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+        with self.captureOnCommitCallbacks(execute=True):
+            release_expired_holds()
+
+    def assertStock(self, event_section, available, held):
+        event_section.refresh_from_db()
+        self.assertEqual((event_section.tickets_available, held_tickets(event_section.pk)), (available, held))
+
+    def test_booking_reserves_and_cancel_releases(self):
+        event_section = self.make_event_section()
+        with self.captureOnCommitCallbacks(execute=True):
+            booking = self.book(event_section, 3)
+        self.assertStock(event_section, 97, 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(cancel_booking(booking))
+            self.assertFalse(cancel_booking(booking))
+        self.assertStock(event_section, 100, 0)
+
+    def test_status_only_changes_through_cancel(self):
+        event_section = self.make_event_section()
+        booking = self.book(event_section, 2)
+        response = self.client.patch(f'/booking_api/v1/bookings/{booking.pk}/', {'status': 'confirmed'}, format='json')
+        self.assertEqual((response.status_code, response.data['status']), (200, 'pending'))
+
+        response = self.client.post(f'/booking_api/v1/bookings/{booking.pk}/cancel/')
+        self.assertEqual((response.status_code, response.data['status']), (200, 'canceled'))
+        self.assertStock(event_section, 100, 0)
+
+    def test_stale_reads_cannot_oversell(self):
+        event_section = self.make_event_section()
+        EventSection.objects.filter(pk=event_section.pk).update(tickets_available=1)
+        # Both requests validated against the same last ticket
+        first = BookingSerializer(data={'event_section': event_section.pk, 'number_of_tickets': 1})
+        second = BookingSerializer(data={'event_section': event_section.pk, 'number_of_tickets': 1})
+        self.assertTrue(first.is_valid() and second.is_valid())
+
+        first.save(created_by=self.user)
+        with self.assertRaises(ValidationError):
+            second.save(created_by=self.user)
+        with self.assertRaises(InsufficientInventory):
+            reserve_tickets(event_section.pk, 1)
+        self.assertStock(event_section, 0, 1)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_resized_booking_expires_with_its_new_quantity(self):
+        event_section = self.make_event_section()
+        booking = self.book(event_section, 1)
+        self.resize(booking, number_of_tickets=5)
+        self.assertStock(event_section, 95, 5)
+
+        self.expire_holds()
+        self.assertStock(event_section, 100, 0)
+
+    def test_moved_booking_releases_the_old_section(self):
+        old, new = self.make_event_section(), self.make_event_section()
+        booking = self.book(old, 4)
+        released = []
+        tickets_released.connect(receiver := lambda **kwargs: released.append(
+            (kwargs['event_section_id'], kwargs['quantity'])
+        ))
+        self.addCleanup(tickets_released.disconnect, receiver)
+
+        self.resize(booking, event_section=new.pk, number_of_tickets=2)
+        self.resize(booking, number_of_tickets=1)
+        self.assertEqual(released, [(old.pk, 4), (new.pk, 1)])
+        self.assertStock(old, 100, 0)
+        self.assertStock(new, 99, 1)
+
+        self.expire_holds()
+        self.assertStock(new, 100, 0)
+
+    def test_canceled_bookings_leave_the_group_total(self):
+        booking_group = self.make_booking_group()
+        first, second = booking_group.bookings.order_by('pk')
+        self.assertEqual(booking_group.total_price, 30)
+
+        cancel_booking(first)
+        booking_group.refresh_from_db()
+        self.assertEqual(booking_group.total_price, 10)
+
+        # Deleting a canceled booking must not take its price off twice
+        self.client.delete(f'/booking_api/v1/bookings/{first.pk}/')
+        self.expire_holds()
+        booking_group.refresh_from_db()
+        self.assertEqual(booking_group.total_price, 0)
+        self.assertEqual(BookingGroup.recalculate_totals(BookingGroup.objects.filter(pk=booking_group.pk)), 1)
+        booking_group.refresh_from_db()
+        self.assertEqual(booking_group.total_price, 0)
+
+
+class GroupTotalTests(BookingAPITestCase):
+    """Group totals follow their bookings without re-reading them."""
+
+    def setUp(self):
+        super().setUp()
+        self.event_section = self.make_event_section()
+        self.booking_group = BookingGroup.objects.create(status='pending', created_by=self.user)
+        self.numbers = itertools.count()
+
+    def add_booking(self, booking_group=None, number_of_tickets=1):
+        # A reference of its own keeps the occasional block lease out of the query counts
+        return Booking.objects.create(
+            booking_group=booking_group or self.booking_group,
+            event_section=self.event_section,
+            number_of_tickets=number_of_tickets,
+            reference=f'BKG-TEST-{next(self.numbers)}',
+            created_by=self.user,
+        )
+
+    def assertTotal(self, booking_group, total):
+        booking_group.refresh_from_db()
+        self.assertEqual(booking_group.total_price, total)
+
+    def test_total_follows_its_bookings(self):
+        first = self.add_booking(number_of_tickets=2)
+        second = self.add_booking()
+        self.assertTotal(self.booking_group, 30)
+
+        second.number_of_tickets = 4
+        second.save()
+        self.assertTotal(self.booking_group, 60)
+
+        other_group = BookingGroup.objects.create(status='pending', created_by=self.user)
+        second.booking_group = other_group
+        second.save()
+        self.assertTotal(self.booking_group, 20)
+        self.assertTotal(other_group, 40)
+
+        first.delete()
+        self.assertTotal(self.booking_group, 0)
+
+    def test_recalculate_totals_repairs_drift(self):
+        self.add_booking(number_of_tickets=2)
+        other_group = BookingGroup.objects.create(status='pending', created_by=self.user)
+        self.add_booking(other_group)
+        BookingGroup.objects.update(total_price=999)
+
+        self.assertEqual(BookingGroup.recalculate_totals(), 2)
+        self.assertTotal(self.booking_group, 20)
+        self.assertTotal(other_group, 10)
+
+        BookingGroup.objects.filter(pk=self.booking_group.pk).update(total_price=999)
+        self.booking_group.recalculate_total()
+        self.assertEqual(self.booking_group.total_price, 20)
+        self.assertTotal(self.booking_group, 20)
+
+    def test_adding_a_booking_costs_the_same_however_big_the_group(self):
+        with CaptureQueriesContext(connection) as small_group:
+            self.add_booking()
+        for _ in range(20):
+            self.add_booking()
+        with self.assertNumQueries(len(small_group)):
+            self.add_booking()
+        self.assertTotal(self.booking_group, 220)
+
+
+class CheckoutTests(BookingAPITestCase):
+    """POST /checkout/ books every line of an order together, or none of them."""
+
+    def checkout(self, *lines):
+        order = {'lines': [{'event_section': pk, 'number_of_tickets': quantity} for pk, quantity in lines]}
+        return self.client.post('/booking_api/v1/checkout/', order, format='json')
+
+    def test_a_short_line_books_nothing(self):
+        first, second = self.make_event_section(), self.make_event_section()
+
+        response = self.checkout((first.pk, 2), (second.pk, 101))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(second.pk), str(response.data))
+        self.assertEqual(set(EventSection.objects.values_list('tickets_available', flat=True)), {100})
+        self.assertFalse(BookingGroup.objects.exists())
+        self.assertFalse(Booking.objects.exists())
+
+    def test_repeated_sections_are_merged(self):
+        first, second = self.make_event_section(), self.make_event_section()
+
+        response = self.checkout((first.pk, 2), (second.pk, 1), (first.pk, 3))
+        self.assertEqual(response.status_code, 201)
+        booking_group = BookingGroup.objects.get(pk=response.data['id'])
+        self.assertEqual(booking_group.total_price, 60)
+        self.assertEqual(
+            dict(booking_group.bookings.values_list('event_section', 'number_of_tickets')), {first.pk: 5, second.pk: 1}
+        )
+        first.refresh_from_db()
+        self.assertEqual(first.tickets_available, 95)
+
+    def test_query_count_does_not_grow_with_the_lines(self):
+        sections = [self.make_event_section() for _ in range(6)]
+        # A fresh block big enough for the whole test keeps block leases out of the counts
+        with mock.patch('mainapps.booking.references._allocator', ReferenceAllocator(block_size=10 ** 6)):
+            self.checkout((sections[0].pk, 1))
+            with CaptureQueriesContext(connection) as one_line:
+                self.assertEqual(self.checkout((sections[0].pk, 1)).status_code, 201)
+            with self.assertNumQueries(len(one_line)):
+                self.assertEqual(self.checkout(*((section.pk, 1) for section in sections[1:])).status_code, 201)
+
+    def test_unknown_sections_are_a_bad_request(self):
+        section = self.make_event_section()
+
+        response = self.checkout((section.pk, 1), (section.pk + 1000, 1))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(section.pk + 1000), str(response.data))
+        self.assertFalse(BookingGroup.objects.exists())
+
+
+class IdempotencyTests(BookingAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.event_section = self.make_event_section()
+
+    def book(self, key, number_of_tickets=2, client=None):
+        return (client or self.client).post(
+            '/booking_api/v1/bookings/',
+            {'event_section': self.event_section.pk, 'number_of_tickets': number_of_tickets},
+            format='json',
+            HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def test_retry_replays_the_stored_response(self):
+        first = self.book('retry-1')
+        retry = self.book('retry-1')
+        self.assertEqual((retry.status_code, retry.data), (201, first.data))
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_key_reused_for_a_different_request(self):
+        self.assertEqual(self.book('retry-1').status_code, 201)
+        self.assertEqual(self.book('retry-1', number_of_tickets=3).status_code, 422)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_retry_while_the_original_runs(self):
+        retries = []
+        perform_create = BookingViewSet.perform_create
+
+        def create_while_retried(view, serializer):
+            retries.append(self.book('retry-1').status_code)
+            perform_create(view, serializer)
+
+        with mock.patch.object(BookingViewSet, 'perform_create', create_while_retried):
+            self.assertEqual(self.book('retry-1').status_code, 201)
+        self.assertEqual(retries, [409])
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_keys_are_scoped_per_user(self):
+        other = APIClient()
+        other.force_authenticate(get_user_model().objects.create_user(email="other@example.com", password="secret"))
+        self.assertEqual(self.book('retry-1').status_code, 201)
+        response = self.book('retry-1', client=other)
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(Booking.objects.count(), 2)
+
+
+class AvailabilityTests(BookingAPITestCase):
+
+    def test_booking_writes_refresh_once(self):
+        event_section = self.make_event_section()
+        other = EventSection.objects.create(
+            event=event_section.event, venue_section=event_section.venue_section,
+            tickets_available=50, ticket_price=25, created_by=self.user,
+        )
+        with mock.patch.object(availability, 'refresh_event_availability', wraps=availability.refresh_event_availability) as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                create_booking_group(self.user, [(event_section.pk, 3), (other.pk, 2)])
+            with self.captureOnCommitCallbacks(execute=True):
+                booking = Booking.objects.get(event_section=other)
+                serializer = BookingSerializer(booking, data={'event_section': event_section.pk}, partial=True)
+                serializer.is_valid(raise_exception=True)
+                serializer.save()
+        self.assertEqual(refresh.call_count, 2)
+
+        summary = EventAvailability.objects.get(event=event_section.event)
+        self.assertEqual(
+            (summary.tickets_remaining, summary.min_price, summary.max_price, summary.is_sold_out),
+            (145, 10, 25, False),
+        )
+
+    def test_refresh_is_one_upsert(self):
+        event_section = self.make_event_section()
+        empty = Event.objects.create(
+            venue=self.venue, artist=self.artist, event_date=timezone.now() + timedelta(days=30),
+            ticket_price=10, tickets_available=0, created_by=self.user,
+        )
+        EventAvailability.objects.filter(event=empty).delete()
+        EventSection.objects.filter(pk=event_section.pk).update(tickets_available=0)
+
+        # Savepoint, lock, aggregate and upsert, release
+        with self.assertNumQueries(4):
+            availability.refresh_event_availability(event_ids=[event_section.event_id, empty.pk, 0])
+        self.assertEqual(
+            set(EventAvailability.objects.filter(event__in=[event_section.event_id, empty.pk]).values_list(
+                'event', 'tickets_remaining', 'min_price', 'is_sold_out'
+            )),
+            {(event_section.event_id, 0, 10, True), (empty.pk, 0, None, True)},
+        )
+
+
+class SeatBitmapTests(SimpleTestCase):
+    """Rows of ten seats, so every row straddles a byte boundary."""
+
+    def test_best_block_is_front_row_centre(self):
+        bitmap = SeatBitmap(3, 10)
+        self.assertEqual(bitmap.find_best(4), (0, 3))
+        self.assertEqual(bitmap.find_best(10), (0, 0))
+        self.assertIsNone(bitmap.find_best(11))
+        self.assertIsNone(bitmap.find_best(0))
+
+        bitmap.claim(0, 0, 6)
+        self.assertEqual(bitmap.find_best(4), (0, 6))
+        self.assertEqual(bitmap.find_best(5), (1, 2))
+
+    def test_runs_do_not_continue_into_the_next_row(self):
+        bitmap = SeatBitmap(2, 10)
+        # The last two seats of row 0 and the first two of row 1 are free
+        bitmap.claim(0, 0, 8)
+        bitmap.claim(1, 2, 8)
+        self.assertIsNone(bitmap.find_best(4))
+        self.assertEqual(bitmap.find_best(2), (0, 8))
+
+    def test_claim_and_release_at_row_edges(self):
+        bitmap = SeatBitmap(2, 10)
+        bitmap.claim(0, 8, 2)
+        bitmap.claim(1, 0, 1)
+        with self.assertRaises(ValueError):
+            bitmap.claim(0, 9, 1)
+        with self.assertRaises(ValueError):
+            bitmap.claim(1, 9, 2)
+        self.assertEqual(bitmap.seats_available, 17)
+
+        bitmap.release(0, 8, 2)
+        self.assertTrue(bitmap.is_free(0, 8, 2))
+        self.assertFalse(bitmap.is_free(1, 0, 1))
+        self.assertEqual(bitmap.seats_available, 19)
+
+    def test_bytes_round_trip(self):
+        bitmap = SeatBitmap(2, 10)
+        bitmap.claim(0, 9, 1)
+        bitmap.claim(1, 0, 1)
+        data = bitmap.to_bytes()
+        self.assertEqual(len(data), 4)
+        self.assertEqual(SeatBitmap.from_bytes(2, 10, data).row_bits, bitmap.row_bits)
+
+
+class SeatingTests(BookingAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        venue_section = VenueSection.objects.create(
+            venue=self.venue, name="Stalls", capacity=20, seat_rows=2, seats_per_row=10, created_by=self.user
+        )
+        self.event_section = EventSection.objects.create(
+            event=self.make_event_section().event,
+            venue_section=venue_section,
+            tickets_available=20,
+            ticket_price=30,
+            created_by=self.user,
+        )
+
+    def book(self, number_of_tickets):
+        response = self.client.post(
+            '/booking_api/v1/bookings/',
+            {'event_section': self.event_section.pk, 'number_of_tickets': number_of_tickets},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.data
+
+    def test_bookings_are_seated_and_cancel_frees_the_seats(self):
+        first = self.book(4)
+        self.assertEqual((first['seat_row'], first['first_seat']), (0, 3))
+        # Row 0 has no four adjacent seats left
+        second = self.book(4)
+        self.assertEqual((second['seat_row'], second['first_seat']), (1, 3))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f"/booking_api/v1/bookings/{first['id']}/cancel/")
+        self.assertEqual((response.data['seat_row'], response.data['first_seat']), (None, None))
+        self.assertTrue(load_bitmap(SeatMap.objects.get(pk=self.event_section.pk)).is_free(0, 0, 10))
+
+        whole_row = self.book(10)
+        self.assertEqual((whole_row['seat_row'], whole_row['first_seat']), (0, 0))
+
+
+class WaitingRoomTests(BookingAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        redis = mock.patch('mainapps.booking.waiting_room._redis', return_value=fakeredis.FakeRedis())
+        redis.start()
+        self.addCleanup(redis.stop)
+        self.event_section = self.make_event_section()
+        self.event = self.event_section.event
+        Event.objects.filter(pk=self.event.pk).update(admission_rate=10)
+
+    def admission_token(self, event=None):
+        response = self.client.post(f'/booking_api/v1/events/{(event or self.event).pk}/waiting-room/')
+        self.assertEqual(response.data['ahead'], 0)
+        return response.data['admission_token']
+
+    def book(self, token=None, key=None, **data):
+        headers = {'HTTP_X_ADMISSION_TOKEN': token} if token else {}
+        if key:
+            headers['HTTP_IDEMPOTENCY_KEY'] = key
+        data = {'event_section': self.event_section.pk, 'number_of_tickets': 1, **data}
+        return self.client.post('/booking_api/v1/bookings/', data, format='json', **headers)
+
+    def test_admission_rate_must_admit_someone(self):
+        serializer = EventSerializer(self.event, data={'admission_rate': 0}, partial=True)
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('admission_rate', serializer.errors)
+
+    def test_admission_token_is_single_use(self):
+        self.assertEqual(self.book().status_code, 403)
+
+        token = self.admission_token()
+        self.assertEqual(self.book(token).status_code, 201)
+        self.assertEqual(self.book(token).status_code, 403)
+        self.assertEqual(self.client.get(f'/booking_api/v1/events/{self.event.pk}/waiting-room/').status_code, 404)
+
+        # Joining again gives a new place and a new token
+        self.assertEqual(self.book(self.admission_token()).status_code, 201)
+
+    def test_retry_of_a_booking_is_replayed(self):
+        token = self.admission_token()
+        first = self.book(token, key='book-1')
+        retry = self.book(token, key='book-1')
+        self.assertEqual((first.status_code, retry.status_code), (201, 201))
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_rejected_booking_keeps_the_admission(self):
+        token = self.admission_token()
+        self.assertEqual(self.book(token, number_of_tickets=0).status_code, 400)
+        self.assertEqual(self.book(token).status_code, 201)
+
+    def test_order_spends_every_admission_or_none(self):
+        other_section = self.make_event_section()
+        other = other_section.event
+        Event.objects.filter(pk=other.pk).update(admission_rate=10)
+        token, spent = self.admission_token(), self.admission_token(other)
+        self.assertEqual(self.book(spent, event_section=other_section.pk).status_code, 201)
+
+        order = {'lines': [
+            {'event_section': self.event_section.pk, 'number_of_tickets': 1},
+            {'event_section': other_section.pk, 'number_of_tickets': 1},
+        ]}
+        response = self.client.post(
+            '/booking_api/v1/checkout/', order, format='json', HTTP_X_ADMISSION_TOKEN=f'{token},{spent}'
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.book(token).status_code, 201)
+
+    def test_taking_more_tickets_needs_admission(self):
+        booking_id = self.book(self.admission_token()).data['id']
+        url = f'/booking_api/v1/bookings/{booking_id}/'
+
+        self.assertEqual(self.client.patch(url, {'number_of_tickets': 4}, format='json').status_code, 403)
+        self.assertEqual(self.client.patch(url, {'number_of_tickets': 1}, format='json').status_code, 200)
+        response = self.client.patch(
+            url, {'number_of_tickets': 4}, format='json', HTTP_X_ADMISSION_TOKEN=self.admission_token()
+        )
+        self.assertEqual((response.status_code, response.data['number_of_tickets']), (200, 4))
+
+
+class WaitlistTests(BookingAPITestCase):
+    """Released tickets go to the head of the waitlist, after the release commits."""
+
+    def setUp(self):
+        super().setUp()
+        redis = mock.patch('mainapps.booking.waitlist._queue', return_value=fakeredis.FakeRedis())
+        redis.start()
+        self.addCleanup(redis.stop)
+        notify = mock.patch('mainapps.booking.waitlist.notify_waitlist_promotions')
+        notify.start()
+        self.addCleanup(notify.stop)
+        self.event_section = self.make_event_section()
+        # Three tickets are out on a booking and the rest are gone
+        self.booking = create_booking_group(self.user, [(self.event_section.pk, 3)]).bookings.get()
+        EventSection.objects.filter(pk=self.event_section.pk).update(tickets_available=0)
+
+    def join(self, number_of_tickets):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/booking_api/v1/waitlist/',
+                {'event_section': self.event_section.pk, 'number_of_tickets': number_of_tickets},
+                format='json',
+            )
+        self.assertEqual(response.status_code, 201)
+        return WaitlistEntry.objects.get(pk=response.data['id'])
+
+    def test_join_reports_queue_position(self):
+        first, second = self.join(2), self.join(1)
+        entries = self.client.get('/booking_api/v1/waitlist/').data['results']
+        self.assertEqual({entry['id']: entry['position'] for entry in entries}, {first.pk: 1, second.pk: 2})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/booking_api/v1/waitlist/{first.pk}/')
+        self.assertEqual(self.client.get(f'/booking_api/v1/waitlist/{second.pk}/').data['position'], 1)
+
+    def test_release_promotes_in_queue_order(self):
+        first, blocked, behind = self.join(2), self.join(2), self.join(1)
+        with self.captureOnCommitCallbacks(execute=True):
+            cancel_booking(self.booking)
+
+        statuses = dict(WaitlistEntry.objects.values_list('pk', 'status'))
+        # The third entry would fit, but not ahead of the second
+        self.assertEqual(statuses, {first.pk: 'promoted', blocked.pk: 'waiting', behind.pk: 'waiting'})
+        self.assertEqual(waitlist_position(blocked), 1)
+        first.refresh_from_db()
+        self.assertEqual(first.booking_group.bookings.get().number_of_tickets, 2)
+
+    def test_entries_missed_by_redis_are_requeued_in_place(self):
+        with mock.patch('mainapps.booking.waitlist._queue', side_effect=RedisConnectionError):
+            with self.assertLogs('mainapps.booking.waitlist', 'WARNING'):
+                missed = self.join(2)
+        behind = self.join(1)
+        self.assertIsNone(waitlist_position(missed))
+
+        self.assertEqual(requeue_waitlists(), 1)
+        self.assertEqual((waitlist_position(missed), waitlist_position(behind)), (1, 2))
+        self.assertEqual(requeue_waitlists(), 0)
+
+    def test_cancel_survives_redis_outage(self):
+        entry = self.join(1)
+        with mock.patch('mainapps.booking.waitlist._queue', side_effect=RedisConnectionError):
+            with self.assertLogs('mainapps.booking.waitlist', 'WARNING'):
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.assertTrue(cancel_booking(self.booking))
+
+        entry.refresh_from_db()
+        self.assertEqual((Booking.objects.get(pk=self.booking.pk).status, entry.status), ('canceled', 'waiting'))
+
+
+class ListQueryCountTests(BookingAPITestCase):
+    """
+    List endpoints must issue the same number of queries for one row as for many.
+
+    Each test fetches a list with a single row, adds more rows, and fetches it
+    again; any query issued per row shows up as a difference between the two.
+    """
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assertConstantQueries(self, url, make_row):
+        make_row()
+        single = self.count_queries(url)
+        for _ in range(9):
+            make_row()
+        self.assertEqual(self.count_queries(url), single, f"{url} issues queries per row")
+
+    def test_venues(self):
+        self.assertConstantQueries('/booking_api/v1/venues/', self.make_venue)
+
+    def test_venue_sections(self):
+        self.assertConstantQueries(
+            '/booking_api/v1/venue-sections/',
+            lambda: VenueSection.objects.create(venue=self.venue, name="Balcony", capacity=50, created_by=self.user),
+        )
+
+    def test_events(self):
+        self.assertConstantQueries('/booking_api/v1/events/', self.make_event_section)
+
+    def test_event_sections(self):
+        self.assertConstantQueries('/booking_api/v1/event-sections/', self.make_event_section)
+
+    def test_bookings(self):
+        self.assertConstantQueries('/booking_api/v1/bookings/', self.make_booking_group)
+
+    def test_booking_groups(self):
+        self.assertConstantQueries('/booking_api/v1/booking-groups/', self.make_booking_group)
+
+    def test_deep_pages_cost_the_same(self):
+        for _ in range(6):
+            self.make_venue()
+        url = '/booking_api/v1/venues/?page_size=2'
+        first = self.count_queries(url)
+
+        seen = []
+        while url:
+            response = self.client.get(url)
+            seen.extend(venue['id'] for venue in response.data['results'])
+            url = response.data['next']
+            if url:
+                self.assertEqual(self.count_queries(url), first)
+        self.assertEqual(seen, sorted(seen, reverse=True))
+        self.assertEqual(len(seen), Venue.objects.count())
+
+
+class DiscoveryTests(BookingAPITestCase):
+    """Public event listing: filters, sort orders and rejected queries."""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.jazz = Genre.objects.create(name="Jazz")
+        self.artist.genres.add(self.jazz)
+        self.other_artist = Artist.objects.create(name="Other Act", contact_email="other@example.com")
+        abuja = self.make_venue()
+        Venue.objects.filter(pk=abuja.pk).update(city="Abuja")
+
+        self.soon = self.make_event(self.venue, self.artist, days=5, price=40)
+        self.later = self.make_event(self.venue, self.other_artist, days=20, price=15)
+        self.elsewhere = self.make_event(abuja, self.artist, days=10, price=25)
+        self.make_event(self.venue, self.artist, days=-1, price=10)
+
+    def make_event(self, venue, artist, days, price):
+        with self.captureOnCommitCallbacks(execute=True):
+            venue_section = VenueSection.objects.create(venue=venue, name="Floor", capacity=100, created_by=self.user)
+            event = Event.objects.create(
+                venue=venue,
+                artist=artist,
+                event_date=timezone.now() + timedelta(days=days),
+                ticket_price=price,
+                tickets_available=100,
+                created_by=self.user,
+            )
+            EventSection.objects.create(
+                event=event, venue_section=venue_section, tickets_available=100, ticket_price=price, created_by=self.user,
+            )
+        return event
+
+    def discover(self, **params):
+        response = self.client.get('/booking_api/v1/discover/events/', params)
+        self.assertEqual(response.status_code, 200)
+        return [event['id'] for event in response.data['results']]
+
+    def test_filters(self):
+        self.assertEqual(self.discover(), [self.soon.pk, self.elsewhere.pk, self.later.pk])
+        self.assertEqual(self.discover(city="abuja"), [self.elsewhere.pk])
+        self.assertEqual(self.discover(genre="jazz"), [self.soon.pk, self.elsewhere.pk])
+        self.assertEqual(self.discover(artist=self.other_artist.pk), [self.later.pk])
+        self.assertEqual(self.discover(min_price=20, max_price=30), [self.elsewhere.pk])
+        self.assertEqual(self.discover(date_to=(timezone.now() + timedelta(days=7)).isoformat()), [self.soon.pk])
+
+    def test_sort_orders(self):
+        self.assertEqual(self.discover(sort='-date'), [self.later.pk, self.elsewhere.pk, self.soon.pk])
+        self.assertEqual(self.discover(sort='price'), [self.later.pk, self.elsewhere.pk, self.soon.pk])
+        self.assertEqual(self.discover(sort='-price'), [self.soon.pk, self.elsewhere.pk, self.later.pk])
+
+    def test_invalid_queries_are_rejected(self):
+        tomorrow = timezone.now() + timedelta(days=1)
+        for params in (
+            {'sort': 'popularity'},
+            {'min_price': -1},
+            {'min_price': 30, 'max_price': 20},
+            {'date_from': tomorrow.isoformat(), 'date_to': timezone.now().isoformat()},
+            {'artist': 'abc'},
+        ):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get('/booking_api/v1/discover/events/', params).status_code, 400)
+
+
+class SearchTests(BookingAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.exact = Artist.objects.create(name="Burna Boy", contact_email="burna@example.com")
+        self.tribute = Artist.objects.create(
+            name="Odogwu Tribute Band", bio="Plays Burna Boy covers", contact_email="tribute@example.com"
+        )
+        Venue.objects.filter(pk=self.venue.pk).update(name="Burna Arena")
+        event_section = self.make_event_section()
+        Event.objects.filter(pk=event_section.event_id).update(description="Burna Boy live")
+        past = self.make_event_section().event
+        Event.objects.filter(pk=past.pk).update(
+            description="Burna Boy last year", event_date=timezone.now() - timedelta(days=1)
+        )
+        self.event = event_section.event
+
+    def search(self, **params):
+        response = self.client.get('/booking_api/v1/search/', params)
+        self.assertEqual(response.status_code, 200)
+        return {kind: [result['id'] for result in results] for kind, results in response.data.items()}
+
+    def test_every_kind_is_searched_by_default(self):
+        results = self.search(q="burna")
+        self.assertEqual(set(results['artists']), {self.exact.pk, self.tribute.pk})
+        self.assertEqual(results['venues'], [self.venue.pk])
+        # Past events are never found
+        self.assertEqual(results['events'], [self.event.pk])
+
+    def test_type_and_limit(self):
+        results = self.search(q="burna", type="artists", limit=1)
+        self.assertEqual(list(results), ['artists'])
+        self.assertEqual(len(results['artists']), 1)
+
+    def test_invalid_queries_are_rejected(self):
+        for params in (
+            {},
+            {'q': 'b'},
+            {'q': 'burna', 'type': 'songs'},
+            {'q': 'burna', 'limit': 0},
+            {'q': 'burna', 'limit': 51},
+        ):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get('/booking_api/v1/search/', params).status_code, 400)
+
+    @skipUnless(connection.vendor == 'postgresql', "Ranking and typo tolerance need PostgreSQL")
+    def test_best_match_first_and_typos_tolerated(self):
+        self.assertEqual(self.search(q="burna boy", type="artists")['artists'], [self.exact.pk, self.tribute.pk])
+        self.assertEqual(self.search(q="burna bpy", type="artists")['artists'][0], self.exact.pk)
+
+
+class ConditionalGetTests(BookingAPITestCase):
+    """Polled detail pages answer 304 until they, or the rows they embed, change."""
+
+    def test_booking_group_detail(self):
+        booking_group = self.make_booking_group()
+        url = f'/booking_api/v1/booking-group/{booking_group.pk}/'
+        etag = self.client.get(url)['ETag']
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        cancel_booking(booking_group.bookings.first())
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_event_section_notices_hold_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            booking_group = self.make_booking_group()
+        url = f'/booking_api/v1/event-sections/{booking_group.bookings.first().event_section_id}/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Converting the holds leaves the section row alone but changes tickets_held
+        with self.captureOnCommitCallbacks(execute=True):
+            convert_holds(booking_group)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['tickets_held'], 0)
+
+    def test_list_notices_deletions(self):
+        self.make_venue()
+        stale = self.make_venue()
+        etag = self.client.get('/booking_api/v1/venues/')['ETag']
+
+        self.assertEqual(self.client.get('/booking_api/v1/venues/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        stale.delete()
+        self.assertEqual(self.client.get('/booking_api/v1/venues/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_list_is_not_validated_by_modification_time(self):
+        self.make_venue()
+        stale = self.make_venue()
+        response = self.client.get('/booking_api/v1/venues/')
+        self.assertNotIn('Last-Modified', response)
+
+        stale.delete()
+        since = http_date(timezone.now().timestamp() + 60)
+        self.assertEqual(self.client.get('/booking_api/v1/venues/', HTTP_IF_MODIFIED_SINCE=since).status_code, 200)
+
+    def test_detail_without_related_rows_sends_last_modified(self):
+        response = self.client.get(f'/booking_api/v1/venues/{self.venue.pk}/')
+        since = response['Last-Modified']
+        self.assertEqual(
+            self.client.get(f'/booking_api/v1/venues/{self.venue.pk}/', HTTP_IF_MODIFIED_SINCE=since).status_code, 304
+        )
+
+    @override_settings(RESPONSE_CACHE_TIMEOUT=60)
+    def test_discovery_validators_are_shared_until_events_change(self):
+        event = self.make_event_section().event
+        with CaptureQueriesContext(connection) as first:
+            etag = self.client.get('/booking_api/v1/discover/events/')['ETag']
+        with CaptureQueriesContext(connection) as other_page_size:
+            self.client.get('/booking_api/v1/discover/events/?page_size=10')
+        self.assertEqual(len(other_page_size), len(first) - 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            event.description = "Moved"
+            event.save()
+        self.assertNotEqual(self.client.get('/booking_api/v1/discover/events/')['ETag'], etag)
+
+
+class SparseFieldsTests(BookingAPITestCase):
+
+    def test_fields_narrow_the_query(self):
+        self.make_event_section()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/booking_api/v1/events/?fields=id,event_date')
+        self.assertEqual(list(response.data['results'][0]), ['id', 'event_date'])
+        self.assertNotIn('booking_policy', queries.captured_queries[-1]['sql'])
+
+    def test_expand_joins_instead_of_querying_per_row(self):
+        self.make_booking_group()
+        url = '/booking_api/v1/bookings/?fields=id,event_section&expand=event_section'
+        with CaptureQueriesContext(connection) as single:
+            self.client.get(url)
+        for _ in range(5):
+            self.make_booking_group()
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(url)
+        self.assertIn('ticket_price', response.data['results'][0]['event_section'])
+        self.assertEqual(len(many), len(single))
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=60)
+class ResponseCacheTests(BookingAPITestCase):
+    """Cached responses that embed a parent are retired when the parent changes."""
+
+    def assertRenameShows(self, url, field, parent):
+        self.assertEqual(self.client.get(url).data[field]['name'], parent.name)
+        with self.assertNumQueries(0):
+            self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            parent.name = "Renamed"
+            parent.save()
+        self.assertEqual(self.client.get(url).data[field]['name'], "Renamed")
+
+    def test_event_with_expanded_parents(self):
+        event = self.make_event_section().event
+        url = f'/booking_api/v1/events/{event.pk}/?expand=venue,artist'
+        self.assertRenameShows(url, 'venue', self.venue)
+        self.assertRenameShows(url, 'artist', self.artist)
+
+    def test_venue_section_with_expanded_venue(self):
+        venue_section = VenueSection.objects.create(venue=self.venue, name="Floor", capacity=100, created_by=self.user)
+        self.assertRenameShows(f'/booking_api/v1/venue-sections/{venue_section.pk}/?expand=venue', 'venue', self.venue)
+
+
+class FastReadTests(BookingAPITestCase):
+    """The values() read path renders exactly what the serializers would."""
+
+    def test_booking_groups_match_the_serializer(self):
+        for _ in range(3):
+            self.make_booking_group()
+        response = self.client.get('/booking_api/v1/booking-groups/')
+        expected = BookingGroupSerializer(BookingGroup.objects.order_by('-created_at', '-id'), many=True).data
+        self.assertEqual(response.json()['results'], expected)
+
+        detail = self.client.get(f"/booking_api/v1/booking-group/{expected[0]['id']}/")
+        self.assertEqual(detail.json(), expected[0])
+
+    def test_bookings_match_the_serializer(self):
+        self.make_booking_group()
+        response = self.client.get('/booking_api/v1/bookings/')
+        expected = BookingSerializer(Booking.objects.order_by('-created_at', '-id'), many=True).data
+        self.assertEqual(response.json()['results'], expected)
+
+    def test_rows_match_the_serializer(self):
+        for _ in range(2):
+            self.make_booking_group()
+        booking_groups = BookingGroup.objects.order_by('id')
+        self.assertEqual(
+            booking_group_rows(booking_groups.values(*BOOKING_GROUP_FIELDS)),
+            BookingGroupSerializer(booking_groups, many=True).data,
+        )
+        bookings = Booking.objects.order_by('id')
+        self.assertEqual(booking_rows(bookings.values(*BOOKING_FIELDS)), BookingSerializer(bookings, many=True).data)
+
+    @override_settings(TIME_ZONE='Africa/Lagos')
+    def test_datetimes_follow_the_current_time_zone(self):
+        self.make_booking_group()
+        for url, serializer_class, model in (
+            ('/booking_api/v1/bookings/', BookingSerializer, Booking),
+            ('/booking_api/v1/booking-groups/', BookingGroupSerializer, BookingGroup),
+        ):
+            row = self.client.get(url).json()['results'][0]
+            self.assertEqual(row, serializer_class(model.objects.get(pk=row['id'])).data)
+        self.assertTrue(row['bookings'][0]['created_at'].endswith('+01:00'))
+
+
+class RenderingTests(BookingAPITestCase):
+
+    def test_orjson_matches_json_renderer(self):
+        data = {'price': Decimal('12.50'), 'at': timezone.now(), 'nested': [{'day': timezone.now().date(), 1: None}]}
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    @override_settings(COMPRESSION_MIN_SIZE=2048)
+    def test_only_large_responses_are_compressed(self):
+        venue_url = f'/booking_api/v1/venues/{self.venue.pk}/'
+        self.assertFalse(self.client.get(venue_url, HTTP_ACCEPT_ENCODING='gzip').has_header('Content-Encoding'))
+
+        for _ in range(10):
+            self.make_venue()
+        response = self.client.get('/booking_api/v1/venues/', HTTP_ACCEPT_ENCODING='br;q=0.5, gzip;q=0.8')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(response.content))['results']), 11)
+        self.assertFalse(self.client.get('/booking_api/v1/venues/').has_header('Content-Encoding'))
+
+    @override_settings(COMPRESSION_MIN_SIZE=0)
+    def test_q_values_decide_the_encoding(self):
+        url = f'/booking_api/v1/venues/{self.venue.pk}/'
+        for accept_encoding in ('gzip;q=0', 'identity;q=1, gzip;q=0.5', 'compress'):
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING=accept_encoding)
+            self.assertFalse(response.has_header('Content-Encoding'), accept_encoding)
+            self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_compressed_lengths_are_padded(self):
+        for _ in range(10):
+            self.make_venue()
+        url = '/booking_api/v1/venues/'
+        bodies = [self.client.get(url, HTTP_ACCEPT_ENCODING='gzip').content for _ in range(5)]
+        self.assertEqual({gzip.decompress(body) for body in bodies}, {self.client.get(url).content})
+        self.assertGreater(len({len(body) for body in bodies}), 1)
+
+    @skipUnless(brotli, "brotli is not installed")
+    def test_brotli_is_preferred_and_padded(self):
+        for _ in range(10):
+            self.make_venue()
+        url = '/booking_api/v1/venues/'
+        responses = [self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate, br') for _ in range(5)]
+        self.assertEqual({response['Content-Encoding'] for response in responses}, {'br'})
+        self.assertEqual({brotli.decompress(response.content) for response in responses}, {self.client.get(url).content})
+        self.assertGreater(len({len(response.content) for response in responses}), 1)
+
+        streamed = b''.join(compress_brotli_sequence([b'{"a": ', b'1}'], max_random_bytes=100))
+        self.assertEqual(brotli.decompress(streamed), b'{"a": 1}')
@@ -0,0 +1,134 @@
+from django.conf import settings
+from django.core import signing
+from django_redis import get_redis_connection
+
+QUEUE_KEY = "booking:waiting-room:{}:queue"
+TAIL_KEY = "booking:waiting-room:{}:tail"
+BUCKET_KEY = "booking:waiting-room:{}:bucket"
+ADMISSION_SALT = "booking.admission"
+
+# Give a user a place at the back of the queue, or return the one they already have
+JOIN_SCRIPT = """
+local position = redis.call('HGET', KEYS[1], ARGV[1])
+if not position then
+    position = redis.call('INCR', KEYS[2])
+    redis.call('HSET', KEYS[1], ARGV[1], position)
+end
+return tonumber(position)
+"""
+
+# Token bucket: tokens accrue at `rate` per second up to one second's worth,
+# and every token admits the next person in the queue. Returns the highest
+# admitted position. Uses the Redis clock so every web worker agrees on time.
+ADMIT_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local tail = tonumber(redis.call('GET', KEYS[2]) or '0')
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated', 'admitted')
+local tokens = tonumber(state[1]) or rate
+local updated = tonumber(state[2]) or now
+local admitted = tonumber(state[3]) or 0
+
+tokens = math.min(rate, tokens + (now - updated) * rate)
+local admit = math.min(tail - admitted, math.floor(tokens))
+admitted = admitted + admit
+tokens = tokens - admit
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now), 'admitted', admitted)
+return admitted
+"""
+
+# Take a user's places out of the queues of several events, but only the places
+# the tokens were issued for, so every admission token can be used once. Nothing
+# is taken unless every place is still there.
+USE_ADMISSIONS_SCRIPT = """
+for index, key in ipairs(KEYS) do
+    if redis.call('HGET', key, ARGV[1]) ~= ARGV[index + 1] then
+        return 0
+    end
+end
+for _, key in ipairs(KEYS) do
+    redis.call('HDEL', key, ARGV[1])
+end
+return 1
+"""
+
+def _redis():
+    return get_redis_connection("default")
+
+
+def join_queue(event, user):
+    """Return the user's 1-based position in the event's waiting room, joining if needed."""
+    return _redis().eval(JOIN_SCRIPT, 2, QUEUE_KEY.format(event.pk), TAIL_KEY.format(event.pk), user.pk)
+
+
+def queue_position(event, user):
+    """The user's position in the event's waiting room, or None if they have not joined."""
+    position = _redis().hget(QUEUE_KEY.format(event.pk), user.pk)
+    return None if position is None else int(position)
+
+
+def admitted_through(event):
+    """Advance the admission bucket and return the highest admitted queue position."""
+    return _redis().eval(ADMIT_SCRIPT, 2, BUCKET_KEY.format(event.pk), TAIL_KEY.format(event.pk), event.admission_rate)
+
+
+def issue_admission_token(event, user, position):
+    """Signed proof that `user` has come through the waiting room of `event` from queue `position`."""
+    return signing.dumps({'event': event.pk, 'user': user.pk, 'position': position}, salt=ADMISSION_SALT)
+
+
+def admitted_events(tokens, user):
+    """
+    Events the user has been admitted to, according to the given tokens.
+
+    Expired, tampered or someone else's tokens are ignored.
+
+    Returns:
+        dict: Event id to the queue position the token was issued for.
+    """
+    events = {}
+    for token in tokens:
+        try:
+            claims = signing.loads(token, salt=ADMISSION_SALT, max_age=settings.ADMISSION_TOKEN_MAX_AGE)
+        except signing.BadSignature:
+            continue
+        if claims.get('user') == user.pk:
+            events[claims.get('event')] = claims.get('position')
+    return events
+
+
+def admissions_unused(user, admissions):
+    """
+    Whether the user still holds every queue place the given admissions were issued for.
+
+    Args:
+        admissions: Event id to queue position, as returned by admitted_events().
+    """
+    pipeline = _redis().pipeline()
+    for event_id in admissions:
+        pipeline.hget(QUEUE_KEY.format(event_id), user.pk)
+    places = pipeline.execute()
+    return all(
+        place is not None and int(place) == position for place, position in zip(places, admissions.values())
+    )
+
+
+def use_admissions(user, admissions):
+    """
+    Spend admissions: the user's place in each queue is the token's nonce.
+
+    The places are removed from the queues, so the tokens cannot be used again
+    and a user who wants to book more joins at the back. Either every
+    admission is spent or none is.
+
+    Args:
+        admissions: Event id to queue position, as returned by admitted_events().
+
+    Returns:
+        bool: False if a place was already used or replaced by a newer one.
+    """
+    if not admissions:
+        return True
+    keys = [QUEUE_KEY.format(event_id) for event_id in admissions]
+    return bool(_redis().eval(USE_ADMISSIONS_SCRIPT, len(keys), *keys, user.pk, *admissions.values()))
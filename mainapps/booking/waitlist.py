@@ -0,0 +1,181 @@
+import logging
+from itertools import groupby
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+from .inventory import InsufficientInventory, create_booking_group
+from .models import WaitlistEntry
+from .tasks import notify_waitlist_promotions
+
+WAITLIST_KEY = "booking:waitlist:{}"
+
+logger = logging.getLogger(__name__)
+
+
+def _queue():
+    return get_redis_connection("default")
+
+
+def join_waitlist(user, event_section, number_of_tickets):
+    """
+    Put a fan at the back of a section's waitlist.
+
+    The entry is queued in Redis once it has committed. If Redis cannot be
+    reached then, the entry is still saved; requeue_waitlists() queues it
+    later, in its original place.
+    """
+    entry = WaitlistEntry.objects.create(
+        event_section=event_section,
+        number_of_tickets=number_of_tickets,
+        created_by=user,
+    )
+    transaction.on_commit(lambda: _enqueue(event_section.pk, entry.pk))
+    return entry
+
+
+def _enqueue(event_section_id, entry_id):
+    try:
+        _queue().zadd(WAITLIST_KEY.format(event_section_id), {entry_id: entry_id})
+    except RedisError:
+        logger.warning("Waitlist entry %s not queued: Redis is unavailable.", entry_id, exc_info=True)
+
+
+def leave_waitlist(entry):
+    """Take a waiting fan off the waitlist."""
+    updated = WaitlistEntry.objects.filter(pk=entry.pk, status='waiting').update(
+        status='canceled', updated_at=timezone.now()
+    )
+    transaction.on_commit(lambda: _forget(WAITLIST_KEY.format(entry.event_section_id), [entry.pk]))
+    entry.status = 'canceled'
+    return bool(updated)
+
+
+def waitlist_position(entry):
+    """1-based place of a waiting entry in its section's queue, or None if it is not queued or Redis is unavailable."""
+    try:
+        rank = _queue().zrank(WAITLIST_KEY.format(entry.event_section_id), entry.pk)
+    except RedisError:
+        logger.warning("Position of waitlist entry %s unknown: Redis is unavailable.", entry.pk, exc_info=True)
+        return None
+    return None if rank is None else rank + 1
+
+
+def rebuild_waitlist(event_section_id):
+    """Reload a section's Redis queue from the waiting entries in the database."""
+    key = WAITLIST_KEY.format(event_section_id)
+    entry_ids = WaitlistEntry.objects.filter(
+        event_section_id=event_section_id, status='waiting'
+    ).order_by('id').values_list('id', flat=True)
+
+    pipeline = _queue().pipeline()
+    pipeline.delete(key)
+    for entry_id in entry_ids.iterator():
+        pipeline.zadd(key, {entry_id: entry_id})
+    pipeline.execute()
+
+
+def requeue_waitlists():
+    """
+    Queue waiting entries that are missing from their section's Redis queue.
+
+    Entries are scored by id, so a late entry takes the place it would have
+    had; entries already queued are left alone.
+
+    Returns:
+        int: Number of entries queued.
+    """
+    waiting = WaitlistEntry.objects.filter(status='waiting').order_by('event_section_id', 'id').values_list(
+        'event_section_id', 'id'
+    )
+    queue = _queue()
+    requeued = 0
+    for event_section_id, rows in groupby(waiting.iterator(), key=lambda row: row[0]):
+        entry_ids = {entry_id: entry_id for _, entry_id in rows}
+        requeued += queue.zadd(WAITLIST_KEY.format(event_section_id), entry_ids, nx=True)
+    return requeued
+
+
+def promote_waitlist(event_section_id, batch_size=None):
+    """
+    Book released tickets for the fans at the head of a section's waitlist.
+
+    Called once the transaction that released the tickets has committed, so
+    cancellations and the expiry sweep never wait on, or fail with, Redis.
+    The head of the queue is read from Redis in batches and each promotion is
+    a fixed amount of work, independent of the queue length. Promotion stops
+    at the first entry whose whole order cannot be met, keeping the queue
+    fair. If Redis cannot be reached nobody is promoted; the entries keep
+    their place for the next release.
+
+    Returns:
+        list: The promoted entries.
+    """
+    if not WaitlistEntry.objects.filter(event_section_id=event_section_id, status='waiting').exists():
+        return []
+
+    try:
+        with transaction.atomic():
+            return _promote(event_section_id, batch_size or settings.WAITLIST_PROMOTION_BATCH_SIZE)
+    except RedisError:
+        logger.warning(
+            "Waitlist of event section %s not promoted: Redis is unavailable.", event_section_id, exc_info=True
+        )
+        return []
+
+
+def _promote(event_section_id, batch_size):
+    key = WAITLIST_KEY.format(event_section_id)
+    queue = _queue()
+    if not queue.exists(key):
+        # Redis lost the queue (restart, eviction); the database mirror still has it
+        rebuild_waitlist(event_section_id)
+
+    promoted, finished, offset = [], [], 0
+    stalled = False
+    while not stalled:
+        entry_ids = [int(entry_id) for entry_id in queue.zrange(key, offset, offset + batch_size - 1)]
+        if not entry_ids:
+            break
+        waiting = WaitlistEntry.objects.select_for_update().filter(
+            pk__in=entry_ids, status='waiting'
+        ).select_related('created_by').in_bulk()
+
+        for entry_id in entry_ids:
+            entry = waiting.get(entry_id)
+            if entry is None:
+                # Canceled or promoted by someone else; just drop it from the queue
+                finished.append(entry_id)
+                continue
+            try:
+                with transaction.atomic():
+                    entry.booking_group = create_booking_group(
+                        entry.created_by, [(event_section_id, entry.number_of_tickets)]
+                    )
+            except InsufficientInventory:
+                stalled = True
+                break
+            entry.status = 'promoted'
+            entry.promoted_at = timezone.now()
+            entry.save(update_fields=['status', 'booking_group', 'promoted_at', 'updated_at'])
+            promoted.append(entry)
+            finished.append(entry_id)
+        offset += batch_size
+
+    if finished:
+        transaction.on_commit(lambda: _forget(key, finished))
+    if promoted:
+        promoted_ids = [entry.pk for entry in promoted]
+        transaction.on_commit(lambda: notify_waitlist_promotions.delay(promoted_ids))
+    return promoted
+
+
+def _forget(key, entry_ids):
+    """Drop finished entries from a queue; ones left behind are skipped by the next promotion."""
+    try:
+        _queue().zrem(key, *entry_ids)
+    except RedisError:
+        logger.warning("Could not drop %d finished entries from %s.", len(entry_ids), key, exc_info=True)
@@ -1,3 +1,5 @@
+import json
+
 import stripe
 from django.http import HttpResponse
 from django.views.decorators.csrf import csrf_exempt
@@ -5,12 +7,14 @@ from django.utils import timezone
 from django.conf import settings
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework import status
+from rest_framework import permissions, status
 from django.urls import reverse
+from django.db.models import Sum
 
 from mainapps.booking.models import BookingGroup
-from ..models import  Payment
-from datetime import datetime
+from ..checkout import CheckoutUnavailable, checkout_session_url
+from ..tasks import process_stripe_event
+from ..webhooks import already_processed, record_webhook_event
 
 
 
@@ -18,7 +22,10 @@ class CreateStripeCheckoutSession(APIView):
     """
     API view to create a Stripe checkout session for purchasing tickets
     based on an existing booking group's reference.
+
+    Only the user who placed the booking group can open a session for it.
     """
+    permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
         # Retrieve query parameters from the URL (GET request)
@@ -31,111 +38,67 @@ class CreateStripeCheckoutSession(APIView):
 
         try:
             # Look up the BookingGroup by its reference
-            booking_group = BookingGroup.objects.get(reference=reference)
-
-            # Sum the number of tickets for all bookings in the group
-            tickets_number = sum(booking.number_of_tickets for booking in booking_group.bookings.all())
+            booking_group = BookingGroup.objects.get(reference=reference, created_by=request.user)
+            if booking_group.status == 'canceled':
+                raise CheckoutUnavailable(f"Booking group {reference} was canceled.")
+
+            # Sum the number of tickets for the bookings in the group that still stand
+            tickets_number = booking_group.bookings.exclude(status='canceled').aggregate(
+                tickets=Sum('number_of_tickets')
+            )['tickets'] or 0
             total_price = booking_group.total_price
 
             if tickets_number < 1 or total_price <= 0:
                 return Response({"error": "Booking group must have at least 1 ticket and a positive total price."}, status=status.HTTP_400_BAD_REQUEST)
 
-            # Set the Stripe secret key
-            stripe.api_key = settings.STRIPE_SEC_KEY
-
-            # Create a Stripe checkout session
-            checkout_session = stripe.checkout.Session.create(
-                customer=request.user.subscription.customer.stripe_customer_id,
+            # Reuses the group's open checkout session when there is one
+            redirect_url = checkout_session_url(
+                booking_group,
+                tickets_number,
                 success_url=f'{success_path}?reference={reference}&tickets={tickets_number}&total_price={total_price}',
                 cancel_url=cancel_path,
-                payment_method_types=["card"],
-                line_items=[
-                    {
-                        "price_data": {
-                            "currency": "usd",
-                            "product_data": {
-                                "name": f'{tickets_number} Tickets for Event',
-                            },
-                            "unit_amount": int(total_price * 100),  # Stripe accepts amount in cents
-                        },
-                        "quantity": 1,  # Only 1 line item for the total amount
-                    },
-                ],
-                mode="payment",
+                customer_email=getattr(request.user, 'email', None),
             )
 
             # Return the URL for the Stripe checkout session
-            return Response({"redirect_url": checkout_session.url}, status=status.HTTP_200_OK)
+            return Response({"redirect_url": redirect_url}, status=status.HTTP_200_OK)
 
         except BookingGroup.DoesNotExist:
             return Response({"error": "Booking group not found."}, status=status.HTTP_404_NOT_FOUND)
+        except CheckoutUnavailable:
+            return Response({"error": "This booking has expired. Please book again."}, status=status.HTTP_409_CONFLICT)
+        except stripe.error.APIConnectionError:
+            return Response({"error": "The payment provider could not be reached. Please try again."}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
         except stripe.error.StripeError as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
   
 @csrf_exempt
 def stripe_webhook(request):
-    stripe.api_key = settings.STRIPE_SEC_KEY
-    endpoint_secret = settings.STRIPE_ENDPOINT_SECRET
+    """
+    Verify a Stripe event, store it and queue it for processing.
+
+    Stripe retries deliveries that are slow to answer, so the work happens in
+    a Celery task and this view returns as soon as the event is stored.
+    Redeliveries of processed events are answered after one indexed lookup.
+    """
     payload = request.body
-    sig_header = request.META["HTTP_STRIPE_SIGNATURE"]
+    sig_header = request.META.get("HTTP_STRIPE_SIGNATURE", "")
 
-    event = None
     try:
-        event = stripe.Webhook.construct_event(payload, sig_header, endpoint_secret)
+        stripe.WebhookSignature.verify_header(
+            payload.decode("utf-8"), sig_header, settings.STRIPE_ENDPOINT_SECRET, stripe.Webhook.DEFAULT_TOLERANCE
+        )
+        event = json.loads(payload)
     except ValueError as _:
         return HttpResponse(status=400)
     except stripe.error.SignatureVerificationError as _:
         return HttpResponse(status=400)
 
-    event_type = event["type"]
-    event_object = event["data"]["object"]
-
-    if event_type == "checkout.session.completed":
-        try:
-            # Retrieve the BookingGroup reference from the session
-            booking_group_ref = event_object.get("metadata", {}).get("booking_group_reference")
-
-            if not booking_group_ref:
-                return HttpResponse(status=400)  # Invalid event, missing booking group reference
-
-            # Look up the BookingGroup
-            booking_group = BookingGroup.objects.get(reference=booking_group_ref)
-
-            # Update the status of the booking group and related bookings
-            booking_group.payment_status = "paid"
-            booking_group.payment_date = timezone.now()
-            booking_group.save()
-
-            # Calculate the total number of tickets and price
-            tickets_number = sum(booking.number_of_tickets for booking in booking_group.bookings.all())
-            total_price = sum(booking.number_of_tickets * booking.event_section.ticket_price for booking in booking_group.bookings.all())
-
-            # Record the payment details
-            payment = Payment(
-                booking_group=booking_group,
-                payment_amount=total_price,
-                payment_status="success",
-                payment_reference=event_object["id"],  # Stripe payment reference
-                payment_method="stripe",
-                payment_date=timezone.now()
-            )
-            payment.save()
-
-            # Mark each individual booking as paid
-            for booking in booking_group.bookings.all():
-                booking.status = "paid"
-                booking.save()
-
-        except BookingGroup.DoesNotExist:
-            return HttpResponse(status=404)  # BookingGroup not found
-
-        except Exception as e:
-            print(f"{datetime.now().strftime('%H:%M:%S')}: Error processing Stripe webhook: {e}")
-            return HttpResponse(status=500)  # Internal Server Error
-
-    elif event_type == "invoice.payment_failed":
-        # Handle payment failure if necessary
-        print(f"{datetime.now().strftime('%H:%M:%S')}: Payment Failed. Couldn't Complete Booking Payment.")
-        return HttpResponse(status=400)
+    if already_processed(event["id"]):
+        return HttpResponse(status=200)  # A redelivery of an event that has been dealt with
 
+    webhook_event = record_webhook_event(event)
+    if webhook_event.status == "pending":
+        # A redelivery of an event still waiting for a worker queues it again; processing is idempotent
+        process_stripe_event.delay(webhook_event.pk)
     return HttpResponse(status=200)
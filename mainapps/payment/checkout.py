@@ -0,0 +1,126 @@
+import hashlib
+import time
+from datetime import datetime, timezone
+
+import stripe
+from django.conf import settings
+from django.core.cache import cache
+
+from mainapps.booking.inventory import extend_holds
+from .stripe_client import stripe_client
+
+CHECKOUT_SESSION_KEY = "payment:checkout-session:{}"
+OPEN_SESSION_KEY = "payment:open-checkout-session:{}"
+
+# Stripe refuses checkout sessions that expire sooner than this many seconds after creation
+STRIPE_MIN_SESSION_LIFETIME = 60 * 30
+
+# A cached session is no longer handed out this many seconds before it expires
+CHECKOUT_SESSION_EXPIRY_MARGIN = 60 * 5
+
+# Holds outlive their checkout session by this many seconds, so a payment made
+# at the last moment is confirmed before the expiry sweep reaches the group
+CHECKOUT_HOLD_GRACE = 60 * 5
+
+
+class CheckoutUnavailable(Exception):
+    """The booking group no longer holds any tickets to pay for."""
+
+
+def checkout_session_url(booking_group, tickets_number, success_url, cancel_url, customer_email=None):
+    """
+    URL of an open Stripe checkout session for a booking group, opening one if needed.
+
+    Sessions are cached per group reference, amount and return URLs until
+    shortly before they expire, so repeated clicks reuse one session and a
+    changed total gets a new one. Opening a new session expires the group's
+    previous one, so a group never has two sessions that can be paid.
+
+    A session never outlives the group's holds: it expires with the earliest
+    of them, less CHECKOUT_HOLD_GRACE. Holds too short for Stripe's minimum
+    session lifetime are extended, once per hold, to cover a session of
+    CHECKOUT_SESSION_LIFETIME seconds; once that session has run out the
+    group cannot be paid any more. Groups booked before holds were
+    introduced have nothing to lapse, and get a session of
+    CHECKOUT_SESSION_LIFETIME seconds. Requests racing for a group find the
+    same hold expiry and send the same idempotency key, so Stripe opens a
+    single session for them.
+
+    Raises:
+        CheckoutUnavailable: The group's holds have lapsed, or used their extension, or it is already paid.
+        stripe.StripeError: The session could not be opened.
+    """
+    amount = int(booking_group.total_price * 100)  # Stripe accepts amount in cents
+    fingerprint = hashlib.sha256(
+        '|'.join([booking_group.reference, str(amount), success_url or '', cancel_url or '']).encode()
+    ).hexdigest()
+    key = CHECKOUT_SESSION_KEY.format(fingerprint)
+    url = cache.get(key)
+    if url is not None:
+        return url
+
+    now = int(time.time())
+    shortest = now + STRIPE_MIN_SESSION_LIFETIME + CHECKOUT_SESSION_EXPIRY_MARGIN
+    held_until = extend_holds(
+        booking_group,
+        at_least=_moment(shortest + CHECKOUT_HOLD_GRACE),
+        extend_to=_moment(now + settings.CHECKOUT_SESSION_LIFETIME + CHECKOUT_HOLD_GRACE),
+    )
+    if held_until is None and not booking_group.holds.exists():
+        # Booked before holds were introduced, so there is nothing to lapse
+        held_until = _moment(now + settings.CHECKOUT_SESSION_LIFETIME + CHECKOUT_HOLD_GRACE)
+    if held_until is None:
+        raise CheckoutUnavailable(f"Booking group {booking_group.reference} no longer holds any tickets.")
+    expires_at = int(held_until.timestamp()) - CHECKOUT_HOLD_GRACE
+
+    params = {
+        "success_url": success_url,
+        "cancel_url": cancel_url,
+        "payment_method_types": ["card"],
+        "line_items": [
+            {
+                "price_data": {
+                    "currency": "usd",
+                    "product_data": {
+                        "name": f'{tickets_number} Tickets for Event',
+                    },
+                    "unit_amount": amount,
+                },
+                "quantity": 1,  # Only 1 line item for the total amount
+            },
+        ],
+        "mode": "payment",
+        "expires_at": expires_at,
+        # The webhook finds the booking group through this
+        "metadata": {"booking_group_reference": booking_group.reference},
+    }
+    if customer_email:
+        params["customer_email"] = customer_email
+
+    session = stripe_client().checkout.sessions.create(
+        params=params, options={"idempotency_key": f"checkout-session-{fingerprint}-{expires_at}"}
+    )
+    _expire_previous_session(booking_group, session.id)
+
+    timeout = expires_at - int(time.time())
+    cache.set(OPEN_SESSION_KEY.format(booking_group.reference), (session.id, key), timeout=timeout)
+    if timeout > CHECKOUT_SESSION_EXPIRY_MARGIN:
+        cache.set(key, session.url, timeout=timeout - CHECKOUT_SESSION_EXPIRY_MARGIN)
+    return session.url
+
+
+def _moment(timestamp):
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc)
+
+
+def _expire_previous_session(booking_group, session_id):
+    """Expire the group's previously opened session, if it is not `session_id`, and forget its URL."""
+    previous = cache.get(OPEN_SESSION_KEY.format(booking_group.reference))
+    if previous is None or previous[0] == session_id:
+        return
+    previous_id, previous_key = previous
+    cache.delete(previous_key)
+    try:
+        stripe_client().checkout.sessions.expire(previous_id)
+    except stripe.InvalidRequestError:
+        pass  # Already completed or expired
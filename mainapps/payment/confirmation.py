@@ -0,0 +1,71 @@
+from django.db import transaction
+from django.utils import timezone
+
+from mainapps.booking.inventory import convert_holds
+from mainapps.booking.models import Booking, BookingGroup, TicketHold
+from .models import Payment
+
+
+class LatePayment(Exception):
+    """The payment arrived after the group's holds lapsed, so its tickets are no longer set aside."""
+
+
+def confirm_booking_group(booking_group, payment_reference, payment_method='stripe'):
+    """
+    Mark a booking group paid and confirm its pending bookings, in one transaction.
+
+    The work is a fixed handful of statements however many bookings the group
+    holds: the holds are converted, the bookings and the group are updated in
+    bulk, and the payment is recorded. Bookings are not saved one by one, so
+    their prices and the group's running total are left as they are.
+
+    Only a pending group whose holds are all still active is confirmed. Once
+    the expiry sweep has canceled the group, or expired any of its holds, the
+    tickets are back on sale and LatePayment is raised instead; a canceled
+    group never becomes paid. Groups booked before holds were introduced
+    have none at all; nothing was set aside for them to lose, so they are
+    confirmed as long as they are pending.
+
+    The holds are locked before the group row. The expiry sweep locks holds
+    without waiting and then updates groups, so taking the locks in the other
+    order could deadlock with it. Holds whose expiry time has passed but that
+    the sweep has not reached yet are still active and are converted.
+
+    Args:
+        booking_group: The group that was paid for.
+        payment_reference: The payment provider's reference.
+        payment_method: One of Payment.PAYMENT_METHOD_CHOICES.
+
+    Returns:
+        Payment: The recorded payment, or None if the group was already paid.
+
+    Raises:
+        LatePayment: The group was canceled or its holds lapsed before the payment arrived.
+    """
+    with transaction.atomic():
+        hold_statuses = set(
+            TicketHold.objects.select_for_update().filter(booking_group=booking_group).values_list('status', flat=True)
+        )
+        status, total_price = BookingGroup.objects.select_for_update().values_list('status', 'total_price').get(
+            pk=booking_group.pk
+        )
+        if status == 'paid':
+            return None
+        lapsed = 'expired' in hold_statuses or (hold_statuses and 'active' not in hold_statuses)
+        if status != 'pending' or lapsed:
+            raise LatePayment(f"Booking group {booking_group.reference} is {status} and no longer holds its tickets.")
+
+        # The tickets are sold now, so the expiry sweep must leave them alone
+        convert_holds(booking_group)
+        now = timezone.now()
+        Booking.objects.filter(booking_group=booking_group, status='pending').update(status='confirmed', updated_at=now)
+        BookingGroup.objects.filter(pk=booking_group.pk).update(status='paid', updated_at=now)
+        booking_group.status, booking_group.total_price = 'paid', total_price
+
+        return Payment.objects.create(
+            booking_group=booking_group,
+            payment_amount=total_price,
+            payment_status='success',
+            payment_reference=payment_reference,
+            payment_method=payment_method,
+        )
@@ -0,0 +1,121 @@
+import argparse
+import json
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from mainapps.payment.models import ProcessedWebhookEvent, WebhookEvent
+from mainapps.payment.tasks import process_stripe_event
+from mainapps.payment.webhooks import process_webhook_event
+
+
+def moment(value):
+    """A date or datetime argument, taken in the current time zone unless it names one."""
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None and (day := parse_date(value)) is not None:
+            parsed = datetime.combine(day, time.min)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise argparse.ArgumentTypeError(f"{value!r} is not a date or datetime.")
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+def read_events(path):
+    """Events from a JSON array, a Stripe list response, a single event or one event per line."""
+    with open(path) as file:
+        text = file.read()
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    if isinstance(data, dict):
+        return data['data'] if isinstance(data.get('data'), list) else [data]
+    return data
+
+
+class Command(BaseCommand):
+    """
+    Replay Stripe events in bulk, e.g. to recover after an outage.
+
+    Events come from a file exported from Stripe, and are stored first, or
+    from the WebhookEvent table by when they were received. Events already
+    in ProcessedWebhookEvent are skipped, so a replay is safe to repeat;
+    failed events are set back to pending and tried again.
+
+    Usage:
+        python manage.py replay_webhook_events --file events.jsonl
+        python manage.py replay_webhook_events --since 2025-05-01T10:00 --until 2025-05-01T12:00
+        python manage.py replay_webhook_events --since 2025-05-01 --type checkout.session.completed --queue
+    """
+    help = "Replay stored or exported Stripe webhook events."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', help="Events exported from Stripe")
+        parser.add_argument('--since', type=moment, help="Replay events received at or after this time")
+        parser.add_argument('--until', type=moment, help="Replay events received before this time")
+        parser.add_argument('--type', dest='event_type', help="Only replay events of this type")
+        parser.add_argument('--queue', action='store_true', help="Hand the events to Celery instead of processing them here")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, file, since, until, event_type, queue, batch_size, **options):
+        if not file and not (since or until):
+            raise CommandError("Give a --file, or a date range with --since and/or --until.")
+
+        if file:
+            event_ids = self.store(read_events(file), batch_size)
+            batches = [
+                WebhookEvent.objects.filter(event_id__in=event_ids[start:start + batch_size])
+                for start in range(0, len(event_ids), batch_size)
+            ]
+        else:
+            queryset = WebhookEvent.objects.all()
+            if since:
+                queryset = queryset.filter(received_at__gte=since)
+            if until:
+                queryset = queryset.filter(received_at__lt=until)
+            batches = [queryset]
+
+        selected, pending = 0, []
+        for batch in batches:
+            if event_type:
+                batch = batch.filter(event_type=event_type)
+            selected += batch.count()
+            pending.extend(
+                batch.exclude(status='processed')
+                .exclude(event_id__in=ProcessedWebhookEvent.objects.values('event_id'))
+                .order_by('received_at', 'pk')
+                .values_list('pk', flat=True)
+            )
+        self.stdout.write(f"{selected} event(s) selected, {selected - len(pending)} already processed")
+
+        failed = 0
+        for start in range(0, len(pending), batch_size):
+            chunk = pending[start:start + batch_size]
+            WebhookEvent.objects.filter(pk__in=chunk, status='failed').update(status='pending')
+            for webhook_event_id in chunk:
+                if queue:
+                    process_stripe_event.delay(webhook_event_id)
+                    continue
+                try:
+                    process_webhook_event(webhook_event_id, final_attempt=True)
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f"Event {webhook_event_id} failed: {exc}")
+
+        if queue:
+            self.stdout.write(self.style.SUCCESS(f"{len(pending)} event(s) queued."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{len(pending) - failed} event(s) replayed, {failed} failed."))
+
+    def store(self, events, batch_size):
+        """Store events that are not in WebhookEvent yet and return every event's id."""
+        WebhookEvent.objects.bulk_create(
+            [WebhookEvent(event_id=event['id'], event_type=event['type'], payload=event) for event in events],
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+        return [event['id'] for event in events]
@@ -12,7 +12,7 @@ class Payment(models.Model):
     
     booking_group = models.ForeignKey('booking.BookingGroup', on_delete=models.CASCADE)
     payment_amount = models.DecimalField(max_digits=10, decimal_places=2)
-    payment_status = models.CharField(max_length=20, choices=[('success', 'Success'), ('failed', 'Failed')])
+    payment_status = models.CharField(max_length=20, choices=[('success', 'Success'), ('failed', 'Failed'), ('refunded', 'Refunded')])
     payment_reference = models.CharField(max_length=255)
     payment_method = models.CharField(max_length=50, choices=PAYMENT_METHOD_CHOICES)
     payment_date = models.DateTimeField(auto_now_add=True)
@@ -20,3 +20,59 @@ class Payment(models.Model):
     def __str__(self):
         return f"Payment for BookingGroup {self.booking_group.reference}: {self.payment_status}"
 
+
+
+class WebhookEvent(models.Model):
+    """
+    A Stripe event whose signature has been verified, stored before it is processed.
+
+    The webhook view only records the event and queues it, so Stripe gets its
+    200 straight away; a Celery task does the work, retrying with backoff.
+
+    Attributes:
+        event_id: Stripe's id for the event; redeliveries share it.
+        event_type: Stripe event type, e.g. "checkout.session.completed".
+        payload: The event exactly as Stripe sent it.
+        status: Pending until processed, or failed once retrying cannot help.
+        attempts: Processing attempts so far.
+        last_error: Error raised by the latest failed attempt.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processed', 'Processed'),
+        ('failed', 'Failed'),
+    ]
+
+    event_id = models.CharField(max_length=255, unique=True)
+    event_type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Date-range replays
+            models.Index(fields=['received_at'], name='webhookevent_received_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} {self.event_id}: {self.status}"
+
+
+class ProcessedWebhookEvent(models.Model):
+    """
+    Ids of the Stripe events whose effects have been applied.
+
+    Stripe delivers events at least once. A redelivery is recognised by one
+    primary key lookup here, and the row is written in the same transaction
+    as the event's effects, so they can never be applied twice. The table
+    stays small and outlives pruning of the stored WebhookEvent payloads.
+    """
+    event_id = models.CharField(max_length=255, primary_key=True)
+    processed_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.event_id
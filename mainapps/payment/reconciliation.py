@@ -0,0 +1,112 @@
+import csv
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from mainapps.booking.models import BookingGroup
+from .models import Payment
+
+# Group statuses that promise the money has been received
+PAID_STATUSES = ('paid', 'completed')
+
+REPORT_FIELDS = ('booking_group', 'reference', 'status', 'total_price', 'paid', 'payments', 'problem')
+
+
+def _keyset(queryset, key, chunk_size):
+    """
+    Yield the rows of `queryset` in `key` order, one chunk per query.
+
+    Each chunk starts after the last key of the previous one, so every query
+    is an index range scan of `chunk_size` rows however deep into the table
+    it reads, and only one chunk is held in memory at a time.
+    """
+    last = None
+    while True:
+        chunk = queryset if last is None else queryset.filter(**{f'{key}__gt': last})
+        count = 0
+        for row in chunk.order_by(key)[:chunk_size].iterator(chunk_size=chunk_size):
+            count += 1
+            last = row[key]
+            yield row
+        if count < chunk_size:
+            return
+
+
+def booking_group_problems(group, payments):
+    """Discrepancies between a booking group and the aggregate of its successful payments, if any."""
+    paid = payments['paid'] if payments else None
+    if group['status'] in PAID_STATUSES:
+        if payments is None:
+            return ["paid without payment"]
+        problems = []
+        if paid != group['total_price']:
+            problems.append("amount mismatch")
+        if payments['payments'] > 1:
+            problems.append("duplicate payments")
+        return problems
+    if payments is not None:
+        return ["payment for unpaid group"]
+    return []
+
+
+def reconcile_payments(chunk_size=None):
+    """
+    Check successful payments against booking group statuses and totals.
+
+    Booking groups and per-group payment totals are streamed side by side in
+    booking group order and compared with a merge join, so memory use stays
+    flat however many rows there are. Discrepancies are written to a CSV
+    report in default storage as they are found:
+
+    - paid without payment: the group is paid but no payment succeeded.
+    - amount mismatch: the payments do not add up to the group's total.
+    - duplicate payments: more than one payment succeeded for the group.
+    - payment for unpaid group: money arrived for a group that is not paid.
+
+    Returns:
+        dict: Groups checked, discrepancies found and the report's storage name.
+    """
+    chunk_size = chunk_size or settings.RECONCILIATION_CHUNK_SIZE
+    groups = _keyset(
+        BookingGroup.objects.values('id', 'reference', 'status', 'total_price'),
+        'id',
+        chunk_size,
+    )
+    payments = _keyset(
+        Payment.objects.filter(payment_status='success')
+        .values('booking_group_id')
+        .annotate(paid=Sum('payment_amount'), payments=Count('pk'))
+        .values('booking_group_id', 'paid', 'payments'),
+        'booking_group_id',
+        chunk_size,
+    )
+
+    checked = discrepancies = 0
+    with tempfile.TemporaryFile('w+', newline='') as report:
+        writer = csv.writer(report)
+        writer.writerow(REPORT_FIELDS)
+
+        payment = next(payments, None)
+        for group in groups:
+            checked += 1
+            # Catch the payment stream up; totals for groups that are gone are skipped
+            while payment is not None and payment['booking_group_id'] < group['id']:
+                payment = next(payments, None)
+            matched = payment if payment is not None and payment['booking_group_id'] == group['id'] else None
+
+            for problem in booking_group_problems(group, matched):
+                discrepancies += 1
+                writer.writerow([
+                    group['id'], group['reference'], group['status'], group['total_price'],
+                    matched['paid'] if matched else '', matched['payments'] if matched else 0, problem,
+                ])
+
+        report.seek(0)
+        name = default_storage.save(
+            f"reconciliation/payments-{timezone.now():%Y%m%d-%H%M%S}.csv", File(report)
+        )
+    return {'checked': checked, 'discrepancies': discrepancies, 'report': name}
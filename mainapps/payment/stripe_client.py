@@ -0,0 +1,41 @@
+import functools
+
+import requests
+import stripe
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+# Connection failures and 5xx answers are retried by the library, with an idempotency key
+STRIPE_MAX_NETWORK_RETRIES = 2
+
+
+def stripe_client():
+    """
+    The process-wide StripeClient.
+
+    Every call goes through one pooled requests session, so connections to
+    Stripe are kept alive and reused across requests and threads, and gives
+    up after STRIPE_TIMEOUT instead of the library's 80 seconds. Calls go to
+    STRIPE_API_BASE, which tests point at a local fake server. The global
+    `stripe.api_key` is never touched.
+    """
+    return _client(
+        settings.STRIPE_SEC_KEY,
+        settings.STRIPE_API_BASE,
+        tuple(settings.STRIPE_TIMEOUT),
+        settings.STRIPE_MAX_CONNECTIONS,
+    )
+
+
+@functools.cache
+def _client(api_key, api_base, timeout, max_connections):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return stripe.StripeClient(
+        api_key,
+        base_addresses={'api': api_base},
+        http_client=stripe.RequestsClient(timeout=timeout, session=session),
+        max_network_retries=STRIPE_MAX_NETWORK_RETRIES,
+    )
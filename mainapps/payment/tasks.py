@@ -0,0 +1,32 @@
+from celery import shared_task
+from celery.utils.time import get_exponential_backoff_interval
+
+from . import reconciliation, webhooks
+
+# Up to eight retries, backing off exponentially to at most ten minutes apart
+WEBHOOK_MAX_RETRIES = 8
+WEBHOOK_RETRY_BACKOFF = 5
+WEBHOOK_RETRY_BACKOFF_MAX = 60 * 10
+
+
+@shared_task(bind=True, max_retries=WEBHOOK_MAX_RETRIES)
+def process_stripe_event(self, webhook_event_id):
+    """Process a stored Stripe event, retrying transient failures with exponential backoff."""
+    try:
+        webhooks.process_webhook_event(webhook_event_id, final_attempt=self.request.retries >= self.max_retries)
+    except webhooks.WebhookError:
+        return  # Recorded as failed; retrying cannot help
+    except Exception as exc:
+        countdown = get_exponential_backoff_interval(
+            factor=WEBHOOK_RETRY_BACKOFF,
+            retries=self.request.retries,
+            maximum=WEBHOOK_RETRY_BACKOFF_MAX,
+            full_jitter=True,
+        )
+        raise self.retry(exc=exc, countdown=countdown)
+
+
+@shared_task
+def reconcile_payments():
+    """Write the payment discrepancy report; scheduled nightly by Celery beat."""
+    return reconciliation.reconcile_payments()
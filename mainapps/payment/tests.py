@@ -1,3 +1,339 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import io
+import json
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from mainapps.artist.models import Artist
+from mainapps.booking.inventory import create_booking_group, release_expired_holds
+from mainapps.booking.models import BookingGroup, Event, EventSection, TicketHold, Venue, VenueSection
+from mainapps.payment.confirmation import LatePayment, confirm_booking_group
+from mainapps.payment.models import Payment, WebhookEvent
+from mainapps.payment.reconciliation import reconcile_payments
+from mainapps.payment.webhooks import WebhookError, process_webhook_event
+
+WEBHOOK_SECRET = "whsec_test"
+
+
+class PaymentTestCase(TestCase):
+    """A pending booking group to pay for."""
+
+    def setUp(self):
+        cache.clear()
+        user = get_user_model().objects.create_user(email="payer@example.com", password="secret")
+        venue = Venue.objects.create(
+            name="Pay Hall", street_address="1 Pay Street", city="Lagos", state="Lagos",
+            postal_code="100001", capacity=100, contact_email="venue@example.com",
+        )
+        event = Event.objects.create(
+            venue=venue,
+            artist=Artist.objects.create(name="Payee", contact_email="artist@example.com"),
+            event_date=timezone.now() + timedelta(days=30),
+            ticket_price=10,
+            tickets_available=100,
+        )
+        self.user = user
+        self.event_section = EventSection.objects.create(
+            event=event,
+            venue_section=VenueSection.objects.create(venue=venue, name="Floor", capacity=100),
+            tickets_available=100,
+            ticket_price=10,
+        )
+        self.booking_group = create_booking_group(user, [(self.event_section.pk, 2)])
+
+
+@override_settings(STRIPE_ENDPOINT_SECRET=WEBHOOK_SECRET)
+class StripeWebhookTests(PaymentTestCase):
+
+    def checkout_completed(self, reference, event_id="evt_1"):
+        return {
+            "id": event_id,
+            "type": "checkout.session.completed",
+            "data": {"object": {
+                "id": "cs_1", "payment_intent": "pi_1", "metadata": {"booking_group_reference": reference},
+            }},
+        }
+
+    def post_event(self, event, secret=WEBHOOK_SECRET):
+        payload = json.dumps(event)
+        timestamp = int(time.time())
+        signature = hmac.new(secret.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256).hexdigest()
+        return self.client.post(
+            '/payment_api/stripe_webhook/', payload, content_type='application/json',
+            HTTP_STRIPE_SIGNATURE=f"t={timestamp},v1={signature}",
+        )
+
+    @mock.patch('mainapps.payment.api.views.process_stripe_event.delay')
+    def test_webhook_stores_and_queues_without_processing(self, delay):
+        event = self.checkout_completed(self.booking_group.reference)
+        self.assertEqual(self.post_event(event).status_code, 200)
+        self.assertEqual(self.post_event(event).status_code, 200)
+
+        webhook_event = WebhookEvent.objects.get()
+        self.assertEqual(webhook_event.payload, event)
+        delay.assert_called_with(webhook_event.pk)
+        self.assertFalse(Payment.objects.exists())
+
+    @mock.patch('mainapps.payment.api.views.process_stripe_event.delay')
+    def test_bad_signature_is_rejected(self, delay):
+        response = self.post_event(self.checkout_completed(self.booking_group.reference), secret="whsec_other")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(WebhookEvent.objects.exists())
+        delay.assert_not_called()
+
+    def test_processing_happens_once(self):
+        webhook_event = WebhookEvent.objects.create(
+            event_id="evt_1", event_type="checkout.session.completed",
+            payload=self.checkout_completed(self.booking_group.reference),
+        )
+        process_webhook_event(webhook_event.pk)
+        process_webhook_event(webhook_event.pk)
+        self.assertEqual(Payment.objects.filter(booking_group=self.booking_group).count(), 1)
+        webhook_event.refresh_from_db()
+        self.assertEqual((webhook_event.status, webhook_event.attempts), ('processed', 1))
+
+    def test_group_booked_before_holds_is_confirmed(self):
+        TicketHold.objects.filter(booking_group=self.booking_group).delete()
+
+        payment = confirm_booking_group(self.booking_group, "pi_legacy")
+        self.assertEqual(payment.payment_amount, 20)
+        self.booking_group.refresh_from_db()
+        self.assertEqual(self.booking_group.status, 'paid')
+        self.assertEqual(set(self.booking_group.bookings.values_list('status', flat=True)), {'confirmed'})
+
+    def test_unknown_booking_group_fails_for_good(self):
+        webhook_event = WebhookEvent.objects.create(
+            event_id="evt_2", event_type="checkout.session.completed", payload=self.checkout_completed("GRP-MISSING"),
+        )
+        with self.assertRaises(WebhookError):
+            process_webhook_event(webhook_event.pk)
+        webhook_event.refresh_from_db()
+        self.assertEqual(webhook_event.status, 'failed')
+        self.assertIn("GRP-MISSING", webhook_event.last_error)
+
+    def test_failed_invoice_payment_is_logged(self):
+        webhook_event = WebhookEvent.objects.create(
+            event_id="evt_3", event_type="invoice.payment_failed", payload={"data": {"object": {"id": "in_1"}}},
+        )
+        with self.assertLogs('mainapps.payment.webhooks', 'WARNING') as logs:
+            process_webhook_event(webhook_event.pk)
+        self.assertIn("in_1", logs.output[0])
+
+    @mock.patch('mainapps.payment.api.views.process_stripe_event.delay')
+    def test_redelivery_of_processed_event_is_skipped(self, delay):
+        event = self.checkout_completed(self.booking_group.reference)
+        self.post_event(event)
+        process_webhook_event(WebhookEvent.objects.get().pk)
+        delay.reset_mock()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.post_event(event).status_code, 200)
+        delay.assert_not_called()
+
+    def test_replay_from_file_skips_processed_events(self):
+        done = WebhookEvent.objects.create(
+            event_id="evt_done", event_type="checkout.session.completed",
+            payload=self.checkout_completed(self.booking_group.reference, "evt_done"),
+        )
+        process_webhook_event(done.pk)
+
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl') as file:
+            for event_id in ("evt_done", "evt_new"):
+                file.write(json.dumps(self.checkout_completed(self.booking_group.reference, event_id)) + "\n")
+            file.flush()
+            out = io.StringIO()
+            call_command('replay_webhook_events', file=file.name, stdout=out)
+
+        self.assertIn("2 event(s) selected, 1 already processed", out.getvalue())
+        self.assertEqual(WebhookEvent.objects.get(event_id="evt_new").status, 'processed')
+        self.assertEqual(Payment.objects.filter(booking_group=self.booking_group).count(), 1)
+
+    @mock.patch('mainapps.payment.webhooks.stripe_client')
+    def test_payment_after_expiry_is_refunded(self, stripe_client):
+        TicketHold.objects.filter(booking_group=self.booking_group).update(expires_at=timezone.now() - timedelta(minutes=1))
+        release_expired_holds()
+        with self.assertRaises(LatePayment):
+            confirm_booking_group(self.booking_group, "pi_admin")
+
+        webhook_event = WebhookEvent.objects.create(
+            event_id="evt_late", event_type="checkout.session.completed",
+            payload=self.checkout_completed(self.booking_group.reference),
+        )
+        with self.assertLogs('mainapps.payment.webhooks', 'WARNING'):
+            process_webhook_event(webhook_event.pk)
+
+        self.booking_group.refresh_from_db()
+        self.event_section.refresh_from_db()
+        self.assertEqual(self.booking_group.status, 'canceled')
+        self.assertEqual(set(self.booking_group.bookings.values_list('status', flat=True)), {'canceled'})
+        self.assertEqual(self.event_section.tickets_available, 100)
+        self.assertEqual(Payment.objects.get(booking_group=self.booking_group).payment_status, 'refunded')
+        stripe_client.return_value.refunds.create.assert_called_once_with(
+            params={"payment_intent": "pi_1"}, options={"idempotency_key": "late-payment-refund-cs_1"},
+        )
+
+    def test_confirmation_cost_does_not_grow_with_the_group(self):
+        with CaptureQueriesContext(connection) as single:
+            confirm_booking_group(self.booking_group, "pi_1")
+
+        large = create_booking_group(self.user, [(self.event_section.pk, 1)] * 10)
+        with CaptureQueriesContext(connection) as many:
+            payment = confirm_booking_group(large, "pi_2")
+        self.assertEqual(len(many), len(single))
+
+        self.assertEqual(payment.payment_amount, 100)
+        self.assertEqual(set(large.bookings.values_list('status', flat=True)), {'confirmed'})
+        self.assertEqual(set(TicketHold.objects.filter(booking_group=large).values_list('status', flat=True)), {'converted'})
+        self.assertIsNone(confirm_booking_group(large, "pi_2"))
+
+
+class FakeStripe(BaseHTTPRequestHandler):
+    """Answers every POST with a new checkout session and records what was sent."""
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode()
+        self.server.received.append((self.path, self.headers, parse_qs(body)))
+        session_id = f"cs_test_{len(self.server.received)}"
+        payload = json.dumps({"id": session_id, "object": "checkout.session", "url": f"https://checkout.test/{session_id}"}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class CheckoutSessionTests(PaymentTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.stripe = ThreadingHTTPServer(('127.0.0.1', 0), FakeStripe)
+        cls.stripe.received = []
+        threading.Thread(target=cls.stripe.serve_forever, daemon=True).start()
+        cls.addClassCleanup(cls.stripe.server_close)
+        cls.addClassCleanup(cls.stripe.shutdown)
+
+    def setUp(self):
+        super().setUp()
+        self.stripe.received.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = (
+            f'/payment_api/create_checkout_session/?reference={self.booking_group.reference}'
+            '&success_path=https://example.com/paid&cancel_path=https://example.com/cart'
+        )
+        stripe_settings = override_settings(
+            STRIPE_API_BASE=f'http://127.0.0.1:{self.stripe.server_port}', STRIPE_SEC_KEY='sk_test_fake'
+        )
+        stripe_settings.enable()
+        self.addCleanup(stripe_settings.disable)
+
+    def test_repeated_clicks_reuse_one_session(self):
+        first, second = self.client.get(self.url), self.client.get(self.url)
+
+        self.assertEqual(first.data, {"redirect_url": "https://checkout.test/cs_test_1"})
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(len(self.stripe.received), 1)
+        path, headers, form = self.stripe.received[0]
+        self.assertEqual(path, '/v1/checkout/sessions')
+        self.assertEqual(form['metadata[booking_group_reference]'], [self.booking_group.reference])
+        self.assertEqual(form['customer_email'], [self.user.email])
+        self.assertTrue(headers['Idempotency-Key'].startswith('checkout-session-'))
+
+    def test_session_expires_before_the_holds(self):
+        self.client.get(self.url)
+        expires_at = int(self.stripe.received[0][2]['expires_at'][0])
+        self.assertGreaterEqual(expires_at, time.time() + 30 * 60)
+
+        # The 15 minute holds were extended to outlive the session
+        for hold_expiry in TicketHold.objects.filter(booking_group=self.booking_group).values_list('expires_at', flat=True):
+            self.assertGreater(hold_expiry.timestamp(), expires_at)
+
+    def test_changed_total_expires_the_previous_session(self):
+        first = self.client.get(self.url)
+        BookingGroup.objects.filter(pk=self.booking_group.pk).update(total_price=30)
+        second = self.client.get(self.url)
+
+        self.assertNotEqual(second.data, first.data)
+        self.assertEqual(
+            [path for path, _, _ in self.stripe.received],
+            ['/v1/checkout/sessions', '/v1/checkout/sessions', '/v1/checkout/sessions/cs_test_1/expire'],
+        )
+
+    def test_holds_are_extended_only_once(self):
+        self.client.get(self.url)
+        # The session ran out without a payment and its cached URL with it
+        cache.clear()
+        soon = timezone.now() + timedelta(minutes=20)
+        TicketHold.objects.filter(booking_group=self.booking_group).update(expires_at=soon)
+
+        self.assertEqual(self.client.get(self.url).status_code, 409)
+        self.assertEqual(len(self.stripe.received), 1)
+        expiries = TicketHold.objects.filter(booking_group=self.booking_group).values_list('expires_at', flat=True)
+        self.assertEqual(set(expiries), {soon})
+
+    def test_only_the_owner_can_open_a_session(self):
+        stranger = APIClient()
+        stranger.force_authenticate(get_user_model().objects.create_user(email="stranger@example.com"))
+        self.assertEqual(stranger.get(self.url).status_code, 404)
+        self.assertIn(APIClient().get(self.url).status_code, (401, 403))
+        self.assertEqual(self.stripe.received, [])
+
+    def test_group_booked_before_holds_can_be_paid(self):
+        TicketHold.objects.filter(booking_group=self.booking_group).delete()
+
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        expires_at = int(self.stripe.received[0][2]['expires_at'][0])
+        self.assertGreaterEqual(expires_at, time.time() + 30 * 60)
+
+    def test_lapsed_group_cannot_be_paid(self):
+        TicketHold.objects.filter(booking_group=self.booking_group).update(expires_at=timezone.now() - timedelta(minutes=1))
+        release_expired_holds()
+
+        self.assertEqual(self.client.get(self.url).status_code, 409)
+        self.assertEqual(self.stripe.received, [])
+
+
+@override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class ReconciliationTests(PaymentTestCase):
+
+    def test_report_lists_only_discrepancies(self):
+        confirm_booking_group(self.booking_group, "pi_ok")
+        paid_without_payment = BookingGroup.objects.create(status='paid', total_price=30)
+        underpaid = create_booking_group(self.user, [(self.event_section.pk, 3)])
+        confirm_booking_group(underpaid, "pi_short")
+        Payment.objects.filter(booking_group=underpaid).update(payment_amount=10)
+        BookingGroup.objects.create(status='pending', total_price=10)
+
+        # Chunks of two make both streams cross chunk boundaries
+        result = reconcile_payments(chunk_size=2)
+
+        self.assertEqual((result['checked'], result['discrepancies']), (4, 2))
+        with default_storage.open(result['report']) as report:
+            rows = [line.split(',') for line in report.read().decode().splitlines()[1:]]
+        self.assertEqual(
+            [(int(row[0]), row[-1]) for row in rows],
+            [(paid_without_payment.pk, "paid without payment"), (underpaid.pk, "amount mismatch")],
+        )
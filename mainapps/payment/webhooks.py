@@ -0,0 +1,145 @@
+import logging
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from mainapps.booking.models import BookingGroup
+from .confirmation import LatePayment, confirm_booking_group
+from .models import Payment, ProcessedWebhookEvent, WebhookEvent
+from .stripe_client import stripe_client
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookError(Exception):
+    """An event that cannot be processed, however often it is retried."""
+
+
+def already_processed(event_id):
+    """Whether the effects of a Stripe event have already been applied."""
+    return ProcessedWebhookEvent.objects.filter(pk=event_id).exists()
+
+
+def record_webhook_event(event):
+    """
+    Store a verified Stripe event, once per event id.
+
+    Redeliveries of an event that is already stored return the stored row.
+
+    Args:
+        event: The decoded event payload.
+
+    Returns:
+        WebhookEvent: The stored event.
+    """
+    webhook_event, _ = WebhookEvent.objects.get_or_create(
+        event_id=event['id'],
+        defaults={'event_type': event['type'], 'payload': event},
+    )
+    return webhook_event
+
+
+def process_webhook_event(webhook_event_id, final_attempt=False):
+    """
+    Run the handler of a stored event, unless it has already been processed.
+
+    The event row is locked for the duration, so two workers handed the same
+    event process it once, and the event id is added to ProcessedWebhookEvent
+    in the same transaction as the handler's writes. Events whose id is
+    already there are marked processed without running the handler again.
+    Failed attempts are counted and their errors kept on the row.
+
+    Args:
+        webhook_event_id: Primary key of the WebhookEvent.
+        final_attempt: Mark the event failed if this attempt raises.
+
+    Raises:
+        WebhookError: The event can never be processed; it is marked failed.
+    """
+    try:
+        with transaction.atomic():
+            webhook_event = WebhookEvent.objects.select_for_update().get(pk=webhook_event_id)
+            if webhook_event.status != 'pending':
+                return webhook_event
+
+            if not already_processed(webhook_event.event_id):
+                handler = WEBHOOK_HANDLERS.get(webhook_event.event_type)
+                if handler is not None:
+                    handler(webhook_event.payload['data']['object'])
+                ProcessedWebhookEvent.objects.create(event_id=webhook_event.event_id)
+
+            webhook_event.status = 'processed'
+            webhook_event.attempts += 1
+            webhook_event.processed_at = timezone.now()
+            webhook_event.save(update_fields=['status', 'attempts', 'processed_at'])
+            return webhook_event
+    except WebhookError as exc:
+        _record_failed_attempt(webhook_event_id, exc, 'failed')
+        raise
+    except Exception as exc:
+        _record_failed_attempt(webhook_event_id, exc, 'failed' if final_attempt else 'pending')
+        raise
+
+
+def _record_failed_attempt(webhook_event_id, exc, status):
+    WebhookEvent.objects.filter(pk=webhook_event_id).update(
+        status=status,
+        attempts=F('attempts') + 1,
+        last_error=f"{type(exc).__name__}: {exc}",
+    )
+
+
+def complete_checkout(session):
+    """Record the payment of a completed checkout session and sell its tickets."""
+    # Retrieve the BookingGroup reference from the session
+    booking_group_ref = (session.get("metadata") or {}).get("booking_group_reference")
+    if not booking_group_ref:
+        raise WebhookError("Checkout session has no booking group reference.")
+
+    try:
+        booking_group = BookingGroup.objects.get(reference=booking_group_ref)
+    except BookingGroup.DoesNotExist:
+        raise WebhookError(f"Booking group {booking_group_ref} not found.")
+
+    try:
+        confirm_booking_group(booking_group, payment_reference=session["id"], payment_method="stripe")
+    except LatePayment:
+        refund_late_payment(booking_group, session)
+
+
+def refund_late_payment(booking_group, session):
+    """
+    Refund a checkout session that was paid after its booking group's holds lapsed.
+
+    The group stays as the expiry sweep left it and the refund is recorded as
+    a refunded payment. The refund is keyed on the session, so a retried
+    event never refunds twice.
+    """
+    payment_intent = session.get("payment_intent")
+    if not payment_intent:
+        raise WebhookError(f"Late payment {session['id']} for booking group {booking_group.reference} has no payment intent to refund.")
+
+    stripe_client().refunds.create(
+        params={"payment_intent": payment_intent},
+        options={"idempotency_key": f"late-payment-refund-{session['id']}"},
+    )
+    logger.warning("Refunded late payment %s for %s booking group %s.", session["id"], booking_group.status, booking_group.reference)
+    Payment.objects.create(
+        booking_group=booking_group,
+        payment_amount=booking_group.total_price,
+        payment_status='refunded',
+        payment_reference=session["id"],
+        payment_method='stripe',
+    )
+
+
+def payment_failed(invoice):
+    logger.warning("Payment failed for invoice %s; couldn't complete booking payment.", invoice.get("id"))
+
+
+# Stripe event type to handler; other event types are stored and marked processed
+WEBHOOK_HANDLERS = {
+    "checkout.session.completed": complete_checkout,
+    "invoice.payment_failed": payment_failed,
+}